@@ -1,8 +1,29 @@
+import time
+
 import streamlit as st
 import pandas as pd
 import requests
 import plotly.express as px
 import plotly.graph_objects as go
+from bolsistas.acesso import (
+    atualizar_dados, carregar_conjunto, estado_atualizacao, projetar_bolsistas
+)
+from bolsistas.api import buscar_tabela_api, frescor_api, obter_agregado_api
+from bolsistas.agregacao import SUBTOTAL, TOTAL, totalizar_por_filial
+from bolsistas.cenarios import (
+    PROGRAMAS, grade_cenarios, montar_base_cenarios, projetar_cenario, resumir_cenarios
+)
+from bolsistas.classificacao import ATENDE, NAO_ATENDE, classificar_risco, classificar_saldo
+from bolsistas.coortes import HORIZONTE_PADRAO, trajetoria_saldos
+from bolsistas.cubo import (
+    TODAS_FILIAIS, atualizar_cubo, construir_cubo, indicadores_conformidade, indicadores_filial
+)
+from bolsistas.esquema import COLUNAS_DERIVADAS_FILIAL, aplicar_esquema
+from bolsistas.estilos import LIMITE_LINHAS_ESTILO, aplicar_css, estilizar, montar_css
+from bolsistas.leitores import ler_planilha
+from bolsistas.monte_carlo import SEMENTE_PADRAO, risco_conformidade
+from bolsistas.otimizacao import otimizar_redistribuicao
+from bolsistas.visoes import COLUNAS_CONFORMIDADE, COLUNAS_POR_VISAO
 
 # --- Configurações da Página ---
 st.set_page_config(layout="wide", page_title="Dashboard São Camilo", page_icon="🎓")
@@ -57,96 +78,156 @@ def criar_grafico_divergente(df, coluna_valor, titulo, cor_positiva="#28a745", c
 
 # --- Funções de Carregamento de Dados ---
 
-@st.cache_data
-def buscar_dados_excel():
+def buscar_dados_excel(colunas=None):
     """
-    Carrega os dados de um arquivo Excel local.
-    Este é o modo de desenvolvimento.
+    Carrega os dados de um arquivo Excel local (apenas as colunas pedidas, se informadas).
+    Este é o modo de desenvolvimento. Os dados vêm da camada compartilhada
+    (bolsistas/acesso.py), que mantém uma única cópia tipada por versão da
+    planilha para todos os dashboards do processo, sem cópia por sessão.
+    Retorna (versao, dados, derivado) de uma única leitura, usados na
+    execução inteira para não misturar versões se a planilha for trocada.
     """
     try:
-        df = pd.read_excel("dados_bolsistas.xlsx")
-        return df
+        return carregar_conjunto(colunas)
     except FileNotFoundError:
         st.error("Arquivo 'dados_bolsistas.xlsx' não encontrado. Crie o arquivo ou altere para o modo de produção.")
-        return pd.DataFrame()
+        return None, pd.DataFrame(), None
+
+def buscar_cubo_indicadores(derivado):
+    """
+    Cubo com os indicadores de cada opção de filial, construído uma única vez
+    por versão dos dados (SHA-256 da planilha) na camada compartilhada. Cards,
+    gráfico de pizza e resumos consultam o cubo em vez de somar as linhas a
+    cada interação.
+    """
+    return derivado('cubo_indicadores', construir_cubo)
+
+@st.cache_data(max_entries=64)
+def calcular_css_tabela(nome_tabela, versao_dados, filtro, _df, _regras):
+    """
+    Matriz de CSS de uma tabela (ver bolsistas/estilos.py), calculada uma vez por
+    tabela, versão dos dados e filtro. O DataFrame e as regras não entram na
+    chave do cache. Retorna None acima do limite de linhas estilizadas.
+    """
+    if len(_df) > LIMITE_LINHAS_ESTILO:
+        return None
+    return montar_css(_df, **_regras)
+
+API_URL = "https://api.example.com/dados_bolsistas"  # Substitua pela sua URL real
+API_DELTA = False  # True se a URL for um feed de alterações (ver bolsistas/api.py)
+
+# Derivados da API que sabem se atualizar só nas células alteradas por um delta
+ATUALIZACOES_DERIVADOS_API = {'cubo_indicadores': atualizar_cubo}
+
+def converter_dados_api(dados):
+    return aplicar_esquema(pd.DataFrame(dados))
 
-@st.cache_data
 def buscar_dados_api():
     """
     Busca os dados de um endpoint de API REST.
-    Este é o modo de produção.
+    Este é o modo de produção. A tabela fica em cache em bolsistas/api.py
+    (stale-while-revalidate, ou sincronização incremental com API_DELTA), e
+    sessões simultâneas com o cache frio compartilham uma única requisição.
+    A resposta passa pelo mesmo esquema da planilha (tipos compactos,
+    LINHA_SUBTOTAL e FILIAL_VALIDA), que as visões usam como máscaras.
     """
-    API_URL = "https://api.example.com/dados_bolsistas"  # Substitua pela sua URL real
     try:
-        response = requests.get(API_URL)
-        response.raise_for_status()  # Lança um erro para respostas com código de status ruim (4xx ou 5xx)
-        data = response.json()
-        df = pd.DataFrame(data)
-        return df
+        # Lança um erro para respostas com código de status ruim (4xx ou 5xx)
+        return buscar_tabela_api(API_URL, converter=converter_dados_api, delta=API_DELTA)
     except requests.exceptions.RequestException as e:
         st.error(f"Erro ao buscar dados da API: {e}")
         return pd.DataFrame()
 
-@st.cache_data
-def gerar_dados_conformidade_reais():
+def exibir_frescor_api():
+    """Indicador na sidebar da idade dos dados da API e de uma atualização em segundo plano"""
+    frescor = frescor_api(API_URL)
+    if frescor is None:
+        return
+    hora = time.strftime('%H:%M', time.localtime(frescor['hora']))
+    minutos = frescor['idade'] / 60
+    if frescor['erro']:
+        st.sidebar.warning(f"🔴 Dados das {hora} (há {minutos:.0f} min). A última atualização falhou: {frescor['erro']}")
+    elif frescor['fresca']:
+        st.sidebar.caption(f"🟢 Dados atualizados às {hora} (há {minutos:.0f} min)")
+    else:
+        st.sidebar.caption(f"🟡 Dados das {hora} (há {minutos:.0f} min), atualizando em segundo plano")
+
+def buscar_conjunto_api():
+    """
+    Dados da API no formato (versao, dados, derivado) de buscar_dados_excel,
+    com a idade deles na sidebar (exibir_frescor_api).
+    Os derivados ficam junto da tabela em cache (obter_agregado_api):
+    calculados uma vez por versão dela e, depois de um delta, o cubo é
+    atualizado só nas células alteradas e os demais são recalculados. A
+    versão é o hash do conteúdo, então os caches por versão acompanham a API.
+    """
+    df = buscar_dados_api()
+    exibir_frescor_api()
+
+    def derivado(nome, construir, **opcoes):
+        return obter_agregado_api(API_URL, nome, construir, ATUALIZACOES_DERIVADOS_API.get(nome), tabela=df)
+
+    versao = derivado('versao', lambda tabela: format(pd.util.hash_pandas_object(tabela).sum(), 'x'))
+    return versao, df, derivado
+
+# Versão das tabelas de conformidade no cache em disco: incrementar ao mudar montar_dados_conformidade
+VERSAO_DADOS_CONFORMIDADE = 1
+
+def montar_dados_conformidade(df_bolsistas):
     """
-    Gera dados de conformidade baseados nos dados reais do arquivo principal
+    Tabelas de conformidade por curso e detalhada (por filial) a partir dos
+    dados de bolsistas, ou None se faltarem colunas
+    """
+    df_principal = projetar_bolsistas(df_bolsistas, COLUNAS_CONFORMIDADE)
+
+    # Verificar se as colunas necessárias existem
+    colunas_necessarias = ['NOMECURSO', 'FALTAM_SOBRAM_PROUNI', 'FALTAM_SOBRAM_FILANTROPIA']
+    if not all(col in df_principal.columns for col in colunas_necessarias):
+        return None
+    
+    # Filtrar dados válidos: filial reconhecida, sem subtotais e com curso informado
+    df_limpo = df_principal[
+        df_principal['FILIAL_VALIDA'] & ~df_principal['LINHA_SUBTOTAL'] & df_principal['NOMECURSO'].notna()
+    ]
+    
+    # Agrupar por curso (somar dados de todas as filiais)
+    df_conformidade = df_limpo.groupby('NOMECURSO', observed=True).agg({
+        'FALTAM_SOBRAM_PROUNI': 'sum',
+        'FALTAM_SOBRAM_FILANTROPIA': 'sum'
+    }).reset_index()
+    
+    # Renomear colunas para manter compatibilidade
+    df_conformidade = df_conformidade.rename(columns={
+        'FALTAM_SOBRAM_PROUNI': 'PROUNI_SOBRA_FALTA',
+        'FALTAM_SOBRAM_FILANTROPIA': 'FILANTROPIA_SOBRA_FALTA'
+    })
+    
+    # Adicionar informações de filial (df_limpo já contém só as colunas de conformidade)
+    df_detalhado = df_limpo.drop(columns=list(COLUNAS_DERIVADAS_FILIAL)).rename(columns={
+        'FALTAM_SOBRAM_PROUNI': 'PROUNI_SOBRA_FALTA',
+        'FALTAM_SOBRAM_FILANTROPIA': 'FILANTROPIA_SOBRA_FALTA'
+    })
+    
+    # Saldos já chegam como Int32 e CODFILIAL como categoria de códigos inteiros
+    # pelo esquema: apenas preencher nulos, sem converter tipos para o Arrow
+    df_detalhado = df_detalhado.fillna({'PROUNI_SOBRA_FALTA': 0, 'FILANTROPIA_SOBRA_FALTA': 0})
+    
+    return df_conformidade, df_detalhado
+
+def gerar_dados_conformidade_reais(derivado):
+    """
+    Gera dados de conformidade baseados nos dados reais do arquivo principal,
+    uma vez por versão dos dados. O resultado fica no cache em disco
+    compartilhado (bolsistas/cache_disco.py), então um processo novo do
+    servidor já começa com ele pronto.
     """
     try:
-        df_principal = pd.read_excel('dados_bolsistas.xlsx')
-        
-        # Verificar se as colunas necessárias existem
-        colunas_necessarias = ['NOMECURSO', 'FALTAM_SOBRAM_PROUNI', 'FALTAM_SOBRAM_FILANTROPIA']
-        if not all(col in df_principal.columns for col in colunas_necessarias):
-            return None
-        
-        # Filtrar dados válidos (remover totais e linhas vazias)
-        df_limpo = df_principal[~df_principal['CODFILIAL'].astype(str).str.contains('TOTAL', na=False)]
-        df_limpo = df_limpo.dropna(subset=['NOMECURSO'])
-        
-        # Filtrar apenas linhas com CODFILIAL numérico válido
-        df_limpo = df_limpo[df_limpo['CODFILIAL'].apply(lambda x: str(x).replace('.0', '').isdigit() if pd.notna(x) else False)]
-        
-        # Agrupar por curso (somar dados de todas as filiais)
-        df_conformidade = df_limpo.groupby('NOMECURSO').agg({
-            'FALTAM_SOBRAM_PROUNI': 'sum',
-            'FALTAM_SOBRAM_FILANTROPIA': 'sum'
-        }).reset_index()
-        
-        # Renomear colunas para manter compatibilidade
-        df_conformidade = df_conformidade.rename(columns={
-            'FALTAM_SOBRAM_PROUNI': 'PROUNI_SOBRA_FALTA',
-            'FALTAM_SOBRAM_FILANTROPIA': 'FILANTROPIA_SOBRA_FALTA'
-        })
-        
-        # Converter para inteiros para remover casas decimais desnecessárias
-        df_conformidade['PROUNI_SOBRA_FALTA'] = df_conformidade['PROUNI_SOBRA_FALTA'].fillna(0).round().astype(int)
-        df_conformidade['FILANTROPIA_SOBRA_FALTA'] = df_conformidade['FILANTROPIA_SOBRA_FALTA'].fillna(0).round().astype(int)
-        
-        # Adicionar informações de filial se necessário
-        df_detalhado = df_limpo[['CODFILIAL', 'NOMECURSO', 'FALTAM_SOBRAM_PROUNI', 'FALTAM_SOBRAM_FILANTROPIA']].copy()
-        df_detalhado = df_detalhado.rename(columns={
-            'FALTAM_SOBRAM_PROUNI': 'PROUNI_SOBRA_FALTA',
-            'FALTAM_SOBRAM_FILANTROPIA': 'FILANTROPIA_SOBRA_FALTA'
-        })
-        
-        # Converter para inteiros e garantir que CODFILIAL seja string para evitar problemas de conversão Arrow
-        df_detalhado['PROUNI_SOBRA_FALTA'] = df_detalhado['PROUNI_SOBRA_FALTA'].fillna(0).round().astype(int)
-        df_detalhado['FILANTROPIA_SOBRA_FALTA'] = df_detalhado['FILANTROPIA_SOBRA_FALTA'].fillna(0).round().astype(int)
-        df_detalhado['CODFILIAL'] = df_detalhado['CODFILIAL'].astype(str)
-        
-        return df_conformidade, df_detalhado
-        
+        return derivado('dados_conformidade', montar_dados_conformidade, persistir=True,
+                        versao_artefato=VERSAO_DADOS_CONFORMIDADE)
     except Exception as e:
         st.error(f"Erro ao gerar dados de conformidade: {e}")
         return None
 
-# --- Carregamento dos Dados ---
-
-# Para usar os dados da API, comente a linha abaixo e descomente a próxima.
-df = buscar_dados_excel()
-# df = buscar_dados_api()
-
 # --- Sidebar ---
 # Logo na Sidebar
 try:
@@ -158,10 +239,20 @@ except:
 
 st.sidebar.header("🔍 Filtros")
 
-# Botão para atualizar dados
+# Botão para atualizar dados: a nova versão é montada em segundo plano e só
+# substitui a atual quando estiver pronta, sem limpar o cache dos demais usuários
 if st.sidebar.button("🔄 Atualizar Dados"):
-    st.cache_data.clear()
-    st.rerun()
+    try:
+        if atualizar_dados():
+            st.sidebar.info("Carregando a nova versão dos dados em segundo plano. Ela aparece na próxima interação.")
+        else:
+            st.sidebar.success("Os dados já estão na versão mais recente.")
+    except FileNotFoundError:
+        pass  # o aviso de arquivo ausente é exibido no carregamento dos dados
+
+erro_atualizacao = estado_atualizacao()['erro']
+if erro_atualizacao:
+    st.sidebar.warning(f"Falha ao carregar a nova versão dos dados: {erro_atualizacao}")
 
 # Menu de Análises
 st.sidebar.markdown("---")
@@ -176,10 +267,18 @@ tipo_analise = st.sidebar.selectbox(
     help="A Projeção de Conformidade mostra análise detalhada de formandos e impacto nas bolsas"
 )
 
+# --- Carregamento dos Dados ---
+
+# Cada análise lê apenas as colunas que utiliza (ver bolsistas/visoes.py).
+# Versão, dados e derivados vêm de uma única leitura e valem para toda a execução.
+# Para usar os dados da API, comente a linha abaixo e descomente a próxima.
+versao_dados, df, derivado = buscar_dados_excel(COLUNAS_POR_VISAO[tipo_analise])
+# versao_dados, df, derivado = buscar_conjunto_api()
+
 # Filtro por Filial
 if not df.empty:
-    # Preparar opções de filial
-    filiais_disponiveis = df['CODFILIAL'].dropna().unique()
+    # Preparar opções de filial (códigos inteiros normalizados na carga, sem subtotais)
+    filiais_disponiveis = sorted(df.loc[df['FILIAL_VALIDA'] & ~df['LINHA_SUBTOTAL'], 'CODFILIAL'].unique())
     filiais_opcoes = ['Todas as Filiais']
     
     # Mapear códigos para nomes
@@ -188,18 +287,9 @@ if not df.empty:
         7: 'Filial 7 - Espírito Santo'
     }
     
-    # Usar set para evitar duplicatas
-    codigos_processados = set()
-    
-    for filial in filiais_disponiveis:
-        # Extrair apenas o código numérico, ignorando "Total"
-        codigo_str = str(filial).replace(' Total', '')
-        if codigo_str.isdigit():
-            codigo_filial = int(codigo_str)
-            # Só adicionar se não foi processado ainda
-            if codigo_filial not in codigos_processados and codigo_filial in mapeamento_filiais:
-                filiais_opcoes.append(mapeamento_filiais[codigo_filial])
-                codigos_processados.add(codigo_filial)
+    for codigo_filial in filiais_disponiveis:
+        if codigo_filial in mapeamento_filiais:
+            filiais_opcoes.append(mapeamento_filiais[codigo_filial])
     
     # Widget de seleção de filial
     filial_selecionada = st.sidebar.selectbox(
@@ -214,19 +304,21 @@ if not df.empty:
             codigo_filtro = 4
         elif 'Espírito Santo' in filial_selecionada:
             codigo_filtro = 7
+        filial_cubo = codigo_filtro
         
         # Filtrar dados (incluir dados da filial específica e dados gerais sem filial)
         # Excluir linhas de total
         df_filtrado = df[
             ((df['CODFILIAL'] == codigo_filtro) | (df['CODFILIAL'].isna())) &
-            (~df['CODFILIAL'].astype(str).str.endswith(' Total'))
+            (~df['LINHA_SUBTOTAL'])
         ]
         
         # Mostrar informação do filtro aplicado
         st.sidebar.success(f"Filtro aplicado: {filial_selecionada}")
     else:
         # Para "Todas as Filiais", também excluir linhas de total
-        df_filtrado = df[~df['CODFILIAL'].astype(str).str.endswith(' Total')]
+        df_filtrado = df[~df['LINHA_SUBTOTAL']]
+        filial_cubo = TODAS_FILIAIS
         st.sidebar.info("Mostrando dados de todas as filiais")
 else:
     df_filtrado = df
@@ -234,13 +326,17 @@ else:
 # --- Renderização do Dashboard ---
 
 if not df_filtrado.empty:
+    # Indicadores pré-calculados da filial selecionada (consulta ao cubo)
+    cubo = buscar_cubo_indicadores(derivado)
+    indicadores = indicadores_filial(cubo, filial_cubo)
+
     if tipo_analise == "Dashboard Principal":
         # --- KPIs Principais ---
         st.subheader("📈 Indicadores Principais")
-        total_matriculados = df_filtrado['TOTAL_MATRICULADOS'].fillna(0).sum()
-        total_bolsistas = df_filtrado['TOTAL_INSTITUCIONAL'].fillna(0).sum()
-        total_prouni = df_filtrado['TOTAL_PROUNI'].fillna(0).sum()
-        total_assistencial = df_filtrado['TOTAL_ASSISTENCIAL_100'].fillna(0).sum() + df_filtrado['TOTAL_ASSISTENCIAL_50'].fillna(0).sum()
+        total_matriculados = indicadores['TOTAL_MATRICULADOS']
+        total_bolsistas = indicadores['TOTAL_INSTITUCIONAL']
+        total_prouni = indicadores['TOTAL_PROUNI']
+        total_assistencial = indicadores['TOTAL_ASSISTENCIAL']
 
         col1, col2, col3, col4 = st.columns(4)
         col1.metric("Total de Alunos Matriculados", f"{int(total_matriculados):,}".replace(",", "."))
@@ -254,8 +350,7 @@ if not df_filtrado.empty:
         st.subheader("Total de Alunos Matriculados por Curso")
         
         # Criar DataFrame limpo apenas com as colunas necessárias
-        df_grafico = df_filtrado[['NOMECURSO', 'TOTAL_MATRICULADOS']].copy()
-        df_grafico = df_grafico.fillna(0)
+        df_grafico = df_filtrado[['NOMECURSO', 'TOTAL_MATRICULADOS']].fillna({'TOTAL_MATRICULADOS': 0})
         
         # Gráfico super simples - SEM texto nas barras
         fig = px.bar(
@@ -290,10 +385,10 @@ if not df_filtrado.empty:
         bolsas_data = {
             'Tipo de Bolsa': ['Institucional', 'ProUni', 'Assistencial 100%', 'Assistencial 50%'],
             'Quantidade': [
-                df_filtrado['TOTAL_INSTITUCIONAL'].fillna(0).sum(),
-                df_filtrado['TOTAL_PROUNI'].fillna(0).sum(),
-                df_filtrado['TOTAL_ASSISTENCIAL_100'].fillna(0).sum(),
-                df_filtrado['TOTAL_ASSISTENCIAL_50'].fillna(0).sum()
+                indicadores['TOTAL_INSTITUCIONAL'],
+                indicadores['TOTAL_PROUNI'],
+                indicadores['TOTAL_ASSISTENCIAL_100'],
+                indicadores['TOTAL_ASSISTENCIAL_50']
             ]
         }
         
@@ -314,11 +409,11 @@ if not df_filtrado.empty:
         
         # Selecionar apenas as colunas de bolsas para o gráfico
         colunas_bolsas = ['NOMECURSO', 'TOTAL_INSTITUCIONAL', 'TOTAL_PROUNI', 'TOTAL_ASSISTENCIAL_100', 'TOTAL_ASSISTENCIAL_50']
-        df_bolsas_temp = df_filtrado[colunas_bolsas].copy()
         
-        # Preencher valores nulos com 0
-        for col in ['TOTAL_INSTITUCIONAL', 'TOTAL_PROUNI', 'TOTAL_ASSISTENCIAL_100', 'TOTAL_ASSISTENCIAL_50']:
-            df_bolsas_temp[col] = df_bolsas_temp[col].fillna(0)
+        # Preencher valores nulos com 0 (fillna já devolve um novo DataFrame)
+        df_bolsas_temp = df_filtrado[colunas_bolsas].fillna({
+            col: 0 for col in ['TOTAL_INSTITUCIONAL', 'TOTAL_PROUNI', 'TOTAL_ASSISTENCIAL_100', 'TOTAL_ASSISTENCIAL_50']
+        })
         
         df_melted = df_bolsas_temp.melt(
             id_vars=['NOMECURSO'], 
@@ -351,98 +446,33 @@ if not df_filtrado.empty:
         # --- Tabela de Dados Completos ---
         st.subheader("Dados Completos")
         
-        # Criar DataFrame com totalizadores por filial
-        df_com_totais = pd.DataFrame()
-        
-        # Obter filiais únicas (excluindo totais existentes)
-        df_dados_limpos = df_filtrado[~df_filtrado['CODFILIAL'].astype(str).str.endswith(' Total')]
-        filiais_unicas = sorted(df_dados_limpos['CODFILIAL'].dropna().astype(str).unique())
+        # Cursos sem as linhas de subtotal do ERP
+        df_dados_limpos = df_filtrado[~df_filtrado['LINHA_SUBTOTAL']].drop(columns=list(COLUNAS_DERIVADAS_FILIAL))
         
         # Colunas numéricas para totalização
         colunas_numericas = ['TOTAL_MATRICULADOS', 'ALUNOS_PAGANTES', 'FORMANDOS_NAO_CEBAS', 
                            'TOTAL_INSTITUCIONAL', 'TOTAL_ASSISTENCIAL_100', 'TOTAL_ASSISTENCIAL_50', 
                            'FORMANDOS_ASSISTENCIAL', 'TOTAL_PROUNI']
         
-        # Converter colunas numéricas para inteiros nos dados originais
-        df_dados_limpos_copy = df_dados_limpos.copy()
-        
-        # Converter CODFILIAL para string para evitar problemas de tipo ao adicionar totais
-        df_dados_limpos_copy['CODFILIAL'] = df_dados_limpos_copy['CODFILIAL'].astype(str)
-        
-        # Converter TODAS as colunas numéricas para inteiros (exceto CODFILIAL e NOMECURSO)
-        for col in df_dados_limpos_copy.columns:
-            if col not in ['CODFILIAL', 'NOMECURSO'] and df_dados_limpos_copy[col].dtype in ['float64', 'float32']:
-                try:
-                    df_dados_limpos_copy[col] = df_dados_limpos_copy[col].fillna(0).astype(int)
-                except:
-                    pass
+        # Cursos de cada filial + total da filial + total geral, num único agrupamento
+        df_com_totais = totalizar_por_filial(
+            df_dados_limpos,
+            colunas_numericas,
+            rotulos_subtotal={4: "📊 TOTAL SP", 7: "📊 TOTAL SC"}
+        )
+        tipo_linha = df_com_totais.pop('TIPO_LINHA')
         
-        for filial in filiais_unicas:
-            # Adicionar cursos da filial (agora ambos são strings)
-            cursos_filial = df_dados_limpos_copy[df_dados_limpos_copy['CODFILIAL'] == filial].copy()
-            df_com_totais = pd.concat([df_com_totais, cursos_filial], ignore_index=True)
-            
-            # Calcular total da filial
-            total_filial = {}
-            total_filial['CODFILIAL'] = f"TOTAL_{filial}"
-            
-            # Definir nome baseado na filial
-            if filial == '4':
-                total_filial['NOMECURSO'] = "📊 TOTAL SP"
-            elif filial == '7':
-                total_filial['NOMECURSO'] = "📊 TOTAL SC"
-            else:
-                total_filial['NOMECURSO'] = f"📊 TOTAL FILIAL {filial}"
-            
-            # Calcular totais para todas as colunas numéricas
-            for col in cursos_filial.columns:
-                if cursos_filial[col].dtype in ['int64', 'float64', 'float32']:
-                    valor = cursos_filial[col].fillna(0).sum()
-                    total_filial[col] = int(valor)
-                elif col not in ['CODFILIAL', 'NOMECURSO']:
-                    total_filial[col] = ""
-            
-            # Preencher outras colunas com valores vazios
-            for col in df_dados_limpos_copy.columns:
-                if col not in total_filial:
-                    total_filial[col] = ""
-            
-            # Adicionar linha de total da filial
-            df_com_totais = pd.concat([df_com_totais, pd.DataFrame([total_filial])], ignore_index=True)
-        
-        # Calcular total geral
-        total_geral = {}
-        total_geral['CODFILIAL'] = "TOTAL_GERAL"
-        total_geral['NOMECURSO'] = "🎯 TOTAL GERAL"
-        
-        # Calcular totais gerais para todas as colunas numéricas
-        for col in df_dados_limpos_copy.columns:
-            if col not in ['CODFILIAL', 'NOMECURSO'] and df_dados_limpos_copy[col].dtype in ['int64', 'float64', 'float32']:
-                valor = df_dados_limpos_copy[col].fillna(0).sum()
-                total_geral[col] = int(valor)
-            elif col not in ['CODFILIAL', 'NOMECURSO']:
-                total_geral[col] = ""
-        
-        # Preencher outras colunas com valores vazios
-        for col in df_dados_limpos_copy.columns:
-            if col not in total_geral:
-                total_geral[col] = ""
-        
-        # Adicionar linha de total geral
-        df_com_totais = pd.concat([df_com_totais, pd.DataFrame([total_geral])], ignore_index=True)
-        
-        # Aplicar estilo condicional com cores mais visíveis
-        def aplicar_estilo_totais(row):
-            if 'TOTAL SP' in str(row['NOMECURSO']) or 'TOTAL SC' in str(row['NOMECURSO']):
-                return ['background-color: #bbdefb; font-weight: bold; border-top: 2px solid #1976d2; color: #000000;'] * len(row)
-            elif 'TOTAL GERAL' in str(row['NOMECURSO']):
-                return ['background-color: #c8e6c9; font-weight: bold; border-top: 3px solid #388e3c; border-bottom: 3px solid #388e3c; color: #000000;'] * len(row)
-            else:
-                return [''] * len(row)
+        # Destacar linhas de total com cores mais visíveis
+        css_totais = calcular_css_tabela("dados_completos", versao_dados, filial_selecionada, df_com_totais, {
+            'linhas': [
+                (tipo_linha == SUBTOTAL, 'background-color: #bbdefb; font-weight: bold; border-top: 2px solid #1976d2; color: #000000;'),
+                (tipo_linha == TOTAL, 'background-color: #c8e6c9; font-weight: bold; border-top: 3px solid #388e3c; border-bottom: 3px solid #388e3c; color: #000000;'),
+            ]
+        })
         
         # Exibir tabela de dados completos
         st.dataframe(
-            df_com_totais.style.apply(aplicar_estilo_totais, axis=1),
+            aplicar_css(df_com_totais, css_totais),
             use_container_width=True
         )
         
@@ -450,7 +480,7 @@ if not df_filtrado.empty:
         st.header("🚨 Conformidade e Alertas")
         st.markdown("**Análise de conformidade baseada nos dados reais de bolsistas**")
         
-        dados_conformidade = gerar_dados_conformidade_reais()
+        dados_conformidade = gerar_dados_conformidade_reais(derivado)
 
         if dados_conformidade is not None:
             df_conformidade, df_detalhado = dados_conformidade
@@ -458,7 +488,7 @@ if not df_filtrado.empty:
         else:
             # Fallback para dados de exemplo
             try:
-                df_conformidade = pd.read_excel('dados_conformidade_exemplo.xlsx')
+                df_conformidade = ler_planilha('dados_conformidade_exemplo.xlsx')
                 df_detalhado = df_conformidade.copy()
                 st.warning("⚠️ Usando dados de exemplo. Verifique se o arquivo 'dados_bolsistas.xlsx' está disponível.")
             except FileNotFoundError:
@@ -467,43 +497,36 @@ if not df_filtrado.empty:
         
         # Aplicar filtro por filial selecionada se não for "Todas as Filiais"
         if filial_selecionada != 'Todas as Filiais':
-            # Determinar código da filial
-            if 'São Paulo' in filial_selecionada:
-                codigo_filtro = '4'
-            elif 'Espírito Santo' in filial_selecionada:
-                codigo_filtro = '7'
-            
-            # Filtrar dados detalhados por filial
+            # Filtrar dados detalhados por filial (codigo_filtro definido no filtro da barra lateral)
             if 'CODFILIAL' in df_detalhado.columns:
                 df_detalhado = df_detalhado[df_detalhado['CODFILIAL'] == codigo_filtro]
                 
                 # Recalcular dados de conformidade agregados para a filial selecionada
-                df_conformidade = df_detalhado.groupby('NOMECURSO').agg({
+                df_conformidade = df_detalhado.groupby('NOMECURSO', observed=True).agg({
                     'PROUNI_SOBRA_FALTA': 'sum',
                     'FILANTROPIA_SOBRA_FALTA': 'sum'
                 }).reset_index()
                 
-                # Converter para inteiros
-                df_conformidade['PROUNI_SOBRA_FALTA'] = df_conformidade['PROUNI_SOBRA_FALTA'].fillna(0).round().astype(int)
-                df_conformidade['FILANTROPIA_SOBRA_FALTA'] = df_conformidade['FILANTROPIA_SOBRA_FALTA'].fillna(0).round().astype(int)
-                
                 st.info(f"📍 Dados filtrados para: {filial_selecionada}")
             else:
                 st.warning("⚠️ Dados de filial não disponíveis para filtro")
         
         # Adicionar colunas de conformidade "Atende" e "Não Atende"
-        df_conformidade['PROUNI_Atende'] = df_conformidade['PROUNI_SOBRA_FALTA'].apply(lambda x: 'Atende' if x >= 0 else 'Não Atende')
-        df_conformidade['FILANTROPIA_Atende'] = df_conformidade['FILANTROPIA_SOBRA_FALTA'].apply(lambda x: 'Atende' if x >= 0 else 'Não Atende')
+        df_conformidade['PROUNI_Atende'] = classificar_saldo(df_conformidade['PROUNI_SOBRA_FALTA'])
+        df_conformidade['FILANTROPIA_Atende'] = classificar_saldo(df_conformidade['FILANTROPIA_SOBRA_FALTA'])
             
         # --- KPIs de Alertas ---
         st.subheader("🚨 Indicadores de Conformidade")
         
-        saldo_prouni = df_conformidade['PROUNI_SOBRA_FALTA'].sum()
-        saldo_filantropia = df_conformidade['FILANTROPIA_SOBRA_FALTA'].sum()
-        cursos_deficit = len(df_conformidade[
-            (df_conformidade['PROUNI_SOBRA_FALTA'] < 0) | 
-            (df_conformidade['FILANTROPIA_SOBRA_FALTA'] < 0)
-        ])
+        # Dados reais vêm do cubo; dados de exemplo são resumidos na hora
+        if dados_conformidade is not None:
+            resumo_conformidade = indicadores
+        else:
+            resumo_conformidade = indicadores_conformidade(df_conformidade)
+        
+        saldo_prouni = resumo_conformidade['SALDO_PROUNI']
+        saldo_filantropia = resumo_conformidade['SALDO_FILANTROPIA']
+        cursos_deficit = resumo_conformidade['CURSOS_DEFICIT']
         
         col1, col2, col3 = st.columns(3)
         
@@ -560,85 +583,47 @@ if not df_filtrado.empty:
         # --- Tabela Detalhada com Estilização ---
         st.subheader("📋 Tabela Detalhada de Conformidade")
         
-        def aplicar_estilo_conformidade(val):
-            if pd.isna(val):
-                return ''
-            if val > 0:
-                return 'background-color: #d4edda; color: #155724'  # Verde claro
-            elif val < 0:
-                return 'background-color: #f8d7da; color: #721c24'  # Vermelho claro
-            else:
-                return 'background-color: #d1ecf1; color: #0c5460'  # Azul claro
+        # Saldos: verde claro (sobra), vermelho claro (falta) e azul claro (zero)
+        estilo_saldos = {
+            coluna: (
+                'background-color: #d4edda; color: #155724',
+                'background-color: #f8d7da; color: #721c24',
+                'background-color: #d1ecf1; color: #0c5460'
+            )
+            for coluna in ['PROUNI_SOBRA_FALTA', 'FILANTROPIA_SOBRA_FALTA']
+        }
         
-        def aplicar_estilo_atende(val):
-            if val == 'Atende':
-                return 'background-color: #d4edda; color: #155724; font-weight: bold'  # Verde
-            elif val == 'Não Atende':
-                return 'background-color: #f8d7da; color: #721c24; font-weight: bold'  # Vermelho
-            else:
-                return ''
+        # Linhas de total da filial e total geral
+        estilo_linhas_total = [
+            (SUBTOTAL, 'background-color: #6c757d; color: white; font-weight: bold'),
+            (TOTAL, 'background-color: #343a40; color: white; font-weight: bold')
+        ]
+        
+        # Atende em verde e Não Atende em vermelho
+        estilo_atende = {
+            coluna: {
+                ATENDE: 'background-color: #d4edda; color: #155724; font-weight: bold',
+                NAO_ATENDE: 'background-color: #f8d7da; color: #721c24; font-weight: bold'
+            }
+            for coluna in ['PROUNI_Atende', 'FILANTROPIA_Atende']
+        }
         
         # Verificar se df_detalhado existe e tem a coluna CODFILIAL
         if 'df_detalhado' in locals() and df_detalhado is not None and 'CODFILIAL' in df_detalhado.columns and not df_detalhado.empty:
             # Usar dados detalhados com informações de filial
             df_display = df_detalhado.copy()
             
-            # Adicionar colunas de conformidade aos dados detalhados
-            df_display['PROUNI_Atende'] = df_display['PROUNI_SOBRA_FALTA'].apply(lambda x: 'Atende' if x >= 0 else 'Não Atende')
-            df_display['FILANTROPIA_Atende'] = df_display['FILANTROPIA_SOBRA_FALTA'].apply(lambda x: 'Atende' if x >= 0 else 'Não Atende')
-            
-            filiais_unicas = sorted(df_display['CODFILIAL'].dropna().astype(str).unique())
-            
-            # Criar lista para dados reorganizados
-            dados_reorganizados = []
-            
-            # Para cada filial, adicionar seus cursos + total da filial
-            for filial in filiais_unicas:
-                # Adicionar todos os cursos da filial
-                df_filial = df_display[df_display['CODFILIAL'] == filial]
-                dados_reorganizados.extend(df_filial.to_dict('records'))
-                
-                # Calcular e adicionar total da filial
-                total_prouni = int(df_filial['PROUNI_SOBRA_FALTA'].sum())
-                total_filantropia = int(df_filial['FILANTROPIA_SOBRA_FALTA'].sum())
-                
-                linha_total_filial = {
-                    'CODFILIAL': f'TOTAL_{filial}',
-                    'NOMECURSO': f'📊 TOTAL FILIAL {filial}',
-                    'PROUNI_SOBRA_FALTA': total_prouni,
-                    'FILANTROPIA_SOBRA_FALTA': total_filantropia,
-                    'PROUNI_Atende': 'Atende' if total_prouni >= 0 else 'Não Atende',
-                    'FILANTROPIA_Atende': 'Atende' if total_filantropia >= 0 else 'Não Atende'
-                }
-                # Adicionar outras colunas se existirem
-                for col in df_display.columns:
-                    if col not in linha_total_filial:
-                        linha_total_filial[col] = ''
-                
-                dados_reorganizados.append(linha_total_filial)
-            
-            # Adicionar total geral no final se houver mais de uma filial
-            if len(filiais_unicas) > 1:
-                total_geral_prouni = int(df_display['PROUNI_SOBRA_FALTA'].sum())
-                total_geral_filantropia = int(df_display['FILANTROPIA_SOBRA_FALTA'].sum())
-                
-                linha_total_geral = {
-                    'CODFILIAL': 'GERAL',
-                    'NOMECURSO': '🎯 TOTAL GERAL',
-                    'PROUNI_SOBRA_FALTA': total_geral_prouni,
-                    'FILANTROPIA_SOBRA_FALTA': total_geral_filantropia,
-                    'PROUNI_Atende': 'Atende' if total_geral_prouni >= 0 else 'Não Atende',
-                    'FILANTROPIA_Atende': 'Atende' if total_geral_filantropia >= 0 else 'Não Atende'
-                }
-                # Adicionar outras colunas se existirem
-                for col in df_display.columns:
-                    if col not in linha_total_geral:
-                        linha_total_geral[col] = ''
-                
-                dados_reorganizados.append(linha_total_geral)
+            # Cursos de cada filial + total da filial + total geral (este só com mais de uma filial)
+            df_final = totalizar_por_filial(
+                df_display,
+                ['PROUNI_SOBRA_FALTA', 'FILANTROPIA_SOBRA_FALTA'],
+                incluir_total=df_display['CODFILIAL'].nunique() > 1
+            )
+            tipo_linha = df_final.pop('TIPO_LINHA')
             
-            # Criar DataFrame final reorganizado
-            df_final = pd.DataFrame(dados_reorganizados)
+            # Adicionar colunas de conformidade (inclusive nas linhas de total)
+            df_final['PROUNI_Atende'] = classificar_saldo(df_final['PROUNI_SOBRA_FALTA'])
+            df_final['FILANTROPIA_Atende'] = classificar_saldo(df_final['FILANTROPIA_SOBRA_FALTA'])
             
             # Definir ordem padrão das colunas
             colunas_ordenadas = ['NOMECURSO', 'PROUNI_SOBRA_FALTA', 'PROUNI_Atende', 'FILANTROPIA_SOBRA_FALTA', 'FILANTROPIA_Atende']
@@ -652,35 +637,13 @@ if not df_filtrado.empty:
             # Reorganizar DataFrame com a ordem desejada
             df_final = df_final[colunas_existentes + outras_colunas]
             
-            # Aplicar estilo especial para linhas de total
-            def aplicar_estilo_linha(row):
-                styles = [''] * len(row)
-                
-                # Verificar se é linha de total
-                if 'TOTAL GERAL' in str(row['NOMECURSO']):
-                    styles = ['background-color: #343a40; color: white; font-weight: bold'] * len(row)
-                elif 'TOTAL FILIAL' in str(row['NOMECURSO']):
-                    styles = ['background-color: #6c757d; color: white; font-weight: bold'] * len(row)
-                else:
-                    # Aplicar estilo normal para valores numéricos
-                    for i, (col_name, val) in enumerate(row.items()):
-                        if col_name in ['PROUNI_SOBRA_FALTA', 'FILANTROPIA_SOBRA_FALTA'] and pd.notna(val):
-                            if val > 0:
-                                styles[i] = 'background-color: #d4edda; color: #155724'
-                            elif val < 0:
-                                styles[i] = 'background-color: #f8d7da; color: #721c24'
-                            else:
-                                styles[i] = 'background-color: #d1ecf1; color: #0c5460'
-                        elif col_name in ['PROUNI_Atende', 'FILANTROPIA_Atende']:
-                            if val == 'Atende':
-                                styles[i] = 'background-color: #d4edda; color: #155724; font-weight: bold'
-                            elif val == 'Não Atende':
-                                styles[i] = 'background-color: #f8d7da; color: #721c24; font-weight: bold'
-                
-                return styles
-            
-            # Aplicar estilo à tabela final
-            df_styled = df_final.style.apply(aplicar_estilo_linha, axis=1)
+            # Estilo das células de saldo e atendimento, com as linhas de total por cima
+            css_conformidade = calcular_css_tabela("conformidade", versao_dados, filial_selecionada, df_final, {
+                'saldos': estilo_saldos,
+                'rotulos': estilo_atende,
+                'linhas': [(tipo_linha == tipo, css) for tipo, css in estilo_linhas_total]
+            })
+            df_styled = aplicar_css(df_final, css_conformidade)
             
         else:
             # Caso não tenha dados detalhados ou estejam vazios, usar dados de conformidade agregados
@@ -690,13 +653,7 @@ if not df_filtrado.empty:
                 df_display = df_conformidade[colunas_ordenadas].copy()
                 
                 # Aplicar estilo
-                df_styled = df_display.style.map(
-                    aplicar_estilo_conformidade, 
-                    subset=['PROUNI_SOBRA_FALTA', 'FILANTROPIA_SOBRA_FALTA']
-                ).map(
-                    aplicar_estilo_atende,
-                    subset=['PROUNI_Atende', 'FILANTROPIA_Atende']
-                )
+                df_styled = estilizar(df_display, saldos=estilo_saldos, rotulos=estilo_atende)
             else:
                 st.error("❌ Nenhum dado de conformidade disponível para exibição")
                 df_styled = None
@@ -715,17 +672,17 @@ if not df_filtrado.empty:
         
         with col1:
             st.write("**PROUNI:**")
-            st.write(f"• Sobra Total: {df_conformidade[df_conformidade['PROUNI_SOBRA_FALTA'] > 0]['PROUNI_SOBRA_FALTA'].sum():.0f}")
-            st.write(f"• Falta Total: {abs(df_conformidade[df_conformidade['PROUNI_SOBRA_FALTA'] < 0]['PROUNI_SOBRA_FALTA'].sum()):.0f}")
-            st.write(f"• Cursos com Sobra: {len(df_conformidade[df_conformidade['PROUNI_SOBRA_FALTA'] > 0])}")
-            st.write(f"• Cursos com Falta: {len(df_conformidade[df_conformidade['PROUNI_SOBRA_FALTA'] < 0])}")
+            st.write(f"• Sobra Total: {resumo_conformidade['SOBRA_PROUNI']}")
+            st.write(f"• Falta Total: {resumo_conformidade['FALTA_PROUNI']}")
+            st.write(f"• Cursos com Sobra: {resumo_conformidade['CURSOS_SOBRA_PROUNI']}")
+            st.write(f"• Cursos com Falta: {resumo_conformidade['CURSOS_FALTA_PROUNI']}")
         
         with col2:
             st.write("**Filantropia:**")
-            st.write(f"• Sobra Total: {df_conformidade[df_conformidade['FILANTROPIA_SOBRA_FALTA'] > 0]['FILANTROPIA_SOBRA_FALTA'].sum():.0f}")
-            st.write(f"• Falta Total: {abs(df_conformidade[df_conformidade['FILANTROPIA_SOBRA_FALTA'] < 0]['FILANTROPIA_SOBRA_FALTA'].sum()):.0f}")
-            st.write(f"• Cursos com Sobra: {len(df_conformidade[df_conformidade['FILANTROPIA_SOBRA_FALTA'] > 0])}")
-            st.write(f"• Cursos com Falta: {len(df_conformidade[df_conformidade['FILANTROPIA_SOBRA_FALTA'] < 0])}")
+            st.write(f"• Sobra Total: {resumo_conformidade['SOBRA_FILANTROPIA']}")
+            st.write(f"• Falta Total: {resumo_conformidade['FALTA_FILANTROPIA']}")
+            st.write(f"• Cursos com Sobra: {resumo_conformidade['CURSOS_SOBRA_FILANTROPIA']}")
+            st.write(f"• Cursos com Falta: {resumo_conformidade['CURSOS_FALTA_FILANTROPIA']}")
     
     elif "Projeção de Conformidade" in tipo_analise:
         st.header("🔮 Projeção de Conformidade - Análise de Formandos")
@@ -750,10 +707,10 @@ if not df_filtrado.empty:
                 
                 df_projecao = df[
                     ((df['CODFILIAL'] == codigo_filtro) | (df['CODFILIAL'].isna())) &
-                    (~df['CODFILIAL'].astype(str).str.contains('TOTAL', na=False))
+                    (~df['LINHA_SUBTOTAL'])
                 ].copy()
             else:
-                df_projecao = df[~df['CODFILIAL'].astype(str).str.contains('TOTAL', na=False)].copy()
+                df_projecao = df[~df['LINHA_SUBTOTAL']].copy()
             
             # Calcular total de formandos (CEBAS + Assistencial)
             df_projecao['TOTAL_FORMANDOS'] = (
@@ -772,9 +729,9 @@ if not df_filtrado.empty:
             # --- INDICADORES PRINCIPAIS DE PROJEÇÃO ---
             st.subheader("📊 Indicadores de Impacto - Próximo Período")
             
-            total_formandos = df_projecao['TOTAL_FORMANDOS'].sum()
-            total_bolsas_perdidas = df_projecao['FORMANDOS_ASSISTENCIAL'].fillna(0).sum()
-            total_bolsas_atuais = df_projecao['TOTAL_BOLSAS_ATUAIS'].sum()
+            total_formandos = indicadores['TOTAL_FORMANDOS']
+            total_bolsas_perdidas = indicadores['BOLSAS_PERDIDAS']
+            total_bolsas_atuais = indicadores['BOLSAS_ATUAIS']
             percentual_impacto = (total_bolsas_perdidas / total_bolsas_atuais * 100) if total_bolsas_atuais > 0 else 0
             
             col1, col2, col3, col4 = st.columns(4)
@@ -824,11 +781,9 @@ if not df_filtrado.empty:
                 # Calcular métricas por curso
                 df_analise['BOLSAS_PERDIDAS'] = df_analise['FORMANDOS_ASSISTENCIAL'].fillna(0)
                 df_analise['PERCENTUAL_IMPACTO'] = (
-                    df_analise['BOLSAS_PERDIDAS'] / df_analise['TOTAL_BOLSAS_ATUAIS'] * 100
+                    df_analise['BOLSAS_PERDIDAS'].astype('float64') / df_analise['TOTAL_BOLSAS_ATUAIS'].astype('float64') * 100
                 ).fillna(0)
-                df_analise['STATUS_RISCO'] = df_analise['PERCENTUAL_IMPACTO'].apply(
-                    lambda x: "🔴 Alto" if x > 20 else "🟡 Médio" if x > 10 else "🟢 Baixo"
-                )
+                df_analise['STATUS_RISCO'] = classificar_risco(df_analise['PERCENTUAL_IMPACTO'])
                 
                 # Selecionar colunas para exibição
                 colunas_exibir = ['NOMECURSO', 'TOTAL_FORMANDOS', 'BOLSAS_PERDIDAS', 
@@ -885,9 +840,9 @@ if not df_filtrado.empty:
                 st.subheader("📈 Análise de Tendências e Recomendações")
                 
                 # Calcular estatísticas
-                cursos_alto_risco = len(df_analise[df_analise['PERCENTUAL_IMPACTO'] > 20])
-                cursos_medio_risco = len(df_analise[(df_analise['PERCENTUAL_IMPACTO'] > 10) & (df_analise['PERCENTUAL_IMPACTO'] <= 20)])
-                cursos_baixo_risco = len(df_analise[df_analise['PERCENTUAL_IMPACTO'] <= 10])
+                cursos_alto_risco = indicadores['CURSOS_ALTO_RISCO']
+                cursos_medio_risco = indicadores['CURSOS_MEDIO_RISCO']
+                cursos_baixo_risco = indicadores['CURSOS_BAIXO_RISCO']
                 
                 col1, col2, col3 = st.columns(3)
                 
@@ -947,6 +902,56 @@ if not df_filtrado.empty:
                     - Considerar redistribuição de recursos
                     """)
                 
+                # Plano mínimo: bolsas remanejadas de cursos com sobra e bolsas novas para o restante
+                st.markdown("**🧮 Plano de Redistribuição — após as formaturas do período**")
+                permitir_entre_filiais = st.checkbox("Permitir remanejamento entre filiais", value=False)
+                base_cenarios = derivado('base_cenarios', montar_base_cenarios)
+                filial_cenario = None if filial_cubo == TODAS_FILIAIS else filial_cubo
+                situacao_formatura = projetar_cenario(
+                    base_cenarios, {f'formatura_{programa}': 1 for programa in PROGRAMAS}
+                )
+                plano, remanejamentos = otimizar_redistribuicao(situacao_formatura, entre_filiais=permitir_entre_filiais)
+                if filial_cenario is not None:
+                    plano = plano[(plano['CODFILIAL'] == filial_cenario) | plano['CODFILIAL'].isna()]
+                    remanejamentos = remanejamentos[
+                        (remanejamentos['FILIAL_ORIGEM'] == filial_cenario) | (remanejamentos['FILIAL_DESTINO'] == filial_cenario)
+                    ]
+                
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Novas Bolsas PROUNI", int(plano['NOVAS_PROUNI'].sum()))
+                with col2:
+                    st.metric("Novas Bolsas Assistenciais", int(plano['NOVAS_ASSISTENCIAIS'].sum()))
+                with col3:
+                    st.metric("Bolsas Remanejadas", int(remanejamentos['QUANTIDADE'].sum()))
+                
+                # Cursos com menos pagantes do que bolsas necessárias não chegam a 'Atende'
+                inviaveis = plano[plano['INVIAVEL']]
+                if not inviaveis.empty:
+                    st.error("**⛔ Cursos sem solução:** não há alunos pagantes suficientes para as bolsas necessárias\n" + "\n".join(
+                        f"- {linha.NOMECURSO} (filial {linha.CODFILIAL}): faltam {linha.BOLSAS_FALTANTES} bolsa(s) além das concedidas"
+                        for linha in inviaveis.itertuples(index=False)
+                    ))
+                
+                acoes = plano[(plano[['NOVAS_PROUNI', 'NOVAS_ASSISTENCIAIS', 'RECEBIDAS', 'CEDIDAS']].sum(axis=1) > 0)
+                              | plano['INVIAVEL']]
+                if acoes.empty:
+                    st.success("✅ Todos os cursos atendem às exigências após as formaturas, sem novas bolsas.")
+                else:
+                    st.dataframe(
+                        acoes.drop(columns='CODFILIAL').rename(columns={
+                            'NOMECURSO': 'Curso', 'SALDO_PROUNI': 'Saldo PROUNI', 'SALDO_FILANTROPIA': 'Saldo Filantropia',
+                            'NOVAS_PROUNI': 'Novas PROUNI', 'NOVAS_ASSISTENCIAIS': 'Novas Assistenciais',
+                            'RECEBIDAS': 'Recebidas', 'CEDIDAS': 'Cedidas',
+                            'SALDO_PROUNI_FINAL': 'Saldo PROUNI Final', 'SALDO_FILANTROPIA_FINAL': 'Saldo Filantropia Final',
+                            'INVIAVEL': 'Inviável', 'BOLSAS_FALTANTES': 'Bolsas Faltantes',
+                        }).round(1),
+                        use_container_width=True, hide_index=True,
+                    )
+                    if not remanejamentos.empty:
+                        st.markdown("**🔁 Remanejamentos sugeridos**")
+                        st.dataframe(remanejamentos, use_container_width=True, hide_index=True)
+                
                 # Projeção de necessidades
                 st.markdown("---")
                 st.subheader("🎯 Projeção de Necessidades")
@@ -967,6 +972,121 @@ if not df_filtrado.empty:
                     - **Processo seletivo:** 2 meses antes
                     - **Implementação:** 1 mês antes das formaturas
                     """)
+                
+                # --- SIMULADOR DE CENÁRIOS ---
+                st.markdown("---")
+                st.subheader("🎛️ Simulador de Cenários")
+                st.markdown("Ajuste as taxas por programa: todos os cursos e filiais são recalculados de uma vez, "
+                            "e cenários já vistos vêm do cache.")
+                
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    formatura_prouni = st.slider("Formatura PROUNI (%)", 0, 100, 100, step=5,
+                                                 help="Parcela dos formandos PROUNI que deixa o programa")
+                    evasao_prouni = st.slider("Evasão PROUNI (%)", 0, 30, 0)
+                with col2:
+                    formatura_assistencial = st.slider("Formatura Assistencial (%)", 0, 100, 100, step=5,
+                                                       help="Parcela dos formandos assistenciais que deixa o programa")
+                    evasao_assistencial = st.slider("Evasão Assistencial (%)", 0, 30, 0)
+                with col3:
+                    formatura_pagantes = st.slider("Formatura Pagantes (%)", 0, 100, 100, step=5)
+                    ingresso_pagantes = st.slider("Ingresso de Pagantes (%)", 0, 30, 0,
+                                                  help="Novos alunos pagantes em relação aos atuais")
+                
+                cenario = {
+                    'formatura_PROUNI': formatura_prouni / 100,
+                    'evasao_PROUNI': evasao_prouni / 100,
+                    'formatura_ASSISTENCIAL_100': formatura_assistencial / 100,
+                    'formatura_ASSISTENCIAL_50': formatura_assistencial / 100,
+                    'evasao_ASSISTENCIAL_100': evasao_assistencial / 100,
+                    'evasao_ASSISTENCIAL_50': evasao_assistencial / 100,
+                    'formatura_PAGANTES': formatura_pagantes / 100,
+                    'ingresso_PAGANTES': ingresso_pagantes / 100,
+                }
+                
+                # Situação atual (cenário neutro) e cenário escolhido numa única avaliação
+                atual, projetado = resumir_cenarios(base_cenarios, [{}, cenario], filial_cenario).to_dict('records')
+                
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Saldo PROUNI Projetado", f"{int(projetado['SALDO_PROUNI']):+d}",
+                              delta=int(projetado['SALDO_PROUNI'] - atual['SALDO_PROUNI']))
+                with col2:
+                    st.metric("Saldo Filantropia Projetado", f"{int(projetado['SALDO_FILANTROPIA']):+d}",
+                              delta=int(projetado['SALDO_FILANTROPIA'] - atual['SALDO_FILANTROPIA']))
+                with col3:
+                    st.metric("Cursos em Déficit", int(projetado['CURSOS_DEFICIT']),
+                              delta=int(projetado['CURSOS_DEFICIT'] - atual['CURSOS_DEFICIT']), delta_color="inverse")
+                
+                # Grade de cenários: evasão e ingresso de pagantes a partir do cenário escolhido
+                st.markdown("**📊 Comparação de Cenários — Saldo Filantropia por evasão (linhas) e ingresso (colunas) de pagantes**")
+                taxas = [0, 0.05, 0.10, 0.15, 0.20]
+                grade = grade_cenarios(cenario, evasao_PAGANTES=taxas, ingresso_PAGANTES=taxas)
+                comparacao = resumir_cenarios(base_cenarios, grade, filial_cenario)
+                tabela_cenarios = comparacao.pivot(
+                    index='evasao_PAGANTES', columns='ingresso_PAGANTES', values='SALDO_FILANTROPIA'
+                ).astype(int)
+                tabela_cenarios.index = [f"Evasão {taxa:.0%}" for taxa in tabela_cenarios.index]
+                tabela_cenarios.columns = [f"Ingresso {taxa:.0%}" for taxa in tabela_cenarios.columns]
+                st.dataframe(tabela_cenarios, use_container_width=True)
+                
+                # Risco estocástico: formatura, evasão e ingresso sorteados em cada tentativa
+                st.subheader("🎲 Risco de Não Conformidade (Monte Carlo)")
+                if st.checkbox("Simular o risco do cenário escolhido", value=False,
+                               help="Sorteia formatura, evasão e ingresso por curso em milhares de tentativas"):
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        tentativas = st.selectbox("Tentativas", [10_000, 50_000, 100_000],
+                                                  format_func=lambda n: f"{n:,}".replace(',', '.'))
+                    with col2:
+                        semente = int(st.number_input("Semente", min_value=0, value=SEMENTE_PADRAO, step=1,
+                                                      help="A mesma semente reproduz o mesmo resultado"))
+                    
+                    with st.spinner("Simulando..."):
+                        risco_cursos, risco_filiais = risco_conformidade(
+                            base_cenarios, versao_dados, cenario, tentativas, semente
+                        )
+                    
+                    if filial_cenario is not None:
+                        risco_filiais = risco_filiais[risco_filiais['CODFILIAL'] == filial_cenario]
+                        risco_cursos = risco_cursos[
+                            (risco_cursos['CODFILIAL'] == filial_cenario) | risco_cursos['CODFILIAL'].isna()
+                        ]
+                    
+                    colunas_filiais = st.columns(max(len(risco_filiais), 1))
+                    for coluna, linha in zip(colunas_filiais, risco_filiais.itertuples(index=False)):
+                        with coluna:
+                            st.metric(f"Filial {linha.CODFILIAL} - Prob. Não Atende", f"{linha.PROB_NAO_ATENDE:.1%}")
+                            st.caption(f"PROUNI: {linha.PROB_NAO_ATENDE_PROUNI:.1%} | "
+                                       f"Filantropia: {linha.PROB_NAO_ATENDE_FILANTROPIA:.1%}")
+                    
+                    tabela_risco = risco_cursos.sort_values('PROB_NAO_ATENDE', ascending=False)
+                    st.dataframe(
+                        tabela_risco.style.format({
+                            'PROB_NAO_ATENDE_PROUNI': '{:.1%}',
+                            'PROB_NAO_ATENDE_FILANTROPIA': '{:.1%}',
+                            'PROB_NAO_ATENDE': '{:.1%}',
+                            'SALDO_PROUNI_MEDIO': '{:+.1f}',
+                            'SALDO_FILANTROPIA_MEDIO': '{:+.1f}',
+                        }),
+                        use_container_width=True, hide_index=True,
+                    )
+                
+                # Coortes: o mesmo cenário aplicado semestre a semestre
+                st.subheader("📈 Trajetória por Coortes")
+                st.markdown("Os alunos de cada curso avançam semestre a semestre: a cada semestre a última turma se forma, "
+                            "as taxas de evasão e ingresso acima se repetem e os saldos são recalculados.")
+                horizonte = st.slider("Horizonte (semestres)", 2, 20, HORIZONTE_PADRAO)
+                trajetoria = trajetoria_saldos(base_cenarios, cenario, horizonte, filial_cenario)
+                fig_trajetoria = px.line(
+                    trajetoria.rename(columns={'SALDO_PROUNI': 'PROUNI', 'SALDO_FILANTROPIA': 'Filantropia'}),
+                    x='SEMESTRE', y=['PROUNI', 'Filantropia'], markers=True,
+                    title="Saldo projetado por semestre",
+                    labels={'SEMESTRE': 'Semestre', 'value': 'Saldo', 'variable': 'Exigência'}
+                )
+                fig_trajetoria.add_hline(y=0, line_dash="dash", line_color="gray")
+                fig_trajetoria.update_layout(height=400)
+                st.plotly_chart(fig_trajetoria, use_container_width=True)
             
             else:
                 st.warning("⚠️ Nenhum curso com formandos identificado nos dados atuais.")
@@ -6,6 +6,14 @@ import plotly.graph_objects as go
 from functools import lru_cache
 import time
 import os
+from bolsistas.acesso import carregar_bolsistas
+from bolsistas.api import buscar_filiais_api, buscar_tabela_api, frescor_api, metricas_api
+from bolsistas.cache_disco import estatisticas as estatisticas_cache
+from bolsistas.coalescencia import metricas_coalescencia
+from bolsistas.esquema import COLUNAS_DERIVADAS_FILIAL, aplicar_esquema, relatorio_memoria
+from bolsistas.leitores import localizar_planilha
+from bolsistas.snapshot import carregar_snapshot
+from bolsistas.visoes import COLUNAS_CONFORMIDADE
 
 # --- Configurações da Página ---
 st.set_page_config(
@@ -104,24 +112,15 @@ def criar_grafico_divergente(df, coluna_valor, titulo, cor_positiva="#28a745", c
     return fig
 
 # --- Funções de Carregamento de Dados Otimizadas ---
-@st.cache_data(ttl=1800)  # Cache por 30 minutos
-def buscar_dados_excel():
+def buscar_dados_excel(colunas=None):
     """
     Carrega os dados de um arquivo Excel local com otimizações.
+    Se 'colunas' for informado, apenas essas colunas são retornadas.
     """
     try:
-        # Usar engine openpyxl para melhor performance
-        df = pd.read_excel("dados_bolsistas.xlsx", engine='openpyxl')
-        
-        # Otimizar tipos de dados
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                try:
-                    df[col] = pd.to_numeric(df[col], errors='ignore')
-                except:
-                    pass
-        
-        return df
+        # Camada compartilhada: uma cópia tipada por versão da planilha para
+        # todos os dashboards do processo (sem cópia por sessão do st.cache_data)
+        return carregar_bolsistas(colunas)
     except FileNotFoundError:
         st.error("Arquivo 'dados_bolsistas.xlsx' não encontrado.")
         return pd.DataFrame()
@@ -129,35 +128,44 @@ def buscar_dados_excel():
         st.error(f"Erro ao carregar dados: {e}")
         return pd.DataFrame()
 
-@st.cache_data(ttl=1800)  # Cache por 30 minutos
+API_URL = st.secrets.get("api", {}).get("url", "https://api.example.com/dados_bolsistas")
+
+# Leitura em lotes (NDJSON ou paginada) para exportações grandes da API
+API_STREAMING = st.secrets.get("api", {}).get("streaming", False)
+
+# Sincronização incremental: a URL (ou a de cada filial) é um feed de alterações e só as linhas alteradas são baixadas
+API_DELTA = st.secrets.get("api", {}).get("delta", False)
+
+# Formato colunar: pede Arrow IPC (colunas já tipadas) e aceita JSON como alternativa
+API_COLUNAR = st.secrets.get("api", {}).get("colunar", False)
+
+# API por filial: URL com {filial} (ex.: ".../dados_bolsistas?filial={filial}") e filiais buscadas
+API_URL_FILIAL = st.secrets.get("api", {}).get("url_filial")
+API_FILIAIS = st.secrets.get("api", {}).get("filiais", [4, 7])
+API_LIMITE_CONCORRENCIA = st.secrets.get("api", {}).get("limite_concorrencia", 4)
+
+# Configurar timeout e headers
+CABECALHOS_API = {
+    'User-Agent': 'Dashboard-Sao-Camilo/1.0',
+    'Accept': 'application/json'
+}
+
 def buscar_dados_api():
     """
-    Busca os dados de um endpoint de API REST com timeout e retry.
+    Busca os dados de um endpoint de API REST com timeout e stale-while-revalidate:
+    passados 30 minutos, os dados em cache continuam sendo servidos na hora
+    enquanto a nova versão é buscada em segundo plano (ver bolsistas/api.py).
+    Com [api] streaming = true, cada lote é convertido assim que chega; com
+    [api] delta = true, só as linhas alteradas desde a última sincronização;
+    com [api] colunar = true, a resposta em Arrow dispensa a decodificação do JSON.
     """
-    API_URL = st.secrets.get("api", {}).get("url", "https://api.example.com/dados_bolsistas")
-    
     try:
-        # Configurar timeout e headers
-        headers = {
-            'User-Agent': 'Dashboard-Sao-Camilo/1.0',
-            'Accept': 'application/json'
-        }
-        
-        response = requests.get(API_URL, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        data = response.json()
-        df = pd.DataFrame(data)
-        
-        # Otimizar tipos de dados
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                try:
-                    df[col] = pd.to_numeric(df[col], errors='ignore')
-                except:
-                    pass
-        
-        return df
+        # Tipos compactos (categorias e Int32) definidos no esquema de bolsistas
+        return buscar_tabela_api(
+            API_URL, headers=CABECALHOS_API, timeout=30,
+            converter=lambda data: aplicar_esquema(pd.DataFrame(data)), streaming=API_STREAMING,
+            delta=API_DELTA, colunar=API_COLUNAR
+        )
     except requests.exceptions.Timeout:
         st.error("Timeout ao buscar dados da API. Tente novamente.")
         return pd.DataFrame()
@@ -171,7 +179,7 @@ def gerar_dados_conformidade_reais():
     Gera dados de conformidade baseados nos dados reais com otimizações
     """
     try:
-        df_principal = buscar_dados_excel()
+        df_principal = buscar_dados_excel(COLUNAS_CONFORMIDADE)
         
         if df_principal.empty:
             return None, None
@@ -181,17 +189,15 @@ def gerar_dados_conformidade_reais():
         if not all(col in df_principal.columns for col in colunas_necessarias):
             return None, None
         
-        # Filtrar dados válidos de forma otimizada
-        mask_total = ~df_principal['CODFILIAL'].astype(str).str.contains('TOTAL', na=False)
+        # Filtrar dados válidos com as máscaras booleanas calculadas na carga
+        mask_total = ~df_principal['LINHA_SUBTOTAL']
         mask_curso = df_principal['NOMECURSO'].notna()
-        mask_filial = df_principal['CODFILIAL'].apply(
-            lambda x: str(x).replace('.0', '').isdigit() if pd.notna(x) else False
-        )
+        mask_filial = df_principal['FILIAL_VALIDA']
         
-        df_limpo = df_principal[mask_total & mask_curso & mask_filial].copy()
+        df_limpo = df_principal[mask_total & mask_curso & mask_filial]
         
         # Agrupar por curso de forma otimizada
-        df_conformidade = df_limpo.groupby('NOMECURSO', as_index=False).agg({
+        df_conformidade = df_limpo.groupby('NOMECURSO', as_index=False, observed=True).agg({
             'FALTAM_SOBRAM_PROUNI': 'sum',
             'FALTAM_SOBRAM_FILANTROPIA': 'sum'
         })
@@ -202,20 +208,15 @@ def gerar_dados_conformidade_reais():
             'FALTAM_SOBRAM_FILANTROPIA': 'FILANTROPIA_SOBRA_FALTA'
         }, inplace=True)
         
-        # Otimizar tipos de dados
-        df_conformidade['PROUNI_SOBRA_FALTA'] = df_conformidade['PROUNI_SOBRA_FALTA'].fillna(0).round().astype('int32')
-        df_conformidade['FILANTROPIA_SOBRA_FALTA'] = df_conformidade['FILANTROPIA_SOBRA_FALTA'].fillna(0).round().astype('int32')
-        
-        # Dados detalhados otimizados
-        df_detalhado = df_limpo[['CODFILIAL', 'NOMECURSO', 'FALTAM_SOBRAM_PROUNI', 'FALTAM_SOBRAM_FILANTROPIA']].copy()
-        df_detalhado.rename(columns={
+        # Dados detalhados otimizados (df_limpo já contém só as colunas de conformidade)
+        df_detalhado = df_limpo.drop(columns=list(COLUNAS_DERIVADAS_FILIAL)).rename(columns={
             'FALTAM_SOBRAM_PROUNI': 'PROUNI_SOBRA_FALTA',
             'FALTAM_SOBRAM_FILANTROPIA': 'FILANTROPIA_SOBRA_FALTA'
-        }, inplace=True)
+        })
         
-        df_detalhado['PROUNI_SOBRA_FALTA'] = df_detalhado['PROUNI_SOBRA_FALTA'].fillna(0).round().astype('int32')
-        df_detalhado['FILANTROPIA_SOBRA_FALTA'] = df_detalhado['FILANTROPIA_SOBRA_FALTA'].fillna(0).round().astype('int32')
-        df_detalhado['CODFILIAL'] = df_detalhado['CODFILIAL'].astype(str)
+        # Saldos já chegam como Int32 e CODFILIAL como categoria de códigos inteiros
+        # pelo esquema: apenas preencher nulos, sem converter tipos para o Arrow
+        df_detalhado = df_detalhado.fillna({'PROUNI_SOBRA_FALTA': 0, 'FILANTROPIA_SOBRA_FALTA': 0})
         
         return df_conformidade, df_detalhado
         
@@ -223,22 +224,73 @@ def gerar_dados_conformidade_reais():
         st.error(f"Erro ao gerar dados de conformidade: {e}")
         return None, None
 
-# --- Carregamento dos Dados ---
 @st.cache_data(ttl=1800)
+def gerar_relatorio_memoria():
+    """Bytes economizados por coluna com a aplicação do esquema de tipos"""
+    df_bruto = carregar_snapshot(localizar_planilha("dados_bolsistas"))
+    return relatorio_memoria(df_bruto, carregar_bolsistas())
+
+# --- Carregamento dos Dados ---
+def buscar_dados_api_filiais():
+    """
+    Busca os dados de todas as filiais em paralelo (asyncio), com limite de
+    concorrência e timeout nas requisições, e junta tudo numa tabela tipada. Uma
+    filial indisponível fica de fora com um aviso na sidebar, sem impedir a
+    carga das demais.
+    """
+    try:
+        df, falhas = buscar_filiais_api(
+            API_URL_FILIAL, API_FILIAIS, headers=CABECALHOS_API, timeout=30,
+            converter=lambda data: aplicar_esquema(pd.DataFrame(data)),
+            limite_concorrencia=API_LIMITE_CONCORRENCIA, streaming=API_STREAMING,
+            delta=API_DELTA, colunar=API_COLUNAR
+        )
+    except Exception as e:
+        st.error(f"Erro ao buscar dados da API: {e}")
+        return pd.DataFrame()
+    for filial, erro in falhas.items():
+        st.sidebar.warning(f"⚠️ Filial {filial} indisponível: {erro}")
+    return df
+
 def carregar_dados():
-    """Função centralizada para carregamento de dados"""
+    """
+    Função centralizada para carregamento de dados. Sem cache próprio: a API
+    tem o seu e o Excel vem da camada compartilhada de bolsistas/acesso.py.
+    """
     # Verificar se deve usar API ou arquivo local
     use_api = st.secrets.get("general", {}).get("use_api", False)
     
     if use_api:
-        return buscar_dados_api()
+        return buscar_dados_api_filiais() if API_URL_FILIAL else buscar_dados_api()
     else:
         return buscar_dados_excel()
 
+def exibir_frescor_api():
+    """Indicador na sidebar da idade dos dados da API (da filial mais antiga, na busca por filial)"""
+    if API_URL_FILIAL:
+        urls = [API_URL_FILIAL.format(filial=filial) for filial in API_FILIAIS]
+    else:
+        urls = [API_URL]
+    frescores = [frescor for frescor in map(frescor_api, urls) if frescor is not None]
+    if not frescores:
+        return
+    frescor = max(frescores, key=lambda frescor: frescor['idade'])
+    hora = time.strftime('%H:%M', time.localtime(frescor['hora']))
+    minutos = frescor['idade'] / 60
+    if frescor['erro']:
+        st.sidebar.warning(f"🔴 Dados das {hora} (há {minutos:.0f} min). A última atualização falhou: {frescor['erro']}")
+    elif frescor['fresca']:
+        st.sidebar.caption(f"🟢 Dados atualizados às {hora} (há {minutos:.0f} min)")
+    else:
+        st.sidebar.caption(f"🟡 Dados das {hora} (há {minutos:.0f} min), atualizando em segundo plano")
+
 # Carregar dados
 with st.spinner('Carregando dados...'):
     df = carregar_dados()
 
+if st.secrets.get("general", {}).get("use_api", False):
+    exibir_frescor_api()
+
 if df.empty:
     st.error("Não foi possível carregar os dados. Verifique a configuração.")
     st.stop()
@@ -257,6 +309,42 @@ if st.secrets.get("general", {}).get("debug_mode", False):
     # Registrar callback para mostrar métricas
     import atexit
     atexit.register(show_performance_metrics)
+    
+    # Relatório de memória do esquema de tipos
+    relatorio = gerar_relatorio_memoria()
+    st.sidebar.metric(
+        "Memória Economizada pelo Esquema",
+        f"{relatorio['BYTES_ECONOMIZADOS'].sum() / 1024:.1f} KB",
+        help=f"{relatorio['BYTES_ANTES'].sum():,} → {relatorio['BYTES_DEPOIS'].sum():,} bytes".replace(",", ".")
+    )
+    st.sidebar.dataframe(relatorio[['TIPO_DEPOIS', 'BYTES_ECONOMIZADOS']], use_container_width=True)
+
+    # Cache em disco compartilhado pelos processos do servidor
+    cache = estatisticas_cache()
+    st.sidebar.metric(
+        "Acertos do Cache em Disco",
+        f"{cache['taxa_acerto']:.0%}",
+        help=f"{cache['acertos']} acertos, {cache['faltas']} faltas, {cache['arquivos']} arquivos ({cache['bytes'] / 1024:.1f} KB)"
+    )
+
+    # Cargas simultâneas coalescidas (uma execução por chave em andamento)
+    coalescencia = metricas_coalescencia()
+    st.sidebar.metric(
+        "Chamadas Coalescidas",
+        coalescencia['coalescidas'],
+        help=", ".join(
+            f"{tipo}: {contadores['execucoes']} execuções, {contadores['coalescidas']} coalescidas"
+            for tipo, contadores in coalescencia['por_tipo'].items()
+        ) or None
+    )
+
+    # Requisições à API: conexões reaproveitadas, gzip e revalidação por ETag
+    requisicoes_api = metricas_api()
+    st.sidebar.metric(
+        "Bytes Recebidos da API",
+        f"{requisicoes_api['bytes_recebidos'] / 1024:.1f} KB",
+        help=f"{requisicoes_api['requisicoes']} requisições, {requisicoes_api['nao_modificadas']} sem alteração (304)"
+    )
 
 # --- Continuação do código original ---
 # (O resto do código permanece igual, mas com as otimizações aplicadas)
\ No newline at end of file
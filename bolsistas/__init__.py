@@ -0,0 +1,6 @@
+"""
+Camada de dados compartilhada pelos dashboards de bolsistas do Centro Universitário São Camilo.
+
+Os módulos deste pacote não dependem do Streamlit: os scripts de dashboard
+importam as funções necessárias e aplicam o cache do Streamlit por conta própria.
+"""
@@ -0,0 +1,223 @@
+"""
+Camada única de acesso aos dados de bolsistas.
+
+Todos os dashboards leem os dados por aqui. O conjunto tipado (snapshot da
+planilha com o esquema aplicado) é mantido uma única vez por processo e por
+versão da planilha (SHA-256 do conteúdo): vários dashboards servidos pelo
+mesmo processo compartilham uma leitura e uma cópia em memória, e cada visão
+recebe uma projeção de colunas desse conjunto.
+
+Artefatos derivados (sem subtotais, cubo de indicadores) também são
+calculados uma vez por versão com obter_derivado.
+
+Uma execução de dashboard que usa a versão, os dados e derivados deve
+obtê-los juntos com carregar_conjunto: chamadas separadas (carregar_bolsistas,
+versao_atual, obter_derivado) leem o buffer duplo cada uma, e uma troca de
+versão entre elas misturaria duas versões na mesma tela.
+
+Atualização com buffer duplo: quando a planilha muda, a nova versão (e os
+derivados já pedidos para a versão atual) é montada numa thread em segundo
+plano, enquanto os leitores continuam recebendo a versão anterior. Pronta a
+nova versão, ela substitui a anterior numa única troca, e só então o
+conjunto e os derivados da versão anterior são descartados.
+
+Abaixo da memória fica o cache em disco compartilhado entre os processos do
+host (bolsistas/cache_disco.py): um processo novo lê o conjunto tipado e os
+derivados persistidos em Arrow em vez de reprocessar a planilha.
+
+Cargas e derivados são coalescidos (bolsistas/coalescencia.py): sessões
+simultâneas com o cache frio esperam por uma única execução de cada um.
+
+Os DataFrames devolvidos são compartilhados: acrescentar ou substituir
+colunas é seguro, mas alterações no lugar (.loc/.iloc, inplace=True) devem
+ser feitas sobre um .copy().
+"""
+
+import threading
+
+from bolsistas import cache_disco
+from bolsistas.coalescencia import executar_uma_vez
+from bolsistas.esquema import COLUNAS_DERIVADAS_FILIAL, VERSAO_CONVERSAO, aplicar_esquema
+from bolsistas.leitores import localizar_planilha
+from bolsistas.snapshot import carregar_snapshot, versao_planilha
+from bolsistas.visoes import projetar_colunas
+
+NOME_BASE_PADRAO = 'dados_bolsistas'
+
+_trava = threading.Lock()
+_conjuntos = {}  # nome base da planilha -> {'versao', 'dados', 'derivados'}
+_construtores = {}  # nome base -> {nome do derivado: (construir, disco)}
+_atualizacoes = {}  # nome base -> thread da atualização em andamento
+_erros_atualizacao = {}  # nome base -> erro da última atualização que falhou
+
+
+def _derivado(conjunto, nome, construir, disco=None):
+    """disco: None ou (nome no cache em disco, versão do artefato)"""
+    derivados = conjunto['derivados']
+    if nome in derivados:
+        return derivados[nome]
+
+    def calcular():
+        if nome not in derivados:  # pode ter sido calculado logo antes desta execução
+            if disco is None:
+                derivados[nome] = construir(conjunto['dados'])
+            else:
+                chave_disco, versao_artefato = disco
+                derivados[nome] = cache_disco.memoizar_tabelas(
+                    chave_disco, conjunto['versao'], lambda: construir(conjunto['dados']),
+                    versao_artefato=versao_artefato,
+                )
+        return derivados[nome]
+
+    return executar_uma_vez(('derivado', id(conjunto), nome), calcular)
+
+
+def _montar_conjunto(nome_base, caminho, versao):
+    """Carrega uma versão dos dados e calcula os derivados já registrados para ela"""
+    dados, = cache_disco.memoizar_tabelas(
+        f'{nome_base}:dados', versao, lambda: (aplicar_esquema(carregar_snapshot(caminho)),),
+        versao_artefato=VERSAO_CONVERSAO,
+    )
+    conjunto = {'versao': versao, 'dados': dados, 'derivados': {}}
+    for nome, (construir, disco) in dict(_construtores.get(nome_base, {})).items():
+        _derivado(conjunto, nome, construir, disco)
+    return conjunto
+
+
+def _atualizar(nome_base, caminho, versao):
+    try:
+        novo = _montar_conjunto(nome_base, caminho, versao)
+    except Exception as erro:
+        with _trava:
+            _erros_atualizacao[nome_base] = erro
+        return
+    with _trava:
+        _conjuntos[nome_base] = novo  # troca atômica: a versão anterior deixa de ser servida
+        _erros_atualizacao.pop(nome_base, None)
+
+
+def _iniciar_atualizacao(nome_base, caminho, versao):
+    """Dispara a montagem da nova versão em segundo plano (chamada com _trava adquirida)"""
+    em_andamento = _atualizacoes.get(nome_base)
+    if em_andamento is not None and em_andamento.is_alive():
+        return
+    thread = threading.Thread(
+        target=_atualizar, args=(nome_base, caminho, versao), name=f'atualizacao-{nome_base}', daemon=True
+    )
+    _atualizacoes[nome_base] = thread
+    thread.start()
+
+
+def _primeira_carga(nome_base, caminho, versao):
+    conjunto = _montar_conjunto(nome_base, caminho, versao)
+    with _trava:
+        return _conjuntos.setdefault(nome_base, conjunto)
+
+
+def _conjunto_atual(nome_base):
+    """
+    Conjunto tipado servido no momento. Na primeira carga do processo ele é
+    montado na hora; depois, uma versão nova da planilha é montada em segundo
+    plano e a anterior continua sendo servida até a troca.
+    """
+    caminho = localizar_planilha(nome_base)
+    versao = versao_planilha(caminho)
+    with _trava:
+        conjunto = _conjuntos.get(nome_base)
+        if conjunto is not None and conjunto['versao'] != versao:
+            _iniciar_atualizacao(nome_base, caminho, versao)
+    if conjunto is None:
+        conjunto = executar_uma_vez(('carga', nome_base, versao), _primeira_carga, nome_base, caminho, versao)
+    return conjunto
+
+
+def _remover_subtotais(df):
+    return df[~df['LINHA_SUBTOTAL']] if 'LINHA_SUBTOTAL' in df.columns else df
+
+
+def versao_atual(nome_base=NOME_BASE_PADRAO):
+    """Versão (SHA-256) dos dados servidos no momento"""
+    return _conjunto_atual(nome_base)['versao']
+
+
+def _obter_derivado(conjunto, nome_base, nome, construir, persistir, versao_artefato):
+    disco = (f'{nome_base}:{nome}', versao_artefato) if persistir else None
+    with _trava:
+        _construtores.setdefault(nome_base, {})[nome] = (construir, disco)
+    return _derivado(conjunto, nome, construir, disco)
+
+
+def obter_derivado(nome, construir, nome_base=NOME_BASE_PADRAO, persistir=False, versao_artefato=None):
+    """
+    Retorna construir(dados), calculado uma única vez por versão dos dados e
+    compartilhado por todos os dashboards (ex.: o cubo de indicadores).
+    Com 'persistir', o resultado (uma tupla de DataFrames) também vai para o
+    cache em disco compartilhado pelos processos do host, sob a versão do
+    artefato (incrementada quando 'construir' muda).
+    """
+    return _obter_derivado(_conjunto_atual(nome_base), nome_base, nome, construir, persistir, versao_artefato)
+
+
+def atualizar_dados(nome_base=NOME_BASE_PADRAO):
+    """
+    Verifica se a planilha mudou e, se mudou, inicia a montagem da nova versão
+    em segundo plano (sem interromper quem está lendo a versão atual).
+    Retorna True se há uma atualização em andamento.
+    """
+    _conjunto_atual(nome_base)
+    with _trava:
+        em_andamento = _atualizacoes.get(nome_base)
+        return em_andamento is not None and em_andamento.is_alive()
+
+
+def estado_atualizacao(nome_base=NOME_BASE_PADRAO):
+    """Versão servida, se há atualização em andamento e o erro da última que falhou"""
+    with _trava:
+        conjunto = _conjuntos.get(nome_base)
+        em_andamento = _atualizacoes.get(nome_base)
+        erro = _erros_atualizacao.get(nome_base)
+    return {
+        'versao': conjunto['versao'] if conjunto else None,
+        'atualizando': em_andamento is not None and em_andamento.is_alive(),
+        'erro': str(erro) if erro else None,
+    }
+
+
+def projetar_bolsistas(df, colunas):
+    """Projeção de colunas dos dados de bolsistas; LINHA_SUBTOTAL e FILIAL_VALIDA acompanham CODFILIAL"""
+    colunas = list(colunas)
+    if 'CODFILIAL' in colunas:
+        colunas += [coluna for coluna in COLUNAS_DERIVADAS_FILIAL if coluna not in colunas]
+    return projetar_colunas(df, colunas)
+
+
+def carregar_conjunto(colunas=None, sem_subtotais=False, nome_base=NOME_BASE_PADRAO):
+    """
+    (versao, dados, derivado) de uma única leitura do conjunto servido:
+    'dados' como em carregar_bolsistas e derivado(nome, construir,
+    persistir=False, versao_artefato=None) como obter_derivado, mas sempre
+    sobre a mesma versão, mesmo que a troca para uma versão nova aconteça no
+    meio da execução.
+    Lança FileNotFoundError se a planilha não existir.
+    """
+    conjunto = _conjunto_atual(nome_base)
+
+    def derivado(nome, construir, persistir=False, versao_artefato=None):
+        return _obter_derivado(conjunto, nome_base, nome, construir, persistir, versao_artefato)
+
+    if sem_subtotais:
+        df = derivado('sem_subtotais', _remover_subtotais)
+    else:
+        df = conjunto['dados']
+    df = df.copy(deep=False) if colunas is None else projetar_bolsistas(df, colunas)
+    return conjunto['versao'], df, derivado
+
+
+def carregar_bolsistas(colunas=None, sem_subtotais=False, nome_base=NOME_BASE_PADRAO):
+    """
+    Dados de bolsistas tipados da versão atual da planilha: todas as colunas
+    ou só as pedidas (LINHA_SUBTOTAL e FILIAL_VALIDA acompanham CODFILIAL).
+    Com 'sem_subtotais', as linhas de subtotal do ERP são removidas.
+    Lança FileNotFoundError se a planilha não existir.
+    """
+    return carregar_conjunto(colunas, sem_subtotais, nome_base)[1]
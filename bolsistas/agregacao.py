@@ -0,0 +1,67 @@
+"""
+Totalização das tabelas por filial.
+
+As tabelas dos dashboards mostram os cursos de cada filial seguidos do
+subtotal da filial e, ao final, do total geral. Aqui essas linhas são
+calculadas num único groupby (semântica de GROUPING SETS: detalhe, filial e
+total), em vez de concatenar DataFrames dentro de um laço por filial.
+"""
+
+import pandas as pd
+
+DETALHE = 'detalhe'
+SUBTOTAL = 'subtotal'
+TOTAL = 'total'
+
+ROTULO_SUBTOTAL_PADRAO = '📊 TOTAL FILIAL {filial}'
+ROTULO_TOTAL_GERAL = '🎯 TOTAL GERAL'
+
+
+def totalizar_por_filial(df, colunas_soma, coluna_filial='CODFILIAL', coluna_rotulo='NOMECURSO',
+                         rotulos_subtotal=None, rotulo_total=ROTULO_TOTAL_GERAL, incluir_total=True):
+    """
+    Retorna as linhas de 'df' agrupadas por filial, cada grupo seguido do seu
+    subtotal, e o total geral ao final. A coluna TIPO_LINHA indica se a linha é
+    'detalhe', 'subtotal' ou 'total'.
+
+    'rotulos_subtotal' mapeia o código da filial para o texto exibido em
+    'coluna_rotulo' na linha de subtotal (padrão: '📊 TOTAL FILIAL <código>').
+    Linhas sem filial entram no total geral, mas não ganham subtotal próprio.
+    As colunas somadas mantêm o tipo do detalhe; as demais ficam nulas nas
+    linhas de total.
+    """
+    colunas_soma = [coluna for coluna in colunas_soma if coluna in df.columns]
+    rotulos_subtotal = rotulos_subtotal or {}
+
+    # Única passagem de agregação; o total geral sai da soma dos grupos
+    grupos = df.groupby(coluna_filial, observed=True, dropna=False, sort=True)[colunas_soma].sum()
+    subtotais = grupos[grupos.index.notna()].reset_index()
+    subtotais[coluna_rotulo] = [
+        rotulos_subtotal.get(filial, ROTULO_SUBTOTAL_PADRAO.format(filial=filial))
+        for filial in subtotais[coluna_filial]
+    ]
+    subtotais['TIPO_LINHA'] = SUBTOTAL
+
+    partes = [df.assign(TIPO_LINHA=DETALHE), subtotais]
+    if incluir_total:
+        total = grupos.sum().to_frame().T
+        total[coluna_filial] = pd.Series([None], dtype=df[coluna_filial].dtype)
+        total[coluna_rotulo] = rotulo_total
+        total['TIPO_LINHA'] = TOTAL
+        partes.append(total)
+
+    resultado = pd.concat(partes, ignore_index=True)[list(df.columns) + ['TIPO_LINHA']]
+
+    # Ordena por filial (sem filial por último) e, dentro dela, detalhe antes do subtotal
+    nivel = resultado['TIPO_LINHA'].map({DETALHE: 0, SUBTOTAL: 1, TOTAL: 2})
+    codigos_filial, _ = pd.factorize(resultado[coluna_filial], sort=True)
+    ordem_filial = pd.Series(codigos_filial, index=resultado.index).where(codigos_filial >= 0, len(grupos))
+    ordem_filial[nivel == 2] = len(grupos) + 1
+    ordem = pd.DataFrame({'filial': ordem_filial, 'nivel': nivel}).sort_values(['filial', 'nivel'], kind='stable').index
+    resultado = resultado.loc[ordem].reset_index(drop=True)
+
+    for coluna in colunas_soma:
+        resultado[coluna] = resultado[coluna].astype(df[coluna].dtype)
+    resultado[coluna_rotulo] = resultado[coluna_rotulo].astype('category' if df[coluna_rotulo].dtype == 'category' else object)
+    resultado['TIPO_LINHA'] = pd.Categorical(resultado['TIPO_LINHA'], categories=[DETALHE, SUBTOTAL, TOTAL])
+    return resultado
@@ -0,0 +1,537 @@
+"""
+Acesso à API REST do ERP (modo de produção dos dashboards).
+
+As requisições usam uma requests.Session compartilhada (pool de conexões
+com keep-alive e compressão gzip). As revalidações de buscar_tabela_api são
+condicionais: o ETag e o Last-Modified da última resposta vão em
+If-None-Match / If-Modified-Since, e um 304 Not Modified reaproveita a
+tabela já convertida em cache sem baixar o conteúdo de novo. Só os
+validadores de cada URL ficam guardados, nunca o corpo da resposta.
+Requisições simultâneas à mesma URL são coalescidas
+(bolsistas/coalescencia.py): com o cache frio, só uma sessão consulta o ERP
+e as demais recebem o mesmo resultado.
+
+buscar_tabela_api mantém a tabela de cada URL em memória com a política
+stale-while-revalidate:
+
+- até 'ttl_suave' segundos, a tabela em cache é servida como está;
+- depois disso ela continua sendo servida na hora, enquanto uma thread em
+  segundo plano busca a nova versão, que só a substitui se a busca der certo;
+- passada a 'idade_maxima', a tabela não é mais servida e a busca volta a
+  ser feita na hora (uma falha então chega a quem chamou).
+
+Assim o tempo de resposta da página não depende da latência da API, exceto
+na primeira carga e depois de um período sem atualização.
+
+Com 'streaming', a resposta é lida aos poucos em vez de num único
+response.json(): respostas NDJSON viram lotes de 'tamanho_lote' registros e
+respostas paginadas (cabeçalho Link rel="next" ou {"dados": [...],
+"proxima": url}) são seguidas página a página. Cada lote é convertido para
+colunas tipadas assim que chega, então o pico de memória acompanha a tabela
+tipada, e não a lista de dicionários do JSON inteiro.
+
+Com 'colunar', a resposta é negociada em formato colunar: o cabeçalho Accept
+pede Arrow IPC (stream) e aceita JSON como alternativa. Em Arrow, as colunas
+já chegam tipadas (inteiros, categorias e booleanos) e viram o DataFrame sem
+decodificar objetos JSON nem inferir tipos coluna a coluna; uma API que só
+fala JSON continua funcionando como antes.
+
+Com 'delta', a fonte é um feed de alterações: a URL responde
+{"dados": [...], "marca": ...} e, a partir da segunda sincronização, recebe
+a marca d'água da anterior (?desde=<marca>) e devolve só as linhas alteradas
+desde então, com as chaves das linhas excluídas em "removidos". Elas são
+mescladas (upsert e exclusão) na tabela em cache pelas chaves CODFILIAL e
+NOMECURSO, e só os agregados afetados são atualizados (ver
+obter_agregado_api). Uma resposta com "completo": true (a fonte não conhece
+a marca recebida) substitui a tabela inteira.
+
+buscar_filiais_api busca os dados de cada filial em paralelo (asyncio, com
+limite de concorrência e o timeout das requisições), cada uma pela política
+acima, inclusive a sincronização por delta, e junta tudo numa tabela
+tipada. Uma filial que falha fica de fora e é informada, sem derrubar a
+carga das demais; o tempo total acompanha a filial mais lenta, e não a soma
+delas.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from urllib.parse import urljoin
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+import pyarrow as pa
+import requests
+from requests.adapters import HTTPAdapter
+
+from bolsistas.cache_disco import de_arrow
+from bolsistas.coalescencia import executar_uma_vez
+
+TIMEOUT_PADRAO = 30
+TAMANHO_POOL = 10
+TAMANHO_LOTE_PADRAO = 5000
+ACEITA_STREAMING = 'application/x-ndjson, application/json'
+TIPO_ARROW = 'application/vnd.apache.arrow.stream'
+ACEITA_COLUNAR = f'{TIPO_ARROW}, application/json;q=0.5'
+LIMITE_CONCORRENCIA_PADRAO = 4
+CHAVES_DELTA = ('CODFILIAL', 'NOMECURSO')
+PARAMETRO_DELTA = 'desde'
+TTL_SUAVE_PADRAO = 30 * 60
+IDADE_MAXIMA_PADRAO = 4 * 60 * 60
+
+_trava = threading.Lock()
+_tabelas = {}  # url -> {'tabela', 'obtida_em', 'hora', 'atualizando', 'erro', 'marca', 'agregados'}
+_validadores = {}  # url -> {'etag', 'ultima_modificacao'} da última resposta JSON
+_validadores_streaming = {}  # url -> {'etag', 'ultima_modificacao'} da última leitura em lotes
+_validadores_colunar = {}  # url -> {'etag', 'ultima_modificacao'} da última leitura colunar
+_metricas = {'requisicoes': 0, 'nao_modificadas': 0, 'bytes_recebidos': 0}
+
+
+def _criar_sessao():
+    sessao = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=TAMANHO_POOL, pool_maxsize=TAMANHO_POOL)
+    sessao.mount('http://', adaptador)
+    sessao.mount('https://', adaptador)
+    sessao.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+    return sessao
+
+
+_sessao = _criar_sessao()
+
+
+def _bytes_recebidos(resposta):
+    """Bytes que vieram pela rede (comprimidos, se for o caso)"""
+    try:
+        return resposta.raw.tell()
+    except (AttributeError, OSError):
+        return len(resposta.content)
+
+
+def _baixar_json(url, headers, timeout, condicional=False):
+    """
+    JSON da URL. Com 'condicional', envia os validadores da última resposta e
+    retorna None num 304: quem chamou serve a tabela que já tem em cache.
+    """
+    validador = _validadores.get(url) if condicional else None
+    cabecalhos = dict(headers or {})
+    if validador and validador['etag']:
+        cabecalhos['If-None-Match'] = validador['etag']
+    if validador and validador['ultima_modificacao']:
+        cabecalhos['If-Modified-Since'] = validador['ultima_modificacao']
+
+    resposta = _sessao.get(url, headers=cabecalhos, timeout=timeout)
+    nao_modificada = resposta.status_code == 304 and validador is not None
+    with _trava:
+        _metricas['requisicoes'] += 1
+        _metricas['nao_modificadas'] += nao_modificada
+        _metricas['bytes_recebidos'] += _bytes_recebidos(resposta)
+    if nao_modificada:
+        return None
+
+    resposta.raise_for_status()
+    dados = resposta.json()
+    etag = resposta.headers.get('ETag')
+    ultima_modificacao = resposta.headers.get('Last-Modified')
+    if etag or ultima_modificacao:
+        _validadores[url] = {'etag': etag, 'ultima_modificacao': ultima_modificacao}
+    return dados
+
+
+def buscar_json(url, headers=None, timeout=TIMEOUT_PADRAO):
+    """
+    JSON retornado pela URL (sempre baixado: sem tabela em cache, não há o que
+    servir num 304). Lança as exceções de requests (timeout, HTTP 4xx/5xx
+    etc.) para quem chamou e para as chamadas coalescidas.
+    """
+    return executar_uma_vez(('api', url, False), _baixar_json, url, headers, timeout)
+
+
+def _lotes_ndjson(resposta, tamanho_lote):
+    lote = []
+    for linha in resposta.iter_lines():
+        if linha:
+            lote.append(json.loads(linha))
+            if len(lote) >= tamanho_lote:
+                yield lote
+                lote = []
+    if lote:
+        yield lote
+
+
+def concatenar_lotes(lotes):
+    """
+    Junta os lotes tipados numa tabela. Colunas categóricas são unidas com
+    union_categoricals, para não virarem object quando as categorias de cada
+    lote são diferentes.
+    """
+    tabela = pd.concat(lotes, ignore_index=True)
+    for coluna in tabela.columns:
+        series = [lote[coluna] for lote in lotes if coluna in lote.columns]
+        if len(series) == len(lotes) and all(isinstance(serie.dtype, pd.CategoricalDtype) for serie in series):
+            tabela[coluna] = union_categoricals(series, ignore_order=True)
+    return tabela
+
+
+def _baixar_tabela_paginada(url, headers, timeout, converter, condicional, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Lê a resposta em lotes (NDJSON ou páginas), convertendo cada um com
+    'converter' assim que chega. Retorna None num 304 (só com 'condicional').
+    """
+    validador = _validadores_streaming.get(url) if condicional else None
+    cabecalhos = {**(headers or {}), 'Accept': ACEITA_STREAMING}
+    if validador and validador['etag']:
+        cabecalhos['If-None-Match'] = validador['etag']
+    if validador and validador['ultima_modificacao']:
+        cabecalhos['If-Modified-Since'] = validador['ultima_modificacao']
+
+    lotes = []
+    proxima = url
+    novo_validador = None
+    while proxima:
+        with _sessao.get(proxima, headers=cabecalhos, timeout=timeout, stream=True) as resposta:
+            if validador is not None and resposta.status_code == 304:
+                with _trava:
+                    _metricas['requisicoes'] += 1
+                    _metricas['nao_modificadas'] += 1
+                return None
+            resposta.raise_for_status()
+            if novo_validador is None:
+                novo_validador = {
+                    'etag': resposta.headers.get('ETag'),
+                    'ultima_modificacao': resposta.headers.get('Last-Modified'),
+                }
+
+            proxima_corpo = None
+            if 'ndjson' in resposta.headers.get('Content-Type', ''):
+                lotes.extend(converter(lote) for lote in _lotes_ndjson(resposta, tamanho_lote))
+            else:
+                corpo = resposta.json()
+                if isinstance(corpo, dict):
+                    corpo, proxima_corpo = corpo.get('dados', []), corpo.get('proxima')
+                lotes.append(converter(corpo))
+
+            link = resposta.links.get('next', {}).get('url') or proxima_corpo
+            with _trava:
+                _metricas['requisicoes'] += 1
+                _metricas['bytes_recebidos'] += _bytes_recebidos(resposta)
+        proxima = urljoin(proxima, link) if link else None
+        cabecalhos.pop('If-None-Match', None)
+        cabecalhos.pop('If-Modified-Since', None)
+
+    if novo_validador['etag'] or novo_validador['ultima_modificacao']:
+        _validadores_streaming[url] = novo_validador
+    return concatenar_lotes(lotes) if lotes else converter([])
+
+
+def ler_arrow(corpo):
+    """DataFrame tipado de um corpo Arrow IPC (stream), lido direto dos buffers recebidos"""
+    return de_arrow(pa.ipc.open_stream(pa.py_buffer(corpo)).read_all())
+
+
+def _baixar_tabela_colunar(url, headers, timeout, converter, condicional):
+    """
+    Pede Arrow IPC (ou JSON, se a API não oferecer) e converte a resposta com
+    'converter', que recebe um DataFrame já tipado no caso do Arrow e os
+    registros no caso do JSON. Retorna None num 304 (só com 'condicional').
+    """
+    validador = _validadores_colunar.get(url) if condicional else None
+    cabecalhos = {**(headers or {}), 'Accept': ACEITA_COLUNAR}
+    if validador and validador['etag']:
+        cabecalhos['If-None-Match'] = validador['etag']
+    if validador and validador['ultima_modificacao']:
+        cabecalhos['If-Modified-Since'] = validador['ultima_modificacao']
+
+    resposta = _sessao.get(url, headers=cabecalhos, timeout=timeout)
+    nao_modificada = resposta.status_code == 304 and validador is not None
+    with _trava:
+        _metricas['requisicoes'] += 1
+        _metricas['nao_modificadas'] += nao_modificada
+        _metricas['bytes_recebidos'] += _bytes_recebidos(resposta)
+    if nao_modificada:
+        return None
+
+    resposta.raise_for_status()
+    if TIPO_ARROW in resposta.headers.get('Content-Type', ''):
+        tabela = converter(ler_arrow(resposta.content))
+    else:
+        tabela = converter(resposta.json())
+    etag = resposta.headers.get('ETag')
+    ultima_modificacao = resposta.headers.get('Last-Modified')
+    if etag or ultima_modificacao:
+        _validadores_colunar[url] = {'etag': etag, 'ultima_modificacao': ultima_modificacao}
+    return tabela
+
+
+def _baixar_delta(url, headers, timeout, marca):
+    """Corpo do feed de alterações ({"dados", "removidos", "marca", "completo"}); sem marca, todos os registros"""
+    parametros = {PARAMETRO_DELTA: marca} if marca is not None else None
+    resposta = _sessao.get(url, headers=headers, params=parametros, timeout=timeout)
+    with _trava:
+        _metricas['requisicoes'] += 1
+        _metricas['bytes_recebidos'] += _bytes_recebidos(resposta)
+    resposta.raise_for_status()
+    return resposta.json()
+
+
+def _chaves_objeto(tabela, chaves):
+    """MultiIndex das chaves com valores Python, comparável entre categorias diferentes"""
+    return pd.MultiIndex.from_frame(tabela[chaves].astype(object))
+
+
+def mesclar_delta(tabela, delta, chaves=CHAVES_DELTA, removidos=None):
+    """
+    Upsert das linhas de 'delta' em 'tabela' pelas colunas 'chaves': uma linha
+    com chave já existente substitui a anterior na mesma posição, e as novas
+    vão para o final. As linhas cujas chaves estão em 'removidos' (as
+    exclusões do feed) saem da tabela. Retorna (tabela mesclada, chaves
+    alteradas ou removidas).
+    """
+    chaves = list(chaves)
+    alteradas = []
+    if removidos is not None and not removidos.empty:
+        removidas = _chaves_objeto(tabela, chaves).isin(_chaves_objeto(removidos, chaves))
+        if removidas.any():
+            alteradas.append(tabela.loc[removidas, chaves])
+            tabela = tabela[~removidas].reset_index(drop=True)
+    if not delta.empty:
+        tabela, chaves_delta = _upsert(tabela, delta, chaves)
+        alteradas.append(chaves_delta)
+    if not alteradas:
+        return tabela, pd.DataFrame(columns=chaves)
+    # Categorias que só existiam nas linhas substituídas ou excluídas, como numa leitura completa
+    for coluna in tabela.select_dtypes('category').columns:
+        tabela[coluna] = tabela[coluna].cat.remove_unused_categories()
+    return tabela, concatenar_lotes(alteradas)
+
+
+def _upsert(tabela, delta, chaves):
+    """Upsert de 'delta' em 'tabela' (ver mesclar_delta)"""
+    delta = delta.drop_duplicates(subset=chaves, keep='last').reset_index(drop=True)
+    chaves_tabela = pd.MultiIndex.from_frame(tabela[chaves])
+    chaves_delta = pd.MultiIndex.from_frame(delta[chaves])
+
+    substituidas = chaves_tabela.isin(chaves_delta)
+    posicoes = pd.Series(np.arange(len(tabela)), index=chaves_tabela)
+    posicoes = posicoes[~posicoes.index.duplicated()]
+    posicao_delta = posicoes.reindex(chaves_delta).to_numpy(dtype='float64', copy=True)
+    novas = np.isnan(posicao_delta)
+    posicao_delta[novas] = len(tabela) + np.arange(novas.sum())
+
+    mesclada = concatenar_lotes([tabela[~substituidas].reset_index(drop=True), delta])
+    ordem = np.concatenate([np.arange(len(tabela))[~substituidas], posicao_delta])
+    mesclada = mesclada.iloc[np.argsort(ordem, kind='stable')].reset_index(drop=True)
+    return mesclada, delta[chaves]
+
+
+def _atualizar_agregados(agregados, tabela, chaves_alteradas):
+    """Agregados atualizados incrementalmente; os que não sabem se atualizar são descartados"""
+    atualizados = {}
+    for nome, (valor, atualizar) in agregados.items():
+        if atualizar is None:
+            continue
+        try:
+            atualizados[nome] = (atualizar(valor, tabela, chaves_alteradas), atualizar)
+        except Exception:
+            continue  # recalculado por inteiro no próximo obter_agregado_api
+    return atualizados
+
+
+def _buscar_e_guardar(url, headers, timeout, converter, streaming=False, delta=False, colunar=False):
+    with _trava:
+        anterior = _tabelas.get(url)
+    marca = None
+    chaves_alteradas = None
+    if delta:
+        marca_anterior = anterior.get('marca') if anterior else None
+        corpo = executar_uma_vez(('api_delta', url), _baixar_delta, url, headers, timeout, marca_anterior)
+        marca = corpo.get('marca')
+        if marca_anterior is None or corpo.get('completo'):
+            # Carga completa: a fonte não conhece a marca, então não tem como informar as exclusões
+            tabela = converter(corpo.get('dados', []))
+        else:
+            removidos = corpo.get('removidos') or []
+            tabela, chaves_alteradas = mesclar_delta(
+                anterior['tabela'], converter(corpo.get('dados', [])),
+                removidos=converter(removidos) if removidos else None,
+            )
+    elif streaming:
+        tabela = _baixar_tabela_paginada(url, headers, timeout, converter, condicional=anterior is not None)
+    elif colunar:
+        tabela = _baixar_tabela_colunar(url, headers, timeout, converter, condicional=anterior is not None)
+    else:
+        condicional = anterior is not None
+        dados = executar_uma_vez(('api', url, condicional), _baixar_json, url, headers, timeout, condicional)
+        tabela = converter(dados) if dados is not None else None
+    if tabela is None:
+        # 304: a tabela já convertida continua valendo, só a idade é renovada
+        tabela = anterior['tabela']
+
+    if anterior is not None and tabela is anterior['tabela']:
+        agregados = anterior['agregados']
+    elif chaves_alteradas is not None:
+        agregados = _atualizar_agregados(anterior['agregados'], tabela, chaves_alteradas)
+    else:
+        agregados = {}
+    with _trava:
+        _tabelas[url] = {
+            'tabela': tabela, 'obtida_em': time.monotonic(), 'hora': time.time(),
+            'atualizando': False, 'erro': None, 'marca': marca, 'agregados': agregados,
+        }
+    return tabela
+
+
+def _revalidar(url, headers, timeout, converter, streaming, delta, colunar):
+    try:
+        _buscar_e_guardar(url, headers, timeout, converter, streaming, delta, colunar)
+    except Exception as erro:
+        # A tabela anterior continua sendo servida até a idade máxima
+        with _trava:
+            _tabelas[url]['atualizando'] = False
+            _tabelas[url]['erro'] = str(erro)
+
+
+def buscar_tabela_api(url, headers=None, timeout=TIMEOUT_PADRAO, converter=pd.DataFrame,
+                      ttl_suave=TTL_SUAVE_PADRAO, idade_maxima=IDADE_MAXIMA_PADRAO, streaming=False, delta=False,
+                      colunar=False):
+    """
+    Tabela da URL (converter(json)) com stale-while-revalidate, conforme
+    descrito no módulo. Só bloqueia na primeira carga ou além da idade
+    máxima, quando lança as exceções de requests em caso de falha.
+    Com 'streaming', converter recebe cada lote de registros e os lotes
+    convertidos são concatenados; com 'delta', a URL é um feed de alterações
+    e só as linhas alteradas desde a última sincronização são baixadas; com
+    'colunar', a resposta em Arrow é preferida e converter recebe um
+    DataFrame tipado (pd.DataFrame e aplicar_esquema aceitam os dois casos).
+    """
+    with _trava:
+        entrada = _tabelas.get(url)
+        idade = time.monotonic() - entrada['obtida_em'] if entrada else None
+        revalidar = (entrada is not None and ttl_suave < idade <= idade_maxima
+                     and not entrada['atualizando'])
+        if revalidar:
+            entrada['atualizando'] = True
+
+    if entrada is None or idade > idade_maxima:
+        return executar_uma_vez(
+            ('api_tabela', url), _buscar_e_guardar, url, headers, timeout, converter, streaming, delta, colunar
+        )
+    if revalidar:
+        threading.Thread(
+            target=_revalidar, args=(url, headers, timeout, converter, streaming, delta, colunar),
+            name='revalidacao-api', daemon=True
+        ).start()
+    return entrada['tabela']
+
+
+def obter_agregado_api(url, nome, construir, atualizar=None, tabela=None):
+    """
+    Agregado (ex.: o cubo de indicadores) da tabela em cache da URL,
+    calculado com construir(tabela) uma vez por versão dela. Numa
+    sincronização incremental ele é atualizado com
+    atualizar(agregado, tabela, chaves_alteradas); sem 'atualizar', é
+    descartado e recalculado. Retorna None se a URL ainda não foi carregada.
+
+    'tabela' é a versão que quem chama já tem em mãos: se o cache passou
+    para outra (uma revalidação terminou no meio da página), o agregado é
+    calculado a partir dela sem ser guardado, para não misturar versões.
+    """
+    with _trava:
+        entrada = _tabelas.get(url)
+    if tabela is not None and (entrada is None or entrada['tabela'] is not tabela):
+        return construir(tabela)
+    if entrada is None:
+        return None
+    if nome in entrada['agregados']:
+        return entrada['agregados'][nome][0]
+    valor = construir(entrada['tabela'])
+    with _trava:
+        if _tabelas.get(url) is entrada:
+            entrada['agregados'][nome] = (valor, atualizar)
+    return valor
+
+
+def frescor_api(url, ttl_suave=TTL_SUAVE_PADRAO):
+    """
+    Idade (segundos) e hora da tabela em cache da URL, se ela está dentro do
+    TTL suave, se há revalidação em andamento e o erro da última que falhou.
+    Retorna None se a URL ainda não foi carregada.
+    """
+    with _trava:
+        entrada = _tabelas.get(url)
+        if entrada is None:
+            return None
+        idade = time.monotonic() - entrada['obtida_em']
+        return {
+            'idade': idade,
+            'hora': entrada['hora'],
+            'fresca': idade <= ttl_suave,
+            'atualizando': entrada['atualizando'],
+            'erro': entrada['erro'],
+        }
+
+
+def metricas_api():
+    """Requisições feitas, respostas 304 e bytes recebidos pela rede neste processo"""
+    with _trava:
+        return dict(_metricas)
+
+
+async def _buscar_filiais(chamadas, limite_concorrencia):
+    """
+    Executa as chamadas {filial: kwargs de buscar_tabela_api} em paralelo,
+    com limite de concorrência. Cada chamada roda numa thread, que não pode
+    ser cancelada: o timeout de cada filial é o da própria requisição.
+    """
+    semaforo = asyncio.Semaphore(limite_concorrencia)
+
+    async def buscar_filial(argumentos):
+        async with semaforo:
+            return await asyncio.to_thread(buscar_tabela_api, **argumentos)
+
+    resultados = await asyncio.gather(
+        *(buscar_filial(argumentos) for argumentos in chamadas.values()), return_exceptions=True
+    )
+    return dict(zip(chamadas, resultados))
+
+
+def _converter_filial(converter, filial):
+    def converter_registros(registros):
+        if isinstance(registros, pd.DataFrame):  # resposta Arrow
+            if 'CODFILIAL' not in registros.columns:
+                registros = registros.assign(CODFILIAL=filial)
+            return converter(registros)
+        for registro in registros:
+            registro.setdefault('CODFILIAL', filial)
+        return converter(registros)
+    return converter_registros
+
+
+def buscar_filiais_api(url_modelo, filiais, headers=None, timeout=TIMEOUT_PADRAO, converter=pd.DataFrame,
+                       limite_concorrencia=LIMITE_CONCORRENCIA_PADRAO, **opcoes):
+    """
+    Busca em paralelo a tabela de cada filial (url_modelo.format(filial=...))
+    com buscar_tabela_api ('opcoes' são repassadas a ela) e as junta.
+    Retorna (tabela, falhas), em que 'falhas' mapeia cada filial que não
+    respondeu dentro do timeout das requisições, ou deu erro, para a
+    mensagem do erro.
+    Registros sem CODFILIAL recebem o código da filial.
+    """
+    chamadas = {
+        filial: {
+            'url': url_modelo.format(filial=filial), 'headers': headers, 'timeout': timeout,
+            'converter': _converter_filial(converter, filial), **opcoes,
+        }
+        for filial in filiais
+    }
+    resultados = asyncio.run(_buscar_filiais(chamadas, limite_concorrencia))
+
+    tabelas = []
+    falhas = {}
+    for filial, resultado in resultados.items():
+        if isinstance(resultado, BaseException):
+            falhas[filial] = str(resultado) or type(resultado).__name__
+        else:
+            tabelas.append(resultado)
+    return (concatenar_lotes(tabelas) if tabelas else converter([])), falhas
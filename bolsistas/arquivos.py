@@ -0,0 +1,31 @@
+"""
+Gravação atômica de arquivos compartilhados entre processos.
+
+O snapshot da planilha, o cache em disco e o registro de leitores são lidos
+por vários processos ao mesmo tempo. Cada gravação vai para um arquivo
+temporário no mesmo diretório, que só então substitui o destino com
+os.replace: um leitor encontra o arquivo anterior ou o novo, nunca um
+arquivo pela metade. O prefixo do temporário identifica quem o gravou.
+"""
+
+import os
+import tempfile
+
+
+def gravar_atomico(caminho_destino, escrever, prefixo='.tmp_'):
+    """
+    Chama escrever(caminho_temporario) para um temporário do mesmo
+    diretório e o renomeia para o destino. Em caso de erro o temporário é
+    removido e a exceção é propagada.
+    """
+    diretorio = os.path.dirname(os.path.abspath(caminho_destino))
+    descritor, caminho_temporario = tempfile.mkstemp(dir=diretorio, prefix=prefixo)
+    os.close(descritor)
+    try:
+        escrever(caminho_temporario)
+        os.chmod(caminho_temporario, 0o644)
+        os.replace(caminho_temporario, caminho_destino)
+    except BaseException:
+        if os.path.exists(caminho_temporario):
+            os.remove(caminho_temporario)
+        raise
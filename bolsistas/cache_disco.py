@@ -0,0 +1,192 @@
+"""
+Cache em disco compartilhado entre os processos do servidor.
+
+Cada processo (dyno/worker) mantém os dados em memória (bolsistas/acesso.py),
+mas começa frio e perde tudo ao reiniciar. Este módulo é a camada persistente
+que todos os processos do mesmo host compartilham: um diretório endereçado
+por conteúdo, com um arquivo Arrow IPC por tabela. A chave é o SHA-256 do
+nome do artefato, da versão dos dados e da versão do código que o produz:
+o formato do cache, a impressão do esquema de bolsistas (ESQUEMA_BOLSISTAS)
+e a versão do artefato informada por quem o constrói, a ser incrementada
+quando o cálculo mudar. Assim uma entrada nunca fica desatualizada, nem
+por dados novos nem por código novo, apenas deixa de ser usada.
+
+- Gravação atômica (bolsistas/arquivos.py): arquivo temporário no mesmo
+  diretório + os.replace.
+- Tamanho limitado: acima do limite, as entradas menos usadas recentemente
+  (data de modificação, renovada a cada leitura) são removidas.
+- Contadores de acertos, faltas, gravações e remoções do processo atual.
+
+Falhas do cache (disco cheio, diretório somente leitura, arquivo corrompido)
+nunca interrompem o dashboard: a entrada é tratada como falta.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+import pyarrow as pa
+
+from bolsistas.arquivos import gravar_atomico
+from bolsistas.esquema import ESQUEMA_BOLSISTAS
+
+DIRETORIO_PADRAO = os.environ.get('BOLSISTAS_CACHE_DIR', '.cache_bolsistas')
+LIMITE_BYTES_PADRAO = int(os.environ.get('BOLSISTAS_CACHE_MB', '256')) * 1024 * 1024
+VERSAO_FORMATO = 1
+EXTENSAO = '.arrow'
+PREFIXO_TEMPORARIO = '.tmp_cache_'
+CHAVE_METADADOS = b'bolsistas_categorias'
+IMPRESSAO_ESQUEMA = hashlib.sha256(json.dumps(ESQUEMA_BOLSISTAS, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+_trava = threading.Lock()
+_contadores = {'acertos': 0, 'faltas': 0, 'gravacoes': 0, 'remocoes': 0}
+
+
+def _contar(evento):
+    with _trava:
+        _contadores[evento] += 1
+
+
+def chave_cache(nome, versao, versao_artefato=None):
+    """Endereço (SHA-256) de um artefato numa versão dos dados e do código que o produz"""
+    conteudo = json.dumps([VERSAO_FORMATO, IMPRESSAO_ESQUEMA, nome, versao, versao_artefato], ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def _caminho_parte(diretorio, chave, indice, total):
+    return os.path.join(diretorio, f'{chave}-{indice}-{total}{EXTENSAO}')
+
+
+def para_arrow(df):
+    """Tabela Arrow de 'df', guardando o tipo das categorias que o Arrow não preserva (ex.: Int16)"""
+    tabela = pa.Table.from_pandas(df, preserve_index=None)
+    categorias = {
+        coluna: str(df[coluna].cat.categories.dtype)
+        for coluna in df.columns
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype)
+        and isinstance(df[coluna].cat.categories.dtype, pd.api.extensions.ExtensionDtype)
+    }
+    metadados = dict(tabela.schema.metadata or {})
+    metadados[CHAVE_METADADOS] = json.dumps(categorias).encode('utf-8')
+    return tabela.replace_schema_metadata(metadados)
+
+
+def de_arrow(tabela):
+    """DataFrame tipado de uma tabela gravada com para_arrow"""
+    df = tabela.to_pandas()
+    categorias = json.loads((tabela.schema.metadata or {}).get(CHAVE_METADADOS, b'{}'))
+    for coluna, tipo in categorias.items():
+        df[coluna] = df[coluna].cat.rename_categories(df[coluna].cat.categories.astype(tipo))
+    return df
+
+
+def _ler_arquivo(caminho):
+    with pa.memory_map(caminho) as arquivo:
+        tabela = pa.ipc.open_file(arquivo).read_all()
+    os.utime(caminho)  # uso recente: adia a remoção pela política de tamanho
+    return de_arrow(tabela)
+
+
+def _gravar_arquivo(caminho, df):
+    tabela = para_arrow(df)
+
+    def escrever(caminho_temporario):
+        with pa.OSFile(caminho_temporario, 'wb') as arquivo:
+            with pa.ipc.new_file(arquivo, tabela.schema) as escritor:
+                escritor.write_table(tabela)
+
+    gravar_atomico(caminho, escrever, PREFIXO_TEMPORARIO)
+
+
+def ler_tabelas(nome, versao, diretorio=DIRETORIO_PADRAO, versao_artefato=None):
+    """
+    Tabelas gravadas para (nome, versão), na ordem em que foram gravadas, ou
+    None se a entrada não existir ou estiver incompleta.
+    """
+    chave = chave_cache(nome, versao, versao_artefato)
+    primeiras = glob.glob(os.path.join(diretorio, f'{chave}-0-*{EXTENSAO}'))
+    try:
+        total = int(os.path.basename(primeiras[0])[:-len(EXTENSAO)].rsplit('-', 1)[1])
+        tabelas = tuple(_ler_arquivo(_caminho_parte(diretorio, chave, indice, total)) for indice in range(total))
+    except (IndexError, ValueError, OSError, pa.ArrowException):
+        _contar('faltas')
+        return None
+    _contar('acertos')
+    return tabelas
+
+
+def gravar_tabelas(nome, versao, tabelas, diretorio=DIRETORIO_PADRAO, limite_bytes=LIMITE_BYTES_PADRAO,
+                   versao_artefato=None):
+    """Grava as tabelas de (nome, versão) e aplica o limite de tamanho do diretório"""
+    chave = chave_cache(nome, versao, versao_artefato)
+    try:
+        os.makedirs(diretorio, exist_ok=True)
+        for indice, df in enumerate(tabelas):
+            _gravar_arquivo(_caminho_parte(diretorio, chave, indice, len(tabelas)), df)
+    except (OSError, pa.ArrowException):
+        return False
+    _contar('gravacoes')
+    remover_excedente(diretorio, limite_bytes)
+    return True
+
+
+def _entradas(diretorio):
+    """(data de modificação, tamanho, caminho) de cada arquivo do cache"""
+    entradas = []
+    for caminho in glob.glob(os.path.join(diretorio, f'*{EXTENSAO}')):
+        try:
+            informacoes = os.stat(caminho)
+        except OSError:
+            continue  # removido por outro processo
+        entradas.append((informacoes.st_mtime, informacoes.st_size, caminho))
+    return entradas
+
+
+def remover_excedente(diretorio=DIRETORIO_PADRAO, limite_bytes=LIMITE_BYTES_PADRAO):
+    """Remove os arquivos menos usados recentemente até o diretório caber no limite"""
+    entradas = sorted(_entradas(diretorio))
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, caminho in entradas:
+        if total <= limite_bytes:
+            break
+        try:
+            os.remove(caminho)
+            _contar('remocoes')
+        except OSError:
+            pass
+        total -= tamanho
+
+
+def memoizar_tabelas(nome, versao, construir, diretorio=DIRETORIO_PADRAO, limite_bytes=LIMITE_BYTES_PADRAO,
+                     versao_artefato=None):
+    """
+    Retorna as tabelas de (nome, versão) do disco ou, na falta, chama
+    construir() e grava o resultado para os demais processos. 'construir'
+    deve retornar uma tupla de DataFrames; outros resultados (ex.: None) são
+    devolvidos sem gravar. 'versao_artefato' identifica o código de
+    'construir': mudá-lo descarta as entradas calculadas pelo código anterior.
+    """
+    tabelas = ler_tabelas(nome, versao, diretorio, versao_artefato)
+    if tabelas is not None:
+        return tabelas
+    tabelas = construir()
+    if isinstance(tabelas, tuple) and all(isinstance(df, pd.DataFrame) for df in tabelas):
+        gravar_tabelas(nome, versao, tabelas, diretorio, limite_bytes, versao_artefato)
+    return tabelas
+
+
+def estatisticas(diretorio=DIRETORIO_PADRAO):
+    """Contadores do processo atual e ocupação do diretório de cache"""
+    with _trava:
+        contadores = dict(_contadores)
+    entradas = _entradas(diretorio)
+    consultas = contadores['acertos'] + contadores['faltas']
+    return {
+        **contadores,
+        'taxa_acerto': contadores['acertos'] / consultas if consultas else 0.0,
+        'arquivos': len(entradas),
+        'bytes': sum(tamanho for _, tamanho, _ in entradas),
+    }
@@ -0,0 +1,215 @@
+"""
+Motor de cenários (what-if) das visões de projeção.
+
+Um cenário é um vetor de parâmetros por programa: a fração dos formandos que
+deixa o programa ('formatura'), a evasão (fração de quem fica depois da
+formatura) e o ingresso (fração do total atual). A base (medidas por filial × curso, em arrays NumPy) é montada uma
+vez por versão dos dados; uma grade com k cenários é avaliada para as n
+células numa única operação vetorizada (broadcast k × n × programas), sem
+copiar o DataFrame a cada interação.
+
+Cada cenário avaliado fica em cache na base, pela tupla dos seus
+parâmetros: mover um slider de volta a uma posição já vista, ou comparar
+uma grade que repete cenários, não recalcula nada. Como a base é refeita a
+cada versão dos dados, o cache nunca fica desatualizado.
+
+Os saldos projetados partem dos saldos do ERP (FALTAM_SOBRAM_*) e somam a
+variação dada pelas regras de bolsistas/regras_cebas.py aplicadas à variação
+dos totais de cada programa.
+"""
+
+import itertools
+import threading
+
+import numpy as np
+import pandas as pd
+
+from bolsistas.regras_cebas import saldos_cebas
+
+PROGRAMAS = ('PROUNI', 'INSTITUCIONAL', 'ASSISTENCIAL_100', 'ASSISTENCIAL_50', 'PAGANTES')
+COLUNAS_PROGRAMAS = {
+    'PROUNI': 'TOTAL_PROUNI',
+    'INSTITUCIONAL': 'TOTAL_INSTITUCIONAL',
+    'ASSISTENCIAL_100': 'TOTAL_ASSISTENCIAL_100',
+    'ASSISTENCIAL_50': 'TOTAL_ASSISTENCIAL_50',
+    'PAGANTES': 'ALUNOS_PAGANTES',
+}
+PARAMETROS = ('formatura', 'evasao', 'ingresso')
+PARAMETROS_CENARIO = tuple(f'{parametro}_{programa}' for parametro in PARAMETROS for programa in PROGRAMAS)
+
+LIMITE_CACHE_CENARIOS = 512
+
+_COLUNAS_BASE = tuple(COLUNAS_PROGRAMAS.values()) + (
+    'FORMANDOS_PROUNI', 'FORMANDOS_ASSISTENCIAL', 'FORMANDOS_NAO_CEBAS',
+    'FALTAM_SOBRAM_PROUNI', 'FALTAM_SOBRAM_FILANTROPIA',
+)
+
+
+def montar_base_cenarios(df):
+    """
+    Base dos cenários a partir dos dados de bolsistas: medidas somadas por
+    (filial, curso), sem as linhas de subtotal, e os arrays usados na
+    avaliação. Os formandos assistenciais são divididos entre bolsas
+    integrais e meias bolsas na proporção de cada uma no curso.
+    """
+    if 'LINHA_SUBTOTAL' in df.columns:
+        df = df[~df['LINHA_SUBTOTAL']]
+    celulas = df.groupby(['CODFILIAL', 'NOMECURSO'], observed=True, dropna=False)[list(_COLUNAS_BASE)].sum()
+    valores = {coluna: celulas[coluna].to_numpy(dtype='float64', na_value=0) for coluna in _COLUNAS_BASE}
+
+    totais = np.column_stack([valores[COLUNAS_PROGRAMAS[programa]] for programa in PROGRAMAS])
+    assistenciais = valores['TOTAL_ASSISTENCIAL_100'] + valores['TOTAL_ASSISTENCIAL_50']
+    fracao_integral = np.divide(valores['TOTAL_ASSISTENCIAL_100'], assistenciais,
+                                out=np.ones_like(assistenciais), where=assistenciais > 0)
+    formandos = np.column_stack([
+        valores['FORMANDOS_PROUNI'],
+        np.zeros(len(celulas)),  # o ERP não separa os formandos institucionais
+        valores['FORMANDOS_ASSISTENCIAL'] * fracao_integral,
+        valores['FORMANDOS_ASSISTENCIAL'] * (1 - fracao_integral),
+        valores['FORMANDOS_NAO_CEBAS'],
+    ])
+    return {
+        'celulas': celulas.index,
+        'totais': totais,
+        'formandos': formandos,
+        'saldos': np.column_stack([valores['FALTAM_SOBRAM_PROUNI'], valores['FALTAM_SOBRAM_FILANTROPIA']]),
+        'cache': {},
+        'trava': threading.Lock(),
+    }
+
+
+def vetor_cenario(cenario):
+    """Tupla com todos os parâmetros do cenário (ausentes valem 0), na ordem de PARAMETROS_CENARIO"""
+    desconhecidos = set(cenario) - set(PARAMETROS_CENARIO)
+    if desconhecidos:
+        raise ValueError(f"Parâmetros de cenário desconhecidos: {sorted(desconhecidos)}")
+    return tuple(float(cenario.get(parametro, 0)) for parametro in PARAMETROS_CENARIO)
+
+
+def grade_cenarios(cenario_base=None, **eixos):
+    """
+    Todas as combinações dos valores de cada eixo, um cenário por linha, a
+    partir de 'cenario_base' (dicionário). Ex.:
+    grade_cenarios(evasao_PAGANTES=[0, 0.05, 0.1], ingresso_PAGANTES=[0, 0.1]).
+    """
+    cenario_base = dict(cenario_base or {})
+    nomes = list(eixos)
+    cenarios = [{**cenario_base, **dict(zip(nomes, valores))} for valores in itertools.product(*eixos.values())]
+    return pd.DataFrame([vetor_cenario(cenario) for cenario in cenarios], columns=list(PARAMETROS_CENARIO))
+
+
+def _avaliar(base, vetores):
+    """Totais (k × n × programas) e saldos (k × n) dos cenários, numa única operação vetorizada"""
+    parametros = np.asarray(vetores, dtype='float64').reshape(len(vetores), len(PARAMETROS), len(PROGRAMAS))
+    formatura, evasao, ingresso = parametros[:, 0, None, :], parametros[:, 1, None, :], parametros[:, 2, None, :]
+
+    # Os formandos saem primeiro e a evasão vale para quem fica, como no Monte Carlo
+    formandos = np.minimum(base['formandos'], base['totais'])[None]
+    totais = (base['totais'][None] - formatura * formandos) * (1 - evasao) + ingresso * base['totais'][None]
+    return (totais,) + saldos_projetados(base, totais)
+
+
+def saldos_projetados(base, totais):
+    """Saldos PROUNI e filantropia (... × n) dados os totais projetados (... × n × programas)"""
+    variacao = totais - base['totais']
+    prouni, assistencial_100, assistencial_50, pagantes, institucional = (
+        variacao[..., PROGRAMAS.index(programa)]
+        for programa in ('PROUNI', 'ASSISTENCIAL_100', 'ASSISTENCIAL_50', 'PAGANTES', 'INSTITUCIONAL')
+    )
+    variacao_prouni, variacao_filantropia = saldos_cebas(
+        prouni, assistencial_100, assistencial_50, pagantes, institucional
+    )
+    return base['saldos'][:, 0] + variacao_prouni, base['saldos'][:, 1] + variacao_filantropia
+
+
+def avaliar_cenarios(base, cenarios):
+    """
+    Avalia os cenários (DataFrame de grade_cenarios ou lista de dicionários)
+    para todas as células da base. Só os cenários ainda não vistos são
+    calculados, todos de uma vez. Retorna 'totais' (k × n × programas),
+    'saldo_prouni' e 'saldo_filantropia' (k × n).
+    """
+    if isinstance(cenarios, pd.DataFrame):
+        vetores = [tuple(linha) for linha in cenarios[list(PARAMETROS_CENARIO)].itertuples(index=False)]
+    else:
+        vetores = [vetor_cenario(cenario) for cenario in cenarios]
+
+    cache = base['cache']
+    with base['trava']:
+        faltantes = list(dict.fromkeys(vetor for vetor in vetores if vetor not in cache))
+    if faltantes:
+        totais, saldo_prouni, saldo_filantropia = _avaliar(base, faltantes)
+        with base['trava']:
+            for i, vetor in enumerate(faltantes):
+                cache[vetor] = (totais[i], saldo_prouni[i], saldo_filantropia[i])
+            while len(cache) > max(LIMITE_CACHE_CENARIOS, len(vetores)):
+                cache.pop(next(iter(cache)))
+    with base['trava']:
+        resultados = [cache[vetor] for vetor in vetores]
+
+    return {
+        'totais': np.stack([resultado[0] for resultado in resultados]),
+        'saldo_prouni': np.stack([resultado[1] for resultado in resultados]),
+        'saldo_filantropia': np.stack([resultado[2] for resultado in resultados]),
+    }
+
+
+def mascara_filial(base, filial):
+    """Células da filial (com as sem filial, como nos filtros dos dashboards); None seleciona todas"""
+    codigos = base['celulas'].get_level_values('CODFILIAL')
+    if filial is None:
+        return np.ones(len(codigos), dtype=bool)
+    return np.asarray((codigos == filial) | codigos.isna(), dtype=bool)
+
+
+def projetar_cenario(base, cenario, filial=None):
+    """Totais e saldos projetados de um cenário, por (filial, curso)"""
+    resultado = avaliar_cenarios(base, [cenario])
+    mascara = mascara_filial(base, filial)
+    projecao = pd.DataFrame(
+        resultado['totais'][0][mascara], index=base['celulas'][mascara],
+        columns=[COLUNAS_PROGRAMAS[programa] for programa in PROGRAMAS],
+    )
+    projecao['SALDO_PROUNI'] = resultado['saldo_prouni'][0][mascara]
+    projecao['SALDO_FILANTROPIA'] = resultado['saldo_filantropia'][0][mascara]
+    return projecao
+
+
+def aplicar_cenario(base, df, cenario):
+    """
+    Cópia rasa de df (linhas com CODFILIAL e NOMECURSO) com os totais de
+    cada programa substituídos pelos projetados no cenário. Linhas cujo
+    (filial, curso) não está na base mantêm os valores atuais.
+    """
+    # reindex deixa NaN nas chaves ausentes (get_indexer daria -1, que copiaria a última célula)
+    projecao = projetar_cenario(base, cenario).reindex(pd.MultiIndex.from_frame(df[['CODFILIAL', 'NOMECURSO']]))
+    df_projecao = df.copy(deep=False)
+    for coluna in COLUNAS_PROGRAMAS.values():
+        if coluna in df_projecao.columns:
+            atual = df_projecao[coluna].to_numpy(dtype='float64', na_value=np.nan)
+            projetada = projecao[coluna].to_numpy()
+            df_projecao[coluna] = np.where(np.isnan(projetada), atual, projetada)
+    return df_projecao
+
+
+def resumir_cenarios(base, cenarios, filial=None):
+    """
+    Uma linha por cenário com os parâmetros, os totais projetados de cada
+    programa, os saldos arredondados e os cursos em déficit, na filial
+    pedida (None: todas).
+    """
+    if not isinstance(cenarios, pd.DataFrame):
+        cenarios = pd.DataFrame([vetor_cenario(cenario) for cenario in cenarios], columns=list(PARAMETROS_CENARIO))
+    resultado = avaliar_cenarios(base, cenarios)
+    mascara = mascara_filial(base, filial)
+
+    saldo_prouni = np.round(resultado['saldo_prouni'][:, mascara])
+    saldo_filantropia = np.round(resultado['saldo_filantropia'][:, mascara])
+    resumo = cenarios.reset_index(drop=True).copy()
+    totais = resultado['totais'][:, mascara, :].sum(axis=1)
+    for i, programa in enumerate(PROGRAMAS):
+        resumo[COLUNAS_PROGRAMAS[programa]] = totais[:, i]
+    resumo['SALDO_PROUNI'] = saldo_prouni.sum(axis=1)
+    resumo['SALDO_FILANTROPIA'] = saldo_filantropia.sum(axis=1)
+    resumo['CURSOS_DEFICIT'] = ((saldo_prouni < 0) | (saldo_filantropia < 0)).sum(axis=1)
+    return resumo
@@ -0,0 +1,51 @@
+"""
+Classificação vetorizada de conformidade e de risco.
+
+Os rótulos exibidos nas tabelas e gráficos ('Atende'/'Não Atende',
+'Superávit'/'Déficit' e as faixas de risco da projeção) são calculados sobre a
+coluna inteira com np.where/pd.cut, em vez de um .apply com lambda por linha,
+e devolvidos como categorias.
+"""
+
+import numpy as np
+import pandas as pd
+
+ATENDE = 'Atende'
+NAO_ATENDE = 'Não Atende'
+SUPERAVIT = 'Superávit'
+DEFICIT = 'Déficit'
+
+RISCO_BAIXO = '🟢 Baixo'
+RISCO_MEDIO = '🟡 Médio'
+RISCO_ALTO = '🔴 Alto'
+
+# Limites de impacto (%) das faixas de risco da projeção
+LIMITE_RISCO_ALTO = 20
+LIMITE_RISCO_MEDIO = 10
+
+
+def classificar_saldo(saldo, rotulo_positivo=ATENDE, rotulo_negativo=NAO_ATENDE, limite=0):
+    """
+    Rotula cada saldo: 'rotulo_positivo' quando saldo >= limite e
+    'rotulo_negativo' caso contrário (inclusive saldos nulos).
+    """
+    positivo = (pd.Series(saldo) >= limite).fillna(False).to_numpy(dtype=bool)
+    return pd.Series(
+        pd.Categorical(np.where(positivo, rotulo_positivo, rotulo_negativo),
+                       categories=[rotulo_positivo, rotulo_negativo]),
+        index=getattr(saldo, 'index', None),
+    )
+
+
+def classificar_risco(percentual_impacto, limite_alto=LIMITE_RISCO_ALTO, limite_medio=LIMITE_RISCO_MEDIO):
+    """
+    Faixa de risco pelo percentual de impacto: alto acima de 'limite_alto',
+    médio acima de 'limite_medio' e baixo nos demais (inclusive nulos).
+    Retorna uma categoria ordenada (baixo < médio < alto).
+    """
+    percentual = pd.Series(percentual_impacto, dtype='float64').fillna(0)
+    return pd.cut(
+        percentual,
+        bins=[-np.inf, limite_medio, limite_alto, np.inf],
+        labels=[RISCO_BAIXO, RISCO_MEDIO, RISCO_ALTO],
+    )
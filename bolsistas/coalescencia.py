@@ -0,0 +1,63 @@
+"""
+Coalescência de chamadas simultâneas (single-flight).
+
+Com o cache frio, várias sessões que chegam juntas (a equipe abrindo o
+dashboard pela manhã) disparariam a mesma leitura da planilha ou a mesma
+requisição à API ao mesmo tempo. Aqui só a primeira chamada de cada chave
+executa; as demais esperam e recebem o mesmo resultado (ou a mesma exceção).
+Os contadores mostram quantas chamadas foram executadas e quantas foram
+coalescidas, no total e por tipo de chave.
+"""
+
+import threading
+
+_trava = threading.Lock()
+_em_andamento = {}  # chave -> {'pronto', 'resultado', 'erro'}
+_metricas = {}  # tipo da chave -> {'execucoes', 'coalescidas'}
+
+
+def _tipo_chave(chave):
+    return chave[0] if isinstance(chave, tuple) and chave else chave
+
+
+def executar_uma_vez(chave, funcao, *args, **kwargs):
+    """
+    Executa funcao(*args, **kwargs), a menos que já haja uma execução em
+    andamento para 'chave': nesse caso espera por ela e devolve o resultado.
+    A chave deve ser hashable; quando for uma tupla, o primeiro elemento
+    identifica o tipo da chamada nas métricas.
+    """
+    with _trava:
+        chamada = _em_andamento.get(chave)
+        executar = chamada is None
+        if executar:
+            chamada = _em_andamento[chave] = {'pronto': threading.Event(), 'resultado': None, 'erro': None}
+        contadores = _metricas.setdefault(_tipo_chave(chave), {'execucoes': 0, 'coalescidas': 0})
+        contadores['execucoes' if executar else 'coalescidas'] += 1
+
+    if executar:
+        try:
+            chamada['resultado'] = funcao(*args, **kwargs)
+        except BaseException as erro:
+            chamada['erro'] = erro
+        finally:
+            with _trava:
+                del _em_andamento[chave]
+            chamada['pronto'].set()
+    else:
+        chamada['pronto'].wait()
+
+    if chamada['erro'] is not None:
+        raise chamada['erro']
+    return chamada['resultado']
+
+
+def metricas_coalescencia():
+    """Execuções e chamadas coalescidas por tipo de chave, mais os totais"""
+    with _trava:
+        por_tipo = {tipo: dict(contadores) for tipo, contadores in _metricas.items()}
+    return {
+        'execucoes': sum(contadores['execucoes'] for contadores in por_tipo.values()),
+        'coalescidas': sum(contadores['coalescidas'] for contadores in por_tipo.values()),
+        'por_tipo': por_tipo,
+    }
@@ -0,0 +1,116 @@
+"""
+Simulação por coortes, semestre a semestre, dos bolsistas de cada curso.
+
+A projeção de um período (bolsistas/cenarios.py) subtrai os formandos de uma
+vez. Aqui cada programa de cada curso é acompanhado por semestre do curso:
+a cada semestre da projeção, parte da última turma se forma (taxa de
+formatura), a evasão é aplicada a quem ficou, as turmas avançam um semestre
+e os ingressantes entram no primeiro semestre. É a ordem do motor de
+cenários e do Monte Carlo, então o primeiro semestre coincide com a
+projeção de um período. Os parâmetros são os mesmos do motor de cenários, lidos por
+semestre; o ingresso é uma fração do total atual do programa no curso.
+
+O ERP não informa o semestre de cada aluno: a distribuição inicial põe os
+formandos no último semestre e divide os demais igualmente entre os
+anteriores. A duração vem de DURACOES_CURSOS (semestres), com
+DURACAO_PADRAO para os cursos não listados.
+
+Todas as células (filial × curso) avançam juntas num array denso
+células × programas × semestres do curso; o laço é só sobre o horizonte, e
+os saldos de cada semestre seguem as regras do motor de cenários.
+"""
+
+import numpy as np
+import pandas as pd
+
+from bolsistas.cenarios import PARAMETROS, PROGRAMAS, mascara_filial, saldos_projetados, vetor_cenario
+
+HORIZONTE_PADRAO = 10
+DURACAO_PADRAO = 8
+
+DURACOES_CURSOS = {
+    'MEDICINA': 12,
+    'ARQUITETURA E URBANISMO': 10,
+    'DIREITO': 10,
+    'ENGENHARIA CIVIL': 10,
+    'FISIOTERAPIA': 10,
+    'PSICOLOGIA': 10,
+    'SUPERIOR DE TECNOLOGIA EM RADIOLOGIA': 6,
+    'TECNOLOGIA EM GESTÃO COMERCIAL': 4,
+    'TECNOLOGIA EM GESTÃO DE RECURSOS HUMANOS': 4,
+    'TECNOLOGIA EM GESTÃO HOSPITALAR': 4,
+    'TECNOLOGIA EM MARKETING': 4,
+}
+
+
+def _duracoes(base, duracoes):
+    """Duração (semestres) de cada célula da base"""
+    duracoes = DURACOES_CURSOS if duracoes is None else duracoes
+    cursos = base['celulas'].get_level_values('NOMECURSO')
+    return np.array([duracoes.get(curso, DURACAO_PADRAO) for curso in cursos], dtype=np.intp)
+
+
+def coortes_iniciais(base, duracoes=None):
+    """
+    Array células × programas × semestres com a distribuição inicial: os
+    formandos no último semestre de cada curso e os demais divididos
+    igualmente entre os semestres anteriores.
+    """
+    duracao = _duracoes(base, duracoes)
+    formandos = np.minimum(base['formandos'], base['totais'])
+    demais = base['totais'] - formandos
+
+    semestres = np.arange(duracao.max(initial=1))
+    anteriores = semestres < (duracao - 1)[:, None]  # células × semestres
+    coortes = np.where(anteriores[:, None, :], (demais / np.maximum(duracao - 1, 1)[:, None])[..., None], 0.0)
+    # Curso de um semestre só: todos estão no último
+    coortes[np.arange(len(duracao)), :, duracao - 1] = formandos + np.where(duracao[:, None] == 1, demais, 0)
+    return coortes
+
+
+def projetar_coortes(base, cenario, horizonte=HORIZONTE_PADRAO, duracoes=None):
+    """
+    Trajetória de 'horizonte' semestres do cenário para todas as células.
+    Retorna 'totais' ((horizonte + 1) × células × programas), 'saldo_prouni'
+    e 'saldo_filantropia' ((horizonte + 1) × células); o índice 0 é a
+    situação atual.
+    """
+    formatura, evasao, ingresso = np.asarray(vetor_cenario(cenario)).reshape(len(PARAMETROS), len(PROGRAMAS))
+    duracao = _duracoes(base, duracoes)
+    celulas = np.arange(len(duracao))
+    coortes = coortes_iniciais(base, duracoes)
+    ingressantes = ingresso * base['totais']
+
+    totais = np.empty((horizonte + 1,) + base['totais'].shape)
+    totais[0] = coortes.sum(axis=-1)
+    for semestre in range(1, horizonte + 1):
+        # Os formandos saem antes da evasão, como no motor de cenários
+        ultima = coortes[celulas, :, duracao - 1] * (1 - formatura)
+        coortes[celulas, :, duracao - 1] = 0
+        coortes *= (1 - evasao)[:, None]
+        ultima *= 1 - evasao
+        coortes[..., 1:] = coortes[..., :-1]
+        coortes[..., 0] = ingressantes
+        # Quem não se formou continua no último semestre
+        coortes[celulas, :, duracao - 1] += ultima
+        totais[semestre] = coortes.sum(axis=-1)
+
+    saldo_prouni, saldo_filantropia = saldos_projetados(base, totais)
+    return {'totais': totais, 'saldo_prouni': saldo_prouni, 'saldo_filantropia': saldo_filantropia}
+
+
+def trajetoria_saldos(base, cenario, horizonte=HORIZONTE_PADRAO, filial=None, duracoes=None):
+    """
+    Uma linha por semestre da projeção com os saldos PROUNI e filantropia
+    somados e os cursos em déficit, na filial pedida (None: todas).
+    """
+    projecao = projetar_coortes(base, cenario, horizonte, duracoes)
+    mascara = mascara_filial(base, filial)
+    saldo_prouni = np.round(projecao['saldo_prouni'][:, mascara])
+    saldo_filantropia = np.round(projecao['saldo_filantropia'][:, mascara])
+    return pd.DataFrame({
+        'SEMESTRE': np.arange(horizonte + 1),
+        'SALDO_PROUNI': saldo_prouni.sum(axis=1),
+        'SALDO_FILANTROPIA': saldo_filantropia.sum(axis=1),
+        'CURSOS_DEFICIT': ((saldo_prouni < 0) | (saldo_filantropia < 0)).sum(axis=1),
+    })
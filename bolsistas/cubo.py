@@ -0,0 +1,171 @@
+"""
+Cubo de indicadores dos dashboards.
+
+As medidas de cada programa são agregadas por filial × curso uma única vez por
+versão dos dados, e os indicadores de cada opção do seletor de filial (cards,
+gráfico de pizza, resumos de conformidade e faixas de risco da projeção) são
+calculados a partir dessas células. Trocar a filial passa a ser uma consulta
+ao cubo em vez de uma varredura das linhas.
+"""
+
+import pandas as pd
+
+from bolsistas.classificacao import RISCO_ALTO, RISCO_BAIXO, RISCO_MEDIO, classificar_risco
+
+TODAS_FILIAIS = 'Todas'
+
+MEDIDAS_CUBO = (
+    'TOTAL_MATRICULADOS', 'TOTAL_INSTITUCIONAL', 'TOTAL_PROUNI', 'TOTAL_ASSISTENCIAL_100',
+    'TOTAL_ASSISTENCIAL_50', 'FORMANDOS_NAO_CEBAS', 'FORMANDOS_ASSISTENCIAL',
+    'FALTAM_SOBRAM_PROUNI', 'FALTAM_SOBRAM_FILANTROPIA',
+)
+COLUNAS_CUBO = ('CODFILIAL', 'NOMECURSO') + MEDIDAS_CUBO
+
+
+def indicadores_conformidade(df_conformidade, coluna_prouni='PROUNI_SOBRA_FALTA',
+                             coluna_filantropia='FILANTROPIA_SOBRA_FALTA'):
+    """Saldos, cursos em déficit e resumo de sobras/faltas a partir de uma tabela por curso"""
+    prouni = df_conformidade[coluna_prouni]
+    filantropia = df_conformidade[coluna_filantropia]
+    return {
+        'SALDO_PROUNI': int(prouni.sum()),
+        'SALDO_FILANTROPIA': int(filantropia.sum()),
+        'CURSOS_DEFICIT': int(((prouni < 0) | (filantropia < 0)).sum()),
+        'SOBRA_PROUNI': int(prouni[prouni > 0].sum()),
+        'FALTA_PROUNI': int(-prouni[prouni < 0].sum()),
+        'CURSOS_SOBRA_PROUNI': int((prouni > 0).sum()),
+        'CURSOS_FALTA_PROUNI': int((prouni < 0).sum()),
+        'SOBRA_FILANTROPIA': int(filantropia[filantropia > 0].sum()),
+        'FALTA_FILANTROPIA': int(-filantropia[filantropia < 0].sum()),
+        'CURSOS_SOBRA_FILANTROPIA': int((filantropia > 0).sum()),
+        'CURSOS_FALTA_FILANTROPIA': int((filantropia < 0).sum()),
+    }
+
+
+def contar_faixas_risco(percentual_impacto):
+    """Quantidade de cursos em cada faixa de risco, dado o percentual de impacto"""
+    faixas = classificar_risco(percentual_impacto).value_counts()
+    return {
+        'CURSOS_ALTO_RISCO': int(faixas[RISCO_ALTO]),
+        'CURSOS_MEDIO_RISCO': int(faixas[RISCO_MEDIO]),
+        'CURSOS_BAIXO_RISCO': int(faixas[RISCO_BAIXO]),
+    }
+
+
+def _indicadores_fatia(celulas):
+    """Indicadores de um conjunto de células (filial, curso) do cubo"""
+    soma = celulas.sum()
+
+    # Projeção: formandos, bolsas perdidas e faixas de risco dos cursos com formandos
+    formandos = celulas['FORMANDOS_NAO_CEBAS'] + celulas['FORMANDOS_ASSISTENCIAL']
+    bolsas_atuais = (celulas['TOTAL_INSTITUCIONAL'] + celulas['TOTAL_ASSISTENCIAL_100']
+                     + celulas['TOTAL_ASSISTENCIAL_50'] + celulas['TOTAL_PROUNI'])
+    com_formandos = (formandos > 0).to_numpy(dtype=bool)
+    percentual_impacto = (
+        celulas['FORMANDOS_ASSISTENCIAL'][com_formandos].astype('float64')
+        / bolsas_atuais[com_formandos].astype('float64') * 100
+    ).fillna(0)
+
+    indicadores = {
+        'TOTAL_MATRICULADOS': int(soma['TOTAL_MATRICULADOS']),
+        'TOTAL_INSTITUCIONAL': int(soma['TOTAL_INSTITUCIONAL']),
+        'TOTAL_PROUNI': int(soma['TOTAL_PROUNI']),
+        'TOTAL_ASSISTENCIAL_100': int(soma['TOTAL_ASSISTENCIAL_100']),
+        'TOTAL_ASSISTENCIAL_50': int(soma['TOTAL_ASSISTENCIAL_50']),
+        'TOTAL_ASSISTENCIAL': int(soma['TOTAL_ASSISTENCIAL_100'] + soma['TOTAL_ASSISTENCIAL_50']),
+        'TOTAL_FORMANDOS': int(formandos.sum()),
+        'BOLSAS_PERDIDAS': int(soma['FORMANDOS_ASSISTENCIAL']),
+        'BOLSAS_ATUAIS': int(bolsas_atuais.sum()),
+        **contar_faixas_risco(percentual_impacto),
+    }
+
+    # Conformidade: só filiais e cursos identificados, com o curso somado entre filiais
+    identificadas = (celulas.index.get_level_values('CODFILIAL').notna()
+                     & celulas.index.get_level_values('NOMECURSO').notna())
+    por_curso = celulas[identificadas].groupby(level='NOMECURSO', observed=True)[
+        ['FALTAM_SOBRAM_PROUNI', 'FALTAM_SOBRAM_FILANTROPIA']
+    ].sum()
+    indicadores.update(indicadores_conformidade(por_curso, 'FALTAM_SOBRAM_PROUNI', 'FALTAM_SOBRAM_FILANTROPIA'))
+    return indicadores
+
+
+def construir_cubo(df):
+    """
+    Agrega as medidas por (filial, curso) e pré-calcula os indicadores de cada
+    opção do seletor de filial. Retorna um dicionário com 'celulas' (medidas por
+    filial e curso) e 'indicadores' (uma linha por código de filial e uma para
+    TODAS_FILIAIS). Linhas sem filial entram em todas as opções, como nos filtros
+    dos dashboards.
+    """
+    if 'LINHA_SUBTOTAL' in df.columns:
+        df = df[~df['LINHA_SUBTOTAL']]
+
+    celulas = df.groupby(['CODFILIAL', 'NOMECURSO'], observed=True, dropna=False)[list(MEDIDAS_CUBO)].sum()
+
+    codigos = celulas.index.get_level_values('CODFILIAL')
+    sem_filial = codigos.isna()
+
+    indicadores = {TODAS_FILIAIS: _indicadores_fatia(celulas)}
+    for filial in sorted(codigos[~sem_filial].unique()):
+        indicadores[filial] = _indicadores_fatia(celulas[(codigos == filial) | sem_filial])
+
+    return {
+        'celulas': celulas,
+        'indicadores': pd.DataFrame.from_dict(indicadores, orient='index'),
+    }
+
+
+def _chaves_objeto(chaves):
+    """MultiIndex de (filial, curso) com valores Python, comparável entre categorias diferentes"""
+    return pd.MultiIndex.from_frame(chaves.astype(object))
+
+
+def atualizar_cubo(cubo, df, chaves_alteradas):
+    """
+    Atualiza o cubo depois de uma sincronização incremental: só as células
+    (filial, curso) de 'chaves_alteradas' são reagregadas a partir de 'df'
+    (a tabela já mesclada) e só os indicadores das filiais afetadas e de
+    TODAS_FILIAIS são recalculados. Uma alteração sem filial afeta todas.
+    """
+    if chaves_alteradas.empty:
+        return cubo
+    if 'LINHA_SUBTOTAL' in df.columns:
+        df = df[~df['LINHA_SUBTOTAL']]
+
+    chaves = ['CODFILIAL', 'NOMECURSO']
+    alteradas = _chaves_objeto(chaves_alteradas[chaves])
+    recalculadas = df[_chaves_objeto(df[chaves]).isin(alteradas)].groupby(chaves, observed=True, dropna=False)[list(MEDIDAS_CUBO)].sum()
+
+    anteriores = cubo['celulas']
+    mantidas = ~_chaves_objeto(anteriores.index.to_frame(index=False)).isin(alteradas)
+    celulas = pd.concat([anteriores[mantidas], recalculadas])
+    # mesmos tipos de índice e mesma ordem de construir_cubo
+    indice = celulas.index.to_frame(index=False).astype(object)
+    celulas.index = pd.MultiIndex.from_arrays([indice[chave].astype(df[chave].dtype) for chave in chaves])
+    celulas = celulas.groupby(level=chaves, observed=True, dropna=False).sum()
+
+    codigos = celulas.index.get_level_values('CODFILIAL')
+    sem_filial = codigos.isna()
+    filiais = sorted(codigos[~sem_filial].unique())
+    afetadas = chaves_alteradas['CODFILIAL']
+    if afetadas.isna().any():
+        afetadas = filiais
+    else:
+        afetadas = [filial for filial in filiais if filial in set(afetadas)]
+
+    indicadores = cubo['indicadores'].loc[[TODAS_FILIAIS] + [f for f in filiais if f in cubo['indicadores'].index]]
+    indicadores = indicadores.to_dict(orient='index')
+    indicadores[TODAS_FILIAIS] = _indicadores_fatia(celulas)
+    for filial in afetadas:
+        indicadores[filial] = _indicadores_fatia(celulas[(codigos == filial) | sem_filial])
+    indicadores = {filial: indicadores[filial] for filial in [TODAS_FILIAIS] + filiais}
+
+    return {
+        'celulas': celulas,
+        'indicadores': pd.DataFrame.from_dict(indicadores, orient='index'),
+    }
+
+
+def indicadores_filial(cubo, filial=TODAS_FILIAIS):
+    """Consulta os indicadores de uma filial (ou de TODAS_FILIAIS) no cubo"""
+    return cubo['indicadores'].loc[filial]
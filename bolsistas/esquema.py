@@ -0,0 +1,107 @@
+"""
+Esquema de tipos do conjunto de dados de bolsistas.
+
+O esquema é aplicado uma única vez na carga: códigos e nomes viram categorias
+e as contagens viram inteiros anuláveis de 32 bits, em vez dos float64/object
+que a leitura da planilha produz. Assim os dashboards não precisam converter
+colunas para inteiro a cada interação.
+
+CODFILIAL também é normalizado aqui: o código da filial vira inteiro e as
+colunas LINHA_SUBTOTAL e FILIAL_VALIDA indicam, respectivamente, as linhas de
+subtotal do ERP ('4 Total') e as linhas com código de filial reconhecido.
+Os dashboards filtram por essas máscaras booleanas em vez de converter
+CODFILIAL para texto a cada interação.
+"""
+
+import pandas as pd
+
+CONTAGENS_BOLSISTAS = (
+    'TOTAL_MATRICULADOS', 'ALUNOS_PAGANTES', 'FORMANDOS_NAO_CEBAS', 'TOTAL_INSTITUCIONAL',
+    'TOTAL_ASSISTENCIAL_100', 'TOTAL_ASSISTENCIAL_50', 'FORMANDOS_ASSISTENCIAL', 'TOTAL_PROUNI',
+    'FORMANDOS_PROUNI', 'BOLSAS_INTEGRAIS', 'FALTAM_SOBRAM_PROUNI', 'FALTAM_SOBRAM_FILANTROPIA',
+)
+
+# Colunas booleanas derivadas de CODFILIAL na carga
+COLUNAS_DERIVADAS_FILIAL = ('LINHA_SUBTOTAL', 'FILIAL_VALIDA')
+
+# Versão da conversão (aplicar_esquema, normalizar_filial) no cache em disco: incrementar ao mudar
+# o código sem mudar ESQUEMA_BOLSISTAS, para não servir tabelas tipadas pela conversão anterior
+VERSAO_CONVERSAO = 1
+
+# Tipos: 'filial' (categoria de códigos inteiros), 'category' ou um tipo inteiro anulável
+ESQUEMA_BOLSISTAS = {
+    'CODFILIAL': 'filial',
+    'NOMECURSO': 'category',
+    'ATENDE_1_9_PROUNI': 'category',
+    'ATENDE_1_5_FILANTROPIA': 'category',
+    **{coluna: 'Int32' for coluna in CONTAGENS_BOLSISTAS},
+}
+
+
+def normalizar_filial(serie):
+    """
+    Separa CODFILIAL em código inteiro da filial (categoria), indicador de
+    linha de subtotal e indicador de código válido. Aceita 4, 4.0, '4',
+    '4 Total' e 'TOTAL_4'; a conversão para texto acontece só aqui, uma vez.
+    """
+    texto = serie.astype(str).where(serie.notna(), '')
+    codigo = pd.to_numeric(texto.str.extract(r'(\d+)', expand=False), errors='coerce').astype('Int16')
+    subtotal = texto.str.contains('total', case=False, regex=False).to_numpy(dtype=bool)
+    valida = codigo.notna().to_numpy(dtype=bool)
+    return codigo.astype('category'), subtotal, valida
+
+
+def _converter_inteiro(serie, tipo):
+    return pd.to_numeric(serie, errors='coerce').round().astype(tipo)
+
+
+def converter_coluna(serie, tipo):
+    """Converte uma coluna para o tipo declarado no esquema"""
+    if tipo == 'filial':
+        return normalizar_filial(serie)[0]
+    if tipo == 'category':
+        return serie.astype('category')
+    return _converter_inteiro(serie, tipo)
+
+
+def _filial_normalizada(df):
+    return (isinstance(df['CODFILIAL'].dtype, pd.CategoricalDtype)
+            and all(coluna in df.columns for coluna in COLUNAS_DERIVADAS_FILIAL))
+
+
+def aplicar_esquema(df, esquema=ESQUEMA_BOLSISTAS):
+    """Retorna um novo DataFrame com as colunas presentes no esquema convertidas"""
+    df_tipado = df.copy()
+    for coluna, tipo in esquema.items():
+        if coluna not in df_tipado.columns:
+            continue
+        if tipo == 'filial':
+            if _filial_normalizada(df_tipado):
+                continue  # já tipado (ex.: tabela Arrow da API); normalizar de novo perderia os subtotais
+            codigo, subtotal, valida = normalizar_filial(df_tipado[coluna])
+            df_tipado[coluna] = codigo
+            df_tipado['LINHA_SUBTOTAL'] = subtotal
+            df_tipado['FILIAL_VALIDA'] = valida
+        elif str(df_tipado[coluna].dtype) != tipo:
+            df_tipado[coluna] = converter_coluna(df_tipado[coluna], tipo)
+    return df_tipado
+
+
+def relatorio_memoria(df_antes, df_depois):
+    """
+    Compara o uso de memória por coluna antes e depois da aplicação do esquema.
+    Retorna um DataFrame com tipos, bytes antes/depois e bytes economizados.
+    """
+    df_depois = df_depois.drop(columns=list(COLUNAS_DERIVADAS_FILIAL), errors='ignore')
+    bytes_antes = df_antes.memory_usage(deep=True, index=False)
+    bytes_depois = df_depois.memory_usage(deep=True, index=False).reindex(bytes_antes.index)
+
+    relatorio = pd.DataFrame({
+        'TIPO_ANTES': df_antes.dtypes.astype(str),
+        'TIPO_DEPOIS': df_depois.dtypes.reindex(bytes_antes.index).astype(str),
+        'BYTES_ANTES': bytes_antes,
+        'BYTES_DEPOIS': bytes_depois,
+    })
+    relatorio['BYTES_ECONOMIZADOS'] = relatorio['BYTES_ANTES'] - relatorio['BYTES_DEPOIS']
+    relatorio.index.name = 'COLUNA'
+    return relatorio.sort_values('BYTES_ECONOMIZADOS', ascending=False)
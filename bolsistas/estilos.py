@@ -0,0 +1,74 @@
+"""
+Estilização vetorizada das tabelas dos dashboards.
+
+Em vez de uma função Python chamada por linha ou por célula (Styler.apply com
+axis=1 ou Styler.map), a matriz de CSS da tabela inteira é montada com
+máscaras vetorizadas e aplicada de uma vez com Styler.apply(axis=None). As
+regras são declaradas como dicionários:
+
+- saldos: {coluna: (css_positivo, css_negativo, css_zero)}; nulos ficam sem estilo
+- rotulos: {coluna: {valor: css}}
+- linhas: [(mascara, css)], aplicadas em ordem e sobrepondo a linha inteira
+
+Acima de LIMITE_LINHAS_ESTILO linhas a tabela é exibida sem estilo, pois a
+renderização do Styler passa a dominar o tempo da página.
+"""
+
+import numpy as np
+import pandas as pd
+
+LIMITE_LINHAS_ESTILO = 2000
+
+
+def css_saldos(df, saldos):
+    """Matriz de CSS das colunas de saldo (positivo, negativo ou zero)"""
+    css = pd.DataFrame('', index=df.index, columns=df.columns)
+    for coluna, (css_positivo, css_negativo, css_zero) in saldos.items():
+        if coluna not in df.columns:
+            continue
+        valores = pd.to_numeric(df[coluna], errors='coerce').astype('float64').to_numpy()
+        css[coluna] = np.select(
+            [valores > 0, valores < 0, valores == 0],
+            [css_positivo, css_negativo, css_zero],
+            default='',
+        )
+    return css
+
+
+def montar_css(df, saldos=None, rotulos=None, linhas=None):
+    """
+    Monta a matriz de CSS (mesmo formato de 'df') a partir das regras de saldos,
+    rótulos e linhas descritas no módulo.
+    """
+    css = css_saldos(df, saldos or {})
+
+    for coluna, mapa_css in (rotulos or {}).items():
+        if coluna in df.columns:
+            css[coluna] = df[coluna].astype(object).map(mapa_css).fillna('').to_numpy()
+
+    for mascara, css_linha in linhas or []:
+        selecionadas = np.asarray(mascara, dtype=bool)
+        css.loc[selecionadas, :] = css_linha
+
+    return css
+
+
+def aplicar_css(df, css, limite_linhas=LIMITE_LINHAS_ESTILO):
+    """
+    Retorna o Styler de 'df' com a matriz de CSS aplicada em uma única chamada,
+    ou o próprio 'df' sem estilo quando ele passa de 'limite_linhas' linhas.
+    """
+    if css is None or len(df) > limite_linhas:
+        return df
+    return df.style.apply(lambda _: css, axis=None)
+
+
+def estilizar(df, saldos=None, rotulos=None, linhas=None, formatos=None, limite_linhas=LIMITE_LINHAS_ESTILO):
+    """
+    Monta e aplica a matriz de CSS (e os formatos de exibição, se informados),
+    sem montá-la se a tabela passar do limite de linhas.
+    """
+    if len(df) > limite_linhas:
+        return df
+    styler = aplicar_css(df, montar_css(df, saldos, rotulos, linhas), limite_linhas)
+    return styler.format(formatos) if formatos else styler
@@ -0,0 +1,260 @@
+"""
+Leitores de planilha intercambiáveis.
+
+O ERP exporta os dados de bolsistas tanto em Excel quanto em CSV. Para cada
+formato há mais de um leitor possível; na primeira leitura de um formato os
+leitores disponíveis no servidor são cronometrados e o mais rápido é registrado
+em '.leitor_planilha.json', no diretório da planilha, para as leituras seguintes.
+O registro vale enquanto as versões instaladas dos leitores forem as mesmas
+(um novo contêiner com as mesmas dependências reaproveita a escolha).
+"""
+
+import csv
+import importlib.metadata
+import importlib.util
+import json
+import os
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from bolsistas.arquivos import gravar_atomico
+
+ARQUIVO_REGISTRO = '.leitor_planilha.json'
+PREFIXO_TEMPORARIO = '.tmp_leitor_'
+EXTENSOES_SUPORTADAS = ('.xlsx', '.csv')
+REPETICOES_BENCHMARK = 2
+
+
+# ===== LEITORES =====
+def ler_excel_openpyxl(caminho, colunas=None):
+    """Lê a primeira aba com openpyxl em modo somente leitura (streaming de linhas)"""
+    import openpyxl
+
+    pasta = openpyxl.load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        linhas = pasta.worksheets[0].iter_rows(values_only=True)
+        cabecalho = list(next(linhas, ()))
+        registros = [linha for linha in linhas if any(valor is not None for valor in linha)]
+    finally:
+        pasta.close()
+
+    df = pd.DataFrame.from_records(registros, columns=cabecalho)
+    if colunas is not None:
+        df = df[[coluna for coluna in colunas if coluna in df.columns]]
+    return df
+
+
+def ler_excel_calamine(caminho, colunas=None):
+    """Lê a primeira aba com o leitor calamine (Rust), quando instalado"""
+    usecols = None if colunas is None else (lambda coluna: coluna in colunas)
+    return pd.read_excel(caminho, engine='calamine', usecols=usecols)
+
+
+def ler_excel_pandas(caminho, colunas=None):
+    """Leitura padrão do pandas, usada quando nenhum outro leitor está disponível"""
+    usecols = None if colunas is None else (lambda coluna: coluna in colunas)
+    return pd.read_excel(caminho, usecols=usecols)
+
+
+def _detectar_delimitador(caminho, encoding):
+    with open(caminho, encoding=encoding) as arquivo:
+        primeira_linha = arquivo.readline()
+    return ';' if primeira_linha.count(';') > primeira_linha.count(',') else ','
+
+
+def _cabecalho_csv(caminho, delimitador, encoding):
+    with open(caminho, encoding=encoding, newline='') as arquivo:
+        cabecalho = next(csv.reader(arquivo, delimiter=delimitador), [])
+    return [coluna.lstrip('\ufeff') for coluna in cabecalho]
+
+
+def ler_csv_pyarrow(caminho, colunas=None, encoding='utf-8'):
+    """Lê o CSV com o leitor multi-thread do pyarrow"""
+    from pyarrow import csv as csv_arrow
+
+    delimitador = _detectar_delimitador(caminho, encoding)
+    incluidas = None
+    if colunas is not None:
+        # Como no leitor do pandas: colunas pedidas que o arquivo não tem são ignoradas
+        incluidas = [coluna for coluna in _cabecalho_csv(caminho, delimitador, encoding) if coluna in colunas]
+    tabela = csv_arrow.read_csv(
+        caminho,
+        read_options=csv_arrow.ReadOptions(use_threads=True, encoding=encoding),
+        parse_options=csv_arrow.ParseOptions(delimiter=delimitador),
+        convert_options=csv_arrow.ConvertOptions(include_columns=incluidas),
+    )
+    return tabela.to_pandas()
+
+
+def ler_csv_pandas(caminho, colunas=None, encoding='utf-8'):
+    """Leitura padrão do pandas para CSV"""
+    delimitador = _detectar_delimitador(caminho, encoding)
+    usecols = None if colunas is None else (lambda coluna: coluna in colunas)
+    return pd.read_csv(caminho, sep=delimitador, encoding=encoding, usecols=usecols)
+
+
+def _modulo_instalado(nome):
+    return importlib.util.find_spec(nome) is not None
+
+
+# Distribuição instalada de que depende cada leitor (as versões validam o registro)
+PACOTES_LEITORES = {
+    'calamine': 'python-calamine',
+    'openpyxl': 'openpyxl',
+    'pyarrow_csv': 'pyarrow',
+    'pandas': 'pandas',
+}
+
+# Leitores por extensão: nome -> (função de leitura, verificação de disponibilidade)
+LEITORES = {
+    '.xlsx': {
+        'calamine': (ler_excel_calamine, lambda: _modulo_instalado('python_calamine')),
+        'openpyxl': (ler_excel_openpyxl, lambda: _modulo_instalado('openpyxl')),
+        'pandas': (ler_excel_pandas, lambda: True),
+    },
+    '.csv': {
+        'pyarrow_csv': (ler_csv_pyarrow, lambda: _modulo_instalado('pyarrow')),
+        'pandas': (ler_csv_pandas, lambda: True),
+    },
+}
+
+
+# ===== SELEÇÃO DO LEITOR =====
+def _extensao(caminho):
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao not in LEITORES:
+        raise ValueError(f"Formato de planilha não suportado: '{extensao}'")
+    return extensao
+
+
+def leitores_disponiveis(caminho):
+    """Retorna os nomes dos leitores instalados para o formato do arquivo"""
+    return [nome for nome, (_, disponivel) in LEITORES[_extensao(caminho)].items() if disponivel()]
+
+
+def versoes_leitores(extensao):
+    """Versões instaladas dos pacotes dos leitores do formato (None se ausente)"""
+    versoes = {}
+    for nome in LEITORES[extensao]:
+        try:
+            versoes[nome] = importlib.metadata.version(PACOTES_LEITORES[nome])
+        except importlib.metadata.PackageNotFoundError:
+            versoes[nome] = None
+    return versoes
+
+
+def _caminho_registro(caminho):
+    return os.path.join(os.path.dirname(os.path.abspath(caminho)), ARQUIVO_REGISTRO)
+
+
+def ler_registro(caminho):
+    """Retorna o registro de leitores escolhidos (por extensão) do diretório da planilha"""
+    try:
+        with open(_caminho_registro(caminho), encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return {}
+
+
+def _gravar_registro(caminho, registro):
+    # Gravação atômica: outro processo nunca lê um JSON pela metade
+    def escrever(temporario):
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(registro, arquivo, ensure_ascii=False, indent=2)
+
+    try:
+        gravar_atomico(_caminho_registro(caminho), escrever, PREFIXO_TEMPORARIO)
+    except OSError:
+        pass  # Sem permissão de escrita: o benchmark será refeito na próxima carga
+
+
+def benchmark_leitores(caminho, colunas=None, repeticoes=REPETICOES_BENCHMARK):
+    """
+    Cronometra os leitores disponíveis para o arquivo e registra o mais rápido.
+    Retorna o nome do leitor escolhido e o DataFrame lido por ele, só com
+    'colunas' quando informadas. Os leitores são cronometrados lendo o
+    arquivo inteiro: o registro vale para todas as leituras do formato,
+    qualquer que seja a projeção de colunas de cada uma.
+    """
+    extensao = _extensao(caminho)
+    tempos = {}
+    resultados = {}
+
+    for nome in leitores_disponiveis(caminho):
+        funcao = LEITORES[extensao][nome][0]
+        try:
+            melhor_tempo = None
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                df = funcao(caminho)
+                decorrido = time.perf_counter() - inicio
+                melhor_tempo = decorrido if melhor_tempo is None else min(melhor_tempo, decorrido)
+        except Exception:
+            continue  # Leitor instalado mas incompatível com esta versão/arquivo
+
+        tempos[nome] = round(melhor_tempo, 6)
+        resultados[nome] = df
+
+    if not tempos:
+        raise RuntimeError(f"Nenhum leitor conseguiu abrir '{caminho}'")
+
+    escolhido = min(tempos, key=tempos.get)
+
+    registro = ler_registro(caminho)
+    registro[extensao] = {
+        'leitor': escolhido,
+        'tempos_segundos': tempos,
+        'versoes': versoes_leitores(extensao),
+        'medido_em': datetime.now().isoformat(timespec='seconds'),
+    }
+    _gravar_registro(caminho, registro)
+
+    df = resultados[escolhido]
+    if colunas is not None:
+        df = df[[coluna for coluna in df.columns if coluna in colunas]]
+    return escolhido, df
+
+
+def leitor_escolhido(caminho):
+    """Retorna o leitor registrado para o formato do arquivo, ou None se ainda não houver benchmark"""
+    extensao = _extensao(caminho)
+    entrada = ler_registro(caminho).get(extensao, {})
+    nome = entrada.get('leitor')
+    if entrada.get('versoes') != versoes_leitores(extensao):
+        return None  # Leitores atualizados ou trocados desde o benchmark
+    if nome in LEITORES[extensao] and LEITORES[extensao][nome][1]():
+        return nome
+    return None
+
+
+def ler_planilha(caminho, colunas=None, leitor=None):
+    """
+    Lê a planilha (Excel ou CSV) com o leitor informado ou, se omitido, com o
+    leitor mais rápido registrado para o formato, executando o benchmark na
+    primeira leitura.
+    """
+    extensao = _extensao(caminho)
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(f"Arquivo '{caminho}' não encontrado")
+
+    leitor = leitor or leitor_escolhido(caminho)
+    if leitor is None:
+        _, df = benchmark_leitores(caminho, colunas)
+        return df
+
+    return LEITORES[extensao][leitor][0](caminho, colunas)
+
+
+def localizar_planilha(nome_base='dados_bolsistas'):
+    """
+    Retorna o arquivo mais recente entre as exportações suportadas
+    (ex.: 'dados_bolsistas.xlsx' ou 'dados_bolsistas.csv'). Se nenhuma existir,
+    retorna o caminho do Excel para que a leitura gere o erro usual.
+    """
+    candidatos = [nome_base + extensao for extensao in EXTENSOES_SUPORTADAS]
+    existentes = [caminho for caminho in candidatos if os.path.exists(caminho)]
+    if not existentes:
+        return candidatos[0]
+    return max(existentes, key=os.path.getmtime)
@@ -0,0 +1,194 @@
+"""
+Projeção Monte Carlo do risco de não conformidade.
+
+Em vez de um único número por curso, cada tentativa sorteia quantos
+formandos de cada programa saem (binomial com a taxa de formatura), quantos
+dos demais evadem (binomial com a taxa de evasão) e quantos alunos entram
+(Poisson com média ingresso × total atual), usando os mesmos parâmetros por
+programa do motor de cenários (bolsistas/cenarios.py). Os saldos de cada
+tentativa seguem as regras do motor, e o resultado é a probabilidade de
+cada curso, e de cada filial no total, ficar em 'Não Atende' (saldo < 0).
+
+Os sorteios são vetorizados por bloco de tentativas (tentativas × células ×
+programas). Com mais de um núcleo e a partir de LIMITE_SORTEIOS_PARALELO
+sorteios, os blocos são distribuídos num pool de processos do módulo,
+criado no primeiro uso, reaproveitado pelas simulações seguintes e
+encerrado na saída do interpretador; abaixo disso, iniciar os processos
+custaria mais do que sortear no próprio processo. Cada bloco tem sua
+semente derivada (SeedSequence.spawn) da semente pedida, e o número de
+blocos depende só da quantidade de tentativas e de células: o resultado é
+o mesmo com qualquer número de processos.
+
+risco_conformidade guarda o resultado no cache em disco por (versão dos
+dados, parâmetros, tentativas, semente) e coalesce pedidos simultâneos.
+"""
+
+import atexit
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from bolsistas import cache_disco
+from bolsistas.cenarios import PARAMETROS, PROGRAMAS, saldos_projetados, vetor_cenario
+from bolsistas.coalescencia import executar_uma_vez
+
+TENTATIVAS_PADRAO = 10_000
+TAMANHO_BLOCO = 5_000
+LIMITE_SORTEIOS_BLOCO = 2_000_000  # tentativas × células × programas por bloco (memória de cada processo)
+LIMITE_SORTEIOS_PARALELO = 5_000_000  # abaixo disso, a simulação roda no próprio processo
+SEMENTE_PADRAO = 0
+VERSAO_SIMULACAO = 1  # versão do artefato no cache em disco: incrementar ao mudar a simulação
+
+COLUNAS_PROBABILIDADE = ('PROB_NAO_ATENDE_PROUNI', 'PROB_NAO_ATENDE_FILANTROPIA', 'PROB_NAO_ATENDE')
+
+_trava_pool = threading.Lock()
+_pool = None  # pool de processos compartilhado pelas simulações do processo
+
+
+def _modelo(base):
+    """Arrays da base usados nos sorteios (sem a trava e o cache, para irem aos processos)"""
+    formandos = base['formandos']
+    contagens = np.rint(formandos).astype(np.int64)
+    # Meias bolsas ficam com o restante, para a soma dos assistenciais continuar inteira
+    contagens[:, 3] = np.rint(formandos[:, 2] + formandos[:, 3]).astype(np.int64) - contagens[:, 2]
+
+    codigos = base['celulas'].get_level_values('CODFILIAL')
+    filiais = sorted(codigos.dropna().unique())
+    sem_filial = np.asarray(codigos.isna(), dtype=bool)
+    matriz_filiais = np.column_stack(
+        [np.asarray(codigos == filial, dtype=bool) | sem_filial for filial in filiais]
+    ).astype('float64') if filiais else np.zeros((len(codigos), 0))
+    return {
+        'totais': base['totais'].astype(np.int64),
+        'formandos': contagens,
+        'saldos': base['saldos'],
+        'matriz_filiais': matriz_filiais,
+        'filiais': filiais,
+    }
+
+
+def _simular_bloco(tarefa):
+    """Contagens de 'Não Atende' e somas de saldos de um bloco de tentativas"""
+    modelo, taxas, tentativas, semente = tarefa
+    gerador = np.random.default_rng(semente)
+    formatura, evasao, ingresso = taxas
+    forma = (tentativas,) + modelo['totais'].shape
+
+    saindo = np.minimum(gerador.binomial(modelo['formandos'], formatura, size=forma), modelo['totais'])
+    restantes = modelo['totais'] - saindo
+    evadidos = gerador.binomial(restantes, evasao, size=forma)
+    ingressantes = gerador.poisson(ingresso * modelo['totais'], size=forma)
+    totais = (restantes - evadidos + ingressantes).astype('float64')
+
+    saldo_prouni, saldo_filantropia = saldos_projetados(modelo, totais)
+    nao_prouni = saldo_prouni < 0
+    nao_filantropia = saldo_filantropia < 0
+    filial_prouni = saldo_prouni @ modelo['matriz_filiais'] < 0
+    filial_filantropia = saldo_filantropia @ modelo['matriz_filiais'] < 0
+    return {
+        'cursos': np.stack([nao_prouni.sum(0), nao_filantropia.sum(0), (nao_prouni | nao_filantropia).sum(0)]),
+        'filiais': np.stack([filial_prouni.sum(0), filial_filantropia.sum(0),
+                             (filial_prouni | filial_filantropia).sum(0)]),
+        'saldos': np.stack([saldo_prouni.sum(0), saldo_filantropia.sum(0)]),
+    }
+
+
+def _contexto_processos():
+    # forkserver: o servidor do Streamlit tem threads, e fork a partir dele não é seguro
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+
+
+def _pool_processos(processos):
+    """Pool do módulo, criado no primeiro uso com 'processos' processos e reaproveitado depois"""
+    global _pool
+    with _trava_pool:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(processos, mp_context=_contexto_processos())
+        return _pool
+
+
+def _descartar_pool(pool, esperar=False):
+    """Encerra o pool (quebrado ou na saída); o próximo uso cria outro"""
+    global _pool
+    with _trava_pool:
+        if _pool is pool:
+            _pool = None
+    if pool is not None:
+        pool.shutdown(wait=esperar, cancel_futures=True)
+
+
+@atexit.register
+def _encerrar_pool():
+    _descartar_pool(_pool, esperar=True)
+
+
+def simular_conformidade(base, cenario, tentativas=TENTATIVAS_PADRAO, semente=SEMENTE_PADRAO, processos=None):
+    """
+    Simula 'tentativas' semestres do cenário e retorna (por_curso,
+    por_filial): a probabilidade de 'Não Atende' no PROUNI, na filantropia e
+    em qualquer um dos dois, mais os saldos médios por curso. Por padrão
+    usa o pool do módulo (um processo por núcleo) só com mais de um núcleo e
+    a partir de LIMITE_SORTEIOS_PARALELO sorteios; 'processos' força a
+    escolha (com 1, roda no próprio processo).
+    """
+    modelo = _modelo(base)
+    taxas = np.asarray(vetor_cenario(cenario)).reshape(len(PARAMETROS), len(PROGRAMAS))
+    tamanho_bloco = max(1, min(TAMANHO_BLOCO, LIMITE_SORTEIOS_BLOCO // max(modelo['totais'].size, 1)))
+    tamanhos = [tamanho_bloco] * (tentativas // tamanho_bloco)
+    if tentativas % tamanho_bloco:
+        tamanhos.append(tentativas % tamanho_bloco)
+    sementes = np.random.SeedSequence(semente).spawn(len(tamanhos))
+    tarefas = [(modelo, taxas, tamanho, semente_bloco) for tamanho, semente_bloco in zip(tamanhos, sementes)]
+
+    if processos is None:
+        sorteios = tentativas * modelo['totais'].size
+        processos = (os.cpu_count() or 1) if sorteios >= LIMITE_SORTEIOS_PARALELO else 1
+    parciais = None
+    if min(processos, len(tarefas)) > 1:
+        pool = None
+        try:
+            pool = _pool_processos(processos)
+            parciais = list(pool.map(_simular_bloco, tarefas))
+        except (OSError, BrokenProcessPool):
+            _descartar_pool(pool)
+            parciais = None  # sem processos disponíveis: simula aqui mesmo
+    if parciais is None:
+        parciais = [_simular_bloco(tarefa) for tarefa in tarefas]
+
+    cursos = sum(parcial['cursos'] for parcial in parciais) / tentativas
+    filiais = sum(parcial['filiais'] for parcial in parciais) / tentativas
+    saldos = sum(parcial['saldos'] for parcial in parciais) / tentativas
+
+    por_curso = base['celulas'].to_frame(index=False)
+    for i, coluna in enumerate(COLUNAS_PROBABILIDADE):
+        por_curso[coluna] = cursos[i]
+    por_curso['SALDO_PROUNI_MEDIO'] = saldos[0]
+    por_curso['SALDO_FILANTROPIA_MEDIO'] = saldos[1]
+
+    por_filial = pd.DataFrame({'CODFILIAL': pd.Series(modelo['filiais'], dtype=por_curso['CODFILIAL'].dtype)})
+    for i, coluna in enumerate(COLUNAS_PROBABILIDADE):
+        por_filial[coluna] = filiais[i]
+    return por_curso, por_filial
+
+
+def risco_conformidade(base, versao, cenario, tentativas=TENTATIVAS_PADRAO, semente=SEMENTE_PADRAO):
+    """
+    simular_conformidade com cache em disco por (versão dos dados,
+    parâmetros, tentativas, semente); pedidos iguais e simultâneos esperam
+    por uma única simulação.
+    """
+    parametros = json.dumps([vetor_cenario(cenario), tentativas, semente])
+    chave = hashlib.sha256(parametros.encode('utf-8')).hexdigest()[:16]
+    return executar_uma_vez(
+        ('monte_carlo', versao, chave), cache_disco.memoizar_tabelas,
+        f'monte_carlo:{chave}', versao, lambda: simular_conformidade(base, cenario, tentativas, semente),
+        versao_artefato=VERSAO_SIMULACAO,
+    )
@@ -0,0 +1,254 @@
+"""
+Redistribuição de bolsas para levar todos os cursos a 'Atende'.
+
+A partir dos saldos PROUNI e filantropia de cada (filial, curso), calcula o
+menor número de bolsas novas, complementado por remanejamentos, que zera
+todos os déficits:
+
+- uma bolsa nova (PROUNI ou assistencial integral) é concedida a um aluno
+  pagante do curso; o efeito nos saldos vem das regras de
+  bolsistas/regras_cebas.py;
+- um remanejamento leva uma bolsa PROUNI ou assistencial integral de um
+  curso com sobra nos dois saldos para um curso em déficit, na mesma filial
+  (ou entre filiais, se permitido). O curso que cede continua em 'Atende' e
+  cede no máximo FRACAO_MAXIMA_CESSAO das suas bolsas de cada programa.
+
+Os déficits de PROUNI só se resolvem com bolsas PROUNI; os de filantropia,
+com qualquer bolsa integral. Quantas bolsas remanejar é um programa linear
+pequeno por filial (as cessões de cada curso doador contra a demanda total
+da filial), resolvido com um simplex denso em NumPy; as cessões são
+arredondadas para baixo, o que mantém os doadores em 'Atende', e o restante
+da demanda vira bolsas novas.
+
+Cada bolsa vai para um aluno pagante do curso, então um curso com menos
+pagantes do que bolsas necessárias não chega a 'Atende': o plano o marca
+como INVIAVEL, atende só a parte possível e informa em BOLSAS_FALTANTES
+quantas bolsas ainda faltariam.
+"""
+
+import numpy as np
+import pandas as pd
+
+from bolsistas.regras_cebas import saldos_cebas
+
+FRACAO_MAXIMA_CESSAO = 0.2
+TOLERANCIA = 1e-9
+LIMITE_ITERACOES = 10_000
+
+PROGRAMAS_REMANEJAVEIS = ('PROUNI', 'ASSISTENCIAL_100')
+COLUNAS_SITUACAO = ('SALDO_PROUNI', 'SALDO_FILANTROPIA', 'TOTAL_PROUNI', 'TOTAL_ASSISTENCIAL_100', 'ALUNOS_PAGANTES')
+
+
+def _efeitos():
+    """Variação de (saldo PROUNI, saldo filantropia) por bolsa PROUNI e por bolsa assistencial integral"""
+    prouni = np.array(saldos_cebas(1, 0, 0, -1))
+    assistencial = np.array(saldos_cebas(0, 1, 0, -1))
+    return prouni, assistencial
+
+
+def _simplex(custos, restricoes, limites):
+    """
+    Maximiza custos · x sujeito a restricoes · x <= limites e x >= 0, com
+    limites >= 0 (a origem é viável). Tabela condensada e regra de Bland,
+    que evita ciclos nos pivôs degenerados.
+    """
+    linhas, variaveis = restricoes.shape
+    tabela = np.zeros((linhas + 1, variaveis + 1))
+    tabela[:linhas, :variaveis] = restricoes
+    tabela[:linhas, variaveis] = limites
+    tabela[linhas, :variaveis] = -custos
+    basicas = np.arange(variaveis, variaveis + linhas)
+    nao_basicas = np.arange(variaveis)
+
+    for _ in range(LIMITE_ITERACOES):
+        candidatas = np.flatnonzero(tabela[linhas, :variaveis] < -TOLERANCIA)
+        if not len(candidatas):
+            break
+        entra = candidatas[np.argmin(nao_basicas[candidatas])]
+        coluna = tabela[:linhas, entra]
+        positivas = np.flatnonzero(coluna > TOLERANCIA)
+        if not len(positivas):
+            raise ValueError("Programa linear ilimitado")
+        razoes = tabela[positivas, variaveis] / coluna[positivas]
+        empatadas = positivas[razoes <= razoes.min() + TOLERANCIA]
+        sai = empatadas[np.argmin(basicas[empatadas])]
+
+        pivo = tabela[sai, entra]
+        linha_pivo = tabela[sai].copy()
+        coluna_pivo = tabela[:, entra].copy()
+        tabela -= np.outer(coluna_pivo, linha_pivo / pivo)
+        tabela[sai] = linha_pivo / pivo
+        tabela[:, entra] = -coluna_pivo / pivo
+        tabela[sai, entra] = 1 / pivo
+        basicas[sai], nao_basicas[entra] = nao_basicas[entra], basicas[sai]
+    else:
+        raise RuntimeError("Simplex não convergiu")
+
+    solucao = np.zeros(variaveis + linhas)
+    solucao[basicas] = tabela[:linhas, variaveis]
+    return solucao[:variaveis]
+
+
+def _cessoes(demanda_prouni, demanda_qualquer, saldos, capacidades, efeitos):
+    """
+    Bolsas PROUNI e assistenciais que cada doador cede (inteiras) para
+    atender o máximo da demanda da filial: 'demanda_prouni' só aceita bolsas
+    PROUNI, 'demanda_qualquer' aceita as duas.
+    """
+    doadores = len(saldos)
+    if not doadores or demanda_prouni + demanda_qualquer == 0:
+        return np.zeros((doadores, 2), dtype=np.int64)
+
+    # Variáveis: [usadas PROUNI, usadas qualquer, cedidas PROUNI por doador, cedidas assistenciais por doador]
+    variaveis = 2 + 2 * doadores
+    cedidas_prouni = np.arange(2, 2 + doadores)
+    cedidas_assistenciais = cedidas_prouni + doadores
+    restricoes = np.zeros((4 + 4 * doadores, variaveis))
+    limites = np.zeros(len(restricoes))
+
+    restricoes[0, 0], limites[0] = 1, demanda_prouni
+    restricoes[1, 1], limites[1] = 1, demanda_qualquer
+    restricoes[2, 0], restricoes[2, cedidas_prouni] = 1, -1
+    restricoes[3, :2], restricoes[3, 2:] = 1, -1
+    doador = np.arange(doadores)
+    for i, (efeito_prouni, efeito_assistencial) in enumerate(zip(*efeitos)):
+        # Os dois saldos do doador continuam >= 0
+        linhas = 4 + i * doadores + doador
+        restricoes[linhas, cedidas_prouni] = efeito_prouni
+        restricoes[linhas, cedidas_assistenciais] = efeito_assistencial
+        limites[linhas] = saldos[:, i]
+    linhas = 4 + 2 * doadores + doador
+    restricoes[linhas, cedidas_prouni], limites[linhas] = 1, capacidades[:, 0]
+    restricoes[linhas + doadores, cedidas_assistenciais], limites[linhas + doadores] = 1, capacidades[:, 1]
+
+    custos = np.zeros(variaveis)
+    custos[:2] = 1
+    solucao = _simplex(custos, restricoes, np.maximum(limites, 0))
+    cessoes = np.floor(np.column_stack([solucao[cedidas_prouni], solucao[cedidas_assistenciais]]) + TOLERANCIA)
+    return cessoes.astype(np.int64)
+
+
+def _aparar(cessoes, quantidade, coluna):
+    """Reduz as cessões de uma coluna, dos últimos doadores para os primeiros, até somarem 'quantidade'"""
+    excesso = cessoes[:, coluna].sum() - quantidade
+    for i in range(len(cessoes) - 1, -1, -1):
+        if excesso <= 0:
+            break
+        corte = min(excesso, cessoes[i, coluna])
+        cessoes[i, coluna] -= corte
+        excesso -= corte
+
+
+def _distribuir(ofertas, demandas):
+    """
+    Leva as ofertas [(origem, quantidade)] às demandas [(destino,
+    quantidade)], na ordem das listas. Retorna os pares (origem, destino,
+    quantidade) e as ofertas que sobraram.
+    """
+    pares = []
+    ofertas = [list(oferta) for oferta in ofertas]
+    i = 0
+    for destino, demanda in demandas:
+        while demanda > 0 and i < len(ofertas):
+            quantidade = min(demanda, ofertas[i][1])
+            pares.append((ofertas[i][0], destino, quantidade))
+            ofertas[i][1] -= quantidade
+            demanda -= quantidade
+            if not ofertas[i][1]:
+                i += 1
+    return pares, [tuple(oferta) for oferta in ofertas[i:] if oferta[1]]
+
+
+def otimizar_redistribuicao(situacao, entre_filiais=False, fracao_maxima_cessao=FRACAO_MAXIMA_CESSAO,
+                            remanejar=True):
+    """
+    Plano de bolsas novas e remanejamentos que leva todos os cursos a
+    'Atende'. 'situacao' é indexado por (CODFILIAL, NOMECURSO), com as
+    colunas de COLUNAS_SITUACAO (como a saída de cenarios.projetar_cenario).
+
+    Retorna (plano, remanejamentos): o plano tem, por curso, as bolsas novas
+    de cada programa, as recebidas e cedidas e os saldos finais; os
+    remanejamentos têm origem, destino, programa e quantidade. Os cursos
+    com mais bolsas necessárias do que pagantes vêm com INVIAVEL e as bolsas
+    que não cabem em BOLSAS_FALTANTES; os saldos finais deles continuam
+    negativos.
+    """
+    efeito_prouni, efeito_assistencial = _efeitos()
+    saldos = situacao[['SALDO_PROUNI', 'SALDO_FILANTROPIA']].to_numpy(dtype='float64', na_value=0)
+    estoques = situacao[['TOTAL_PROUNI', 'TOTAL_ASSISTENCIAL_100']].to_numpy(dtype='float64', na_value=0)
+    pagantes = situacao['ALUNOS_PAGANTES'].to_numpy(dtype='float64', na_value=0)
+    celulas = len(situacao)
+
+    # Demanda de cada curso em déficit: bolsas PROUNI para o saldo PROUNI e bolsas integrais para a filantropia
+    faltas = np.maximum(-saldos, 0)
+    demanda_prouni = np.ceil(faltas[:, 0] / efeito_prouni[0] - TOLERANCIA)
+    demanda_total = np.maximum(np.ceil(faltas[:, 1] / efeito_assistencial[1] - TOLERANCIA), demanda_prouni)
+    # Cada bolsa vai para um aluno pagante do curso: o que passar disso não tem como ser atendido
+    faltantes = np.maximum(demanda_total - np.floor(np.maximum(pagantes, 0) + TOLERANCIA), 0)
+    demanda_total = demanda_total - faltantes
+    demanda_prouni = np.minimum(demanda_prouni, demanda_total).astype(np.int64)
+    demanda_qualquer = (demanda_total - demanda_prouni).astype(np.int64)
+
+    doadores = (saldos >= 0).all(axis=1) & remanejar
+    capacidades = np.floor(estoques * fracao_maxima_cessao + TOLERANCIA).astype(np.int64)
+
+    codigos = situacao.index.get_level_values('CODFILIAL')
+    grupos = np.zeros(celulas, dtype=np.int64) if entre_filiais else pd.factorize(
+        pd.Series(codigos, dtype=object), use_na_sentinel=False)[0]
+
+    cedidas = np.zeros((celulas, 2), dtype=np.int64)
+    recebidas = np.zeros((celulas, 2), dtype=np.int64)  # por programa da bolsa recebida
+    novas = np.column_stack([demanda_prouni, demanda_qualquer])  # por demanda atendida
+    remanejamentos = []
+    for grupo in np.unique(grupos):
+        no_grupo = grupos == grupo
+        origem = np.flatnonzero(no_grupo & doadores)
+        destino = np.flatnonzero(no_grupo & (demanda_total > 0))
+        total_prouni = int(demanda_prouni[destino].sum())
+        total_qualquer = int(demanda_qualquer[destino].sum())
+        cessoes = _cessoes(total_prouni, total_qualquer, saldos[origem], capacidades[origem],
+                           (efeito_prouni, efeito_assistencial))
+
+        # Só o que a demanda usa: PROUNI primeiro na demanda exclusiva, a sobra na demanda livre
+        _aparar(cessoes, min(int(cessoes[:, 0].sum()), total_prouni + total_qualquer), 0)
+        _aparar(cessoes, total_qualquer - max(int(cessoes[:, 0].sum()) - total_prouni, 0), 1)
+        cedidas[origem] = cessoes
+
+        pares_exclusivos, sobras_prouni = _distribuir(
+            [(('PROUNI', i), quantidade) for i, quantidade in zip(origem, cessoes[:, 0]) if quantidade],
+            [(i, demanda_prouni[i]) for i in destino],
+        )
+        pares_livres, _ = _distribuir(
+            sobras_prouni + [(('ASSISTENCIAL_100', i), quantidade)
+                             for i, quantidade in zip(origem, cessoes[:, 1]) if quantidade],
+            [(i, demanda_qualquer[i]) for i in destino],
+        )
+        for demanda, pares in enumerate((pares_exclusivos, pares_livres)):
+            for (programa, i), j, quantidade in pares:
+                recebidas[j, PROGRAMAS_REMANEJAVEIS.index(programa)] += quantidade
+                novas[j, demanda] -= quantidade
+                remanejamentos.append((i, j, programa, quantidade))
+
+    novas_prouni, novas_assistenciais = novas[:, 0], novas[:, 1]
+    liquidas = recebidas - cedidas + novas
+    finais = saldos + np.outer(liquidas[:, 0], efeito_prouni) + np.outer(liquidas[:, 1], efeito_assistencial)
+
+    plano = situacao.index.to_frame(index=False)
+    plano['SALDO_PROUNI'] = saldos[:, 0]
+    plano['SALDO_FILANTROPIA'] = saldos[:, 1]
+    plano['NOVAS_PROUNI'] = novas_prouni
+    plano['NOVAS_ASSISTENCIAIS'] = novas_assistenciais
+    plano['RECEBIDAS'] = recebidas.sum(axis=1)
+    plano['CEDIDAS'] = cedidas.sum(axis=1)
+    plano['SALDO_PROUNI_FINAL'] = finais[:, 0]
+    plano['SALDO_FILANTROPIA_FINAL'] = finais[:, 1]
+    plano['INVIAVEL'] = faltantes > 0
+    plano['BOLSAS_FALTANTES'] = faltantes.astype(np.int64)
+
+    cursos = situacao.index.get_level_values('NOMECURSO')
+    tabela_remanejamentos = pd.DataFrame(
+        [(codigos[i], cursos[i], codigos[j], cursos[j], programa, int(quantidade))
+         for i, j, programa, quantidade in remanejamentos],
+        columns=['FILIAL_ORIGEM', 'ORIGEM', 'FILIAL_DESTINO', 'DESTINO', 'PROGRAMA', 'QUANTIDADE'],
+    )
+    return plano, tabela_remanejamentos
@@ -0,0 +1,72 @@
+"""
+Regras de conformidade CEBAS: exigência de bolsas a partir dos alunos pagantes.
+
+Os saldos FALTAM_SOBRAM_PROUNI e FALTAM_SOBRAM_FILANTROPIA do ERP são
+calculados aqui a partir das contagens de cada curso, para todas as linhas
+de uma vez, sem depender da exportação do ERP (dados de cenários, históricos
+ou sem essas colunas):
+
+- PROUNI: bolsas PROUNI menos PROPORCAO_PROUNI × alunos pagantes;
+- filantropia: bolsas integrais (PROUNI e assistencial 100%, meia bolsa
+  valendo PESO_MEIA_BOLSA) menos PROPORCAO_FILANTROPIA × alunos pagantes
+  equivalentes; a parte não coberta da meia bolsa conta como pagante.
+
+As bolsas institucionais não contam para a exigência (PESO_INSTITUCIONAL).
+Com os valores padrão e o arredondamento do ERP (metades para longe do zero),
+os saldos reproduzem as colunas exportadas pelo ERP ('1 a cada 9' e '1 a cada
+5' pagantes correspondem a 1 bolsa em cada 10 e em cada 6 vagas).
+"""
+
+import numpy as np
+import pandas as pd
+
+PROPORCAO_PROUNI = 1 / 10
+PROPORCAO_FILANTROPIA = 1 / 6
+PESO_MEIA_BOLSA = 0.5
+PESO_INSTITUCIONAL = 0.0
+
+COLUNAS_REGRAS = (
+    'TOTAL_PROUNI', 'TOTAL_ASSISTENCIAL_100', 'TOTAL_ASSISTENCIAL_50', 'TOTAL_INSTITUCIONAL', 'ALUNOS_PAGANTES',
+)
+COLUNAS_SALDOS = ('FALTAM_SOBRAM_PROUNI', 'FALTAM_SOBRAM_FILANTROPIA')
+
+
+def saldos_cebas(prouni, assistencial_100, assistencial_50, pagantes, institucional=0,
+                 proporcao_prouni=PROPORCAO_PROUNI, proporcao_filantropia=PROPORCAO_FILANTROPIA,
+                 peso_meia_bolsa=PESO_MEIA_BOLSA, peso_institucional=PESO_INSTITUCIONAL):
+    """
+    Saldos PROUNI e filantropia, sem arredondar, para arrays de qualquer
+    forma (broadcast). As regras são lineares: aplicadas às variações das
+    contagens, dão a variação dos saldos.
+    """
+    saldo_prouni = prouni - proporcao_prouni * pagantes
+    bolsas = prouni + assistencial_100 + peso_meia_bolsa * assistencial_50 + peso_institucional * institucional
+    pagantes_equivalentes = pagantes + (1 - peso_meia_bolsa) * assistencial_50
+    saldo_filantropia = bolsas - proporcao_filantropia * pagantes_equivalentes
+    return saldo_prouni, saldo_filantropia
+
+
+def arredondar_saldo(valores):
+    """Arredondamento do ERP: metades para longe do zero (np.round arredonda para o par)"""
+    return np.sign(valores) * np.floor(np.abs(valores) + 0.5)
+
+
+def calcular_saldos(df, **regras):
+    """
+    DataFrame (mesmo índice de df) com FALTAM_SOBRAM_PROUNI e
+    FALTAM_SOBRAM_FILANTROPIA calculados pelas regras, arredondados como no
+    ERP. Contagens ausentes ou nulas valem 0; 'regras' substitui as
+    proporções e pesos padrão de saldos_cebas.
+    """
+    contagens = {
+        coluna: (df[coluna].to_numpy(dtype='float64', na_value=0) if coluna in df.columns else np.zeros(len(df)))
+        for coluna in COLUNAS_REGRAS
+    }
+    saldo_prouni, saldo_filantropia = saldos_cebas(
+        contagens['TOTAL_PROUNI'], contagens['TOTAL_ASSISTENCIAL_100'], contagens['TOTAL_ASSISTENCIAL_50'],
+        contagens['ALUNOS_PAGANTES'], contagens['TOTAL_INSTITUCIONAL'], **regras,
+    )
+    return pd.DataFrame({
+        'FALTAM_SOBRAM_PROUNI': arredondar_saldo(saldo_prouni),
+        'FALTAM_SOBRAM_FILANTROPIA': arredondar_saldo(saldo_filantropia),
+    }, index=df.index).astype('Int32')
@@ -0,0 +1,210 @@
+"""
+Snapshot colunar da planilha de bolsistas.
+
+A planilha exportada pelo ERP é convertida uma única vez para Parquet, num
+arquivo salvo ao lado dela. As cargas seguintes leem o Parquet e só voltam a
+processar a planilha quando o conteúdo dela realmente muda (tamanho, data de
+modificação e SHA-256 são comparados com os metadados do snapshot).
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from bolsistas.arquivos import gravar_atomico
+from bolsistas.leitores import ler_planilha
+from bolsistas.visoes import projetar_colunas
+
+ARQUIVO_PADRAO = 'dados_bolsistas.xlsx'
+SUFIXO_SNAPSHOT = '.snapshot.parquet'
+SUFIXO_METADADOS = '.snapshot.json'
+VERSAO_FORMATO = 1
+TAMANHO_BLOCO_HASH = 1024 * 1024
+PREFIXO_TEMPORARIO = '.tmp_snapshot_'
+
+_assinaturas = {}  # caminho absoluto da planilha -> última assinatura calculada no processo
+
+
+def caminhos_snapshot(caminho_planilha):
+    """Retorna os caminhos do arquivo Parquet e dos metadados do snapshot"""
+    base, _ = os.path.splitext(caminho_planilha)
+    return base + SUFIXO_SNAPSHOT, base + SUFIXO_METADADOS
+
+
+def calcular_sha256(caminho):
+    """Calcula o SHA-256 do arquivo lendo-o em blocos"""
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO_HASH), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def assinatura_planilha(caminho_planilha, metadados=None):
+    """
+    Retorna tamanho, data de modificação e SHA-256 da planilha.
+    Quando tamanho e data coincidem com os metadados, o hash salvo é reaproveitado
+    para evitar ler o arquivo inteiro a cada carga.
+    """
+    info = os.stat(caminho_planilha)
+    assinatura = {'tamanho': info.st_size, 'mtime_ns': info.st_mtime_ns}
+
+    if (metadados
+            and metadados.get('tamanho') == assinatura['tamanho']
+            and metadados.get('mtime_ns') == assinatura['mtime_ns']
+            and metadados.get('sha256')):
+        assinatura['sha256'] = metadados['sha256']
+    else:
+        assinatura['sha256'] = calcular_sha256(caminho_planilha)
+
+    return assinatura
+
+
+def versao_planilha(caminho_planilha=ARQUIVO_PADRAO):
+    """
+    Retorna o SHA-256 do conteúdo da planilha, usado como identificador da
+    versão dos dados (sem reler o arquivo se tamanho e data não mudaram).
+    A última assinatura de cada planilha fica guardada no processo: os
+    metadados do snapshot só são renovados quando ele é regravado, e depois
+    de um 'touch' ou de uma cópia com o mesmo conteúdo eles não bateriam mais
+    com a data do arquivo, obrigando a recalcular o hash a cada chamada.
+    """
+    caminho = os.path.abspath(caminho_planilha)
+    info = os.stat(caminho)
+    conhecida = _assinaturas.get(caminho)
+    if conhecida and conhecida['tamanho'] == info.st_size and conhecida['mtime_ns'] == info.st_mtime_ns:
+        return conhecida['sha256']
+    _, caminho_metadados = caminhos_snapshot(caminho_planilha)
+    assinatura = assinatura_planilha(caminho_planilha, _ler_metadados(caminho_metadados))
+    _assinaturas[caminho] = assinatura
+    return assinatura['sha256']
+
+
+def _ler_metadados(caminho_metadados):
+    try:
+        with open(caminho_metadados, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_metadados(caminho_metadados, metadados):
+    def escrever(caminho):
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump(metadados, arquivo, ensure_ascii=False, indent=2)
+
+    gravar_atomico(caminho_metadados, escrever, PREFIXO_TEMPORARIO)
+
+
+def _preparar_para_parquet(df):
+    """
+    Converte para texto as colunas que misturam números e textos (ex.: CODFILIAL
+    com '4' e '4 Total'), que o Parquet não consegue armazenar como estão.
+    """
+    df_preparado = df
+    colunas_mistas = []
+
+    for coluna in df.columns:
+        if df[coluna].dtype != object:
+            continue
+        tipo = pd.api.types.infer_dtype(df[coluna], skipna=True)
+        if tipo.startswith('mixed'):
+            if df_preparado is df:
+                df_preparado = df.copy()
+            serie = df[coluna]
+            df_preparado[coluna] = serie.where(serie.isna(), serie.astype(str)).astype(object)
+            colunas_mistas.append(coluna)
+
+    return df_preparado, colunas_mistas
+
+
+def _restaurar_colunas_mistas(df, colunas_mistas):
+    """Desfaz a conversão de _preparar_para_parquet, devolvendo os números ao tipo original"""
+    for coluna in colunas_mistas:
+        if coluna not in df.columns:
+            continue
+        serie = df[coluna].astype(object)
+        numeros = pd.to_numeric(serie, errors='coerce')
+        inteiros = numeros.notna() & (numeros % 1 == 0)
+        decimais = numeros.notna() & ~inteiros
+        serie[inteiros] = numeros[inteiros].astype('int64').astype(object)
+        serie[decimais] = numeros[decimais].astype(object)
+        df[coluna] = serie
+    return df
+
+
+def snapshot_valido(metadados, assinatura, caminho_parquet):
+    """Indica se o snapshot salvo corresponde ao conteúdo atual da planilha"""
+    return bool(
+        metadados
+        and metadados.get('versao_formato') == VERSAO_FORMATO
+        and metadados.get('sha256') == assinatura['sha256']
+        and os.path.exists(caminho_parquet)
+    )
+
+
+def gravar_snapshot(df, caminho_planilha, assinatura):
+    """Grava o snapshot Parquet e seus metadados ao lado da planilha"""
+    caminho_parquet, caminho_metadados = caminhos_snapshot(caminho_planilha)
+    df_preparado, colunas_mistas = _preparar_para_parquet(df)
+
+    gravar_atomico(caminho_parquet, lambda caminho: df_preparado.to_parquet(caminho, index=False), PREFIXO_TEMPORARIO)
+    _gravar_metadados(caminho_metadados, {
+        'versao_formato': VERSAO_FORMATO,
+        'tamanho': assinatura['tamanho'],
+        'mtime_ns': assinatura['mtime_ns'],
+        'sha256': assinatura['sha256'],
+        'colunas_mistas': colunas_mistas,
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+    })
+
+
+def _ler_parquet(caminho_parquet, colunas):
+    """Lê o snapshot projetando apenas as colunas pedidas que existem nele"""
+    if colunas is None:
+        return pd.read_parquet(caminho_parquet)
+
+    import pyarrow.parquet as pq
+
+    existentes = set(pq.read_schema(caminho_parquet).names)
+    return pd.read_parquet(caminho_parquet, columns=[coluna for coluna in colunas if coluna in existentes])
+
+
+def carregar_snapshot(caminho_planilha=ARQUIVO_PADRAO, colunas=None):
+    """
+    Carrega os dados da planilha usando o snapshot colunar sempre que possível.
+    Se 'colunas' for informado, apenas essas colunas são lidas do snapshot.
+
+    Lança FileNotFoundError se a planilha não existir. Falhas ao ler ou gravar o
+    snapshot nunca impedem a carga: nesse caso a planilha é lida diretamente,
+    com o leitor mais rápido registrado para o formato (Excel ou CSV).
+    """
+    caminho_parquet, caminho_metadados = caminhos_snapshot(caminho_planilha)
+    metadados = _ler_metadados(caminho_metadados)
+    assinatura = assinatura_planilha(caminho_planilha, metadados)
+
+    if snapshot_valido(metadados, assinatura, caminho_parquet):
+        try:
+            df = _ler_parquet(caminho_parquet, colunas)
+            df = _restaurar_colunas_mistas(df, metadados.get('colunas_mistas', []))
+
+            # Planilha regravada sem mudança de conteúdo: só atualiza tamanho/data
+            if (metadados.get('tamanho'), metadados.get('mtime_ns')) != (assinatura['tamanho'], assinatura['mtime_ns']):
+                metadados.update(tamanho=assinatura['tamanho'], mtime_ns=assinatura['mtime_ns'])
+                _gravar_metadados(caminho_metadados, metadados)
+
+            return df
+        except Exception:
+            pass  # Snapshot corrompido ou ilegível: reconstrói a partir da planilha
+
+    df = ler_planilha(caminho_planilha)
+
+    try:
+        gravar_snapshot(df, caminho_planilha, assinatura)
+    except Exception:
+        pass  # Diretório sem permissão de escrita ou pyarrow indisponível
+
+    return projetar_colunas(df, colunas)
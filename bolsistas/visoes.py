@@ -0,0 +1,42 @@
+"""
+Colunas utilizadas por cada visão dos dashboards.
+
+Cada visão declara aqui o conjunto de colunas que consome, e os carregadores
+leem somente essas colunas do snapshot (projeção colunar no Parquet ou
+'usecols' na planilha), sem materializar a planilha inteira. O conjunto
+declarado precisa cobrir tudo o que a visão exibe: a tabela "Dados Completos"
+do Dashboard Principal mostra todas as colunas da planilha.
+"""
+
+# Colunas da planilha do ERP, na ordem da exportação
+COLUNAS_PLANILHA = (
+    'CODFILIAL', 'NOMECURSO', 'TOTAL_MATRICULADOS', 'ALUNOS_PAGANTES', 'FORMANDOS_NAO_CEBAS',
+    'TOTAL_INSTITUCIONAL', 'TOTAL_ASSISTENCIAL_100', 'TOTAL_ASSISTENCIAL_50',
+    'FORMANDOS_ASSISTENCIAL', 'TOTAL_PROUNI', 'FORMANDOS_PROUNI', 'BOLSAS_INTEGRAIS',
+    'ATENDE_1_9_PROUNI', 'FALTAM_SOBRAM_PROUNI', 'ATENDE_1_5_FILANTROPIA', 'FALTAM_SOBRAM_FILANTROPIA',
+)
+
+COLUNAS_DASHBOARD_PRINCIPAL = COLUNAS_PLANILHA
+
+COLUNAS_CONFORMIDADE = (
+    'CODFILIAL', 'NOMECURSO', 'FALTAM_SOBRAM_PROUNI', 'FALTAM_SOBRAM_FILANTROPIA',
+)
+
+COLUNAS_PROJECAO = (
+    'CODFILIAL', 'NOMECURSO', 'FORMANDOS_NAO_CEBAS', 'FORMANDOS_ASSISTENCIAL',
+    'TOTAL_INSTITUCIONAL', 'TOTAL_ASSISTENCIAL_100', 'TOTAL_ASSISTENCIAL_50', 'TOTAL_PROUNI',
+)
+
+# Chaves iguais às opções do seletor "Tipo de Análise" do app principal
+COLUNAS_POR_VISAO = {
+    "Dashboard Principal": COLUNAS_DASHBOARD_PRINCIPAL,
+    "Conformidade e Alertas": COLUNAS_CONFORMIDADE,
+    "🔮 Projeção de Conformidade": COLUNAS_PROJECAO,
+}
+
+
+def projetar_colunas(df, colunas):
+    """Mantém apenas as colunas pedidas que existem no DataFrame, na ordem pedida"""
+    if colunas is None:
+        return df
+    return df[[coluna for coluna in colunas if coluna in df.columns]]
@@ -3,6 +3,9 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from bolsistas.acesso import atualizar_dados, carregar_bolsistas
+from bolsistas.estilos import estilizar
+from bolsistas.leitores import ler_planilha
 
 # Configuração da página
 st.set_page_config(
@@ -17,17 +20,22 @@ st.markdown("### Monitoramento de Superávit e Déficit de Vagas - PROUNI e Fila
 
 # --- Função de Carregamento de Dados ---
 @st.cache_data
+def carregar_exemplo_conformidade(caminho):
+    """Lê a planilha de exemplo de conformidade"""
+    return ler_planilha(caminho)
+
 def carregar_dados_conformidade():
     """
     Carrega os dados de conformidade de um arquivo Excel local.
     Retorna um DataFrame com as colunas necessárias para análise.
+    O arquivo principal vem da camada compartilhada (bolsistas/acesso.py).
     """
     try:
         # Tentar primeiro o arquivo de exemplo, depois o arquivo principal
         try:
-            df = pd.read_excel("dados_conformidade_exemplo.xlsx")
+            df = carregar_exemplo_conformidade("dados_conformidade_exemplo.xlsx")
         except FileNotFoundError:
-            df = pd.read_excel("dados_bolsistas.xlsx")
+            df = carregar_bolsistas()
         
         # Verificar se as colunas necessárias existem
         colunas_necessarias = ['NOMECURSO', 'PROUNI_SOBRA_FALTA', 'FILANTROPIA_SOBRA_FALTA']
@@ -141,9 +149,14 @@ st.sidebar.markdown("""
 </h3>
 """, unsafe_allow_html=True)
 
-# Botão para atualizar dados
+# Botão para atualizar dados: relê a planilha de exemplo e pede à camada
+# compartilhada a nova versão dos dados, montada em segundo plano
 if st.sidebar.button("🔄 Atualizar Dados"):
-    st.cache_data.clear()
+    carregar_exemplo_conformidade.clear()
+    try:
+        atualizar_dados()
+    except FileNotFoundError:
+        pass
     st.rerun()
 
 # Menu de Seleção de Filial
@@ -312,30 +325,15 @@ if not df.empty:
         # Preparar dados para exibição
         df_exibicao = df[['NOMECURSO', 'PROUNI_SOBRA_FALTA', 'FILANTROPIA_SOBRA_FALTA']].copy()
         
-        # Função para aplicar estilo às células
-        def aplicar_estilo_celulas(val):
-            """
-            Aplica cor de fundo baseada no valor da célula.
-            """
-            if pd.isna(val) or val == 0:
-                return ''
-            elif val < 0:
-                return 'background-color: #ffebee'  # Vermelho claro
-            else:
-                return 'background-color: #e8f5e8'  # Verde claro
-        
-        # Aplicar estilo apenas às colunas numéricas
-        df_styled = df_exibicao.style.applymap(
-            aplicar_estilo_celulas, 
-            subset=['PROUNI_SOBRA_FALTA', 'FILANTROPIA_SOBRA_FALTA']
+        # Verde claro para saldo positivo, vermelho claro para negativo e sem cor no zero
+        cores_saldo = ('background-color: #e8f5e8', 'background-color: #ffebee', '')
+        colunas_saldo = ['PROUNI_SOBRA_FALTA', 'FILANTROPIA_SOBRA_FALTA']
+        df_styled = estilizar(
+            df_exibicao,
+            saldos={coluna: cores_saldo for coluna in colunas_saldo},
+            formatos={coluna: '{:+.0f}' for coluna in colunas_saldo}
         )
         
-        # Renomear colunas para exibição
-        df_styled = df_styled.format({
-            'PROUNI_SOBRA_FALTA': '{:+.0f}',
-            'FILANTROPIA_SOBRA_FALTA': '{:+.0f}'
-        })
-        
         # Exibir tabela
         st.dataframe(
             df_styled,
@@ -12,6 +12,11 @@ import plotly.express as px
 import plotly.graph_objects as go
 from PIL import Image
 import os
+from bolsistas.acesso import carregar_conjunto
+from bolsistas.cenarios import aplicar_cenario, montar_base_cenarios
+from bolsistas.esquema import COLUNAS_DERIVADAS_FILIAL
+from bolsistas.estilos import estilizar
+from bolsistas.regras_cebas import calcular_saldos
 
 # ===== CONFIGURAÇÃO DA PÁGINA =====
 st.set_page_config(
@@ -32,67 +37,55 @@ CINZA_CLARO = '#F5F7FA'       # Cinza mais claro
 CINZA_MEDIO = '#E8EEF5'       # Para contraste suave
 
 # ===== FUNÇÕES DE CARREGAMENTO DE DADOS =====
-@st.cache_data
 def carregar_dados():
     """
-    Carrega os dados do arquivo Excel com cache para otimização de performance
+    Carrega os dados da camada compartilhada (uma cópia por versão da planilha
+    para todos os dashboards), já com os tipos compactos do esquema de
+    bolsistas e sem as linhas de subtotal. Retorna (dados, derivado): os
+    derivados são sempre da mesma versão dos dados
     """
     try:
-        df = pd.read_excel('dados_bolsistas.xlsx')
-        return df
+        # Subtotais do ERP ('4 Total') têm o mesmo código da filial após a normalização
+        _, df, derivado = carregar_conjunto(sem_subtotais=True)
+        return df.drop(columns=list(COLUNAS_DERIVADAS_FILIAL)), derivado
     except FileNotFoundError:
         st.error("❌ Arquivo 'dados_bolsistas.xlsx' não encontrado!")
-        return pd.DataFrame()
+        return pd.DataFrame(), None
     except Exception as e:
         st.error(f"❌ Erro ao carregar dados: {str(e)}")
-        return pd.DataFrame()
+        return pd.DataFrame(), None
 
-def aplicar_projecao(df, simular=False):
+def aplicar_projecao(df, derivado, simular=False, cenario=None):
     """
-    Aplica projeção considerando formandos se a simulação estiver ativada
+    Aplica projeção considerando formandos se a simulação estiver ativada.
+    O cenário (parâmetros de bolsistas/cenarios.py) é avaliado pelo motor de
+    cenários, com cache por vetor de parâmetros
     """
     if not simular or df.empty:
         return df
     
-    df_projecao = df.copy()
-    
-    # Simular redução por formandos (10% PROUNI, 15% Filantropia)
-    if 'TOTAL_PROUNI' in df_projecao.columns:
-        df_projecao['TOTAL_PROUNI'] = df_projecao['TOTAL_PROUNI'] * 0.9
-    
-    if 'TOTAL_INSTITUCIONAL' in df_projecao.columns:
-        df_projecao['TOTAL_INSTITUCIONAL'] = df_projecao['TOTAL_INSTITUCIONAL'] * 0.85
-    
-    return df_projecao
+    base = derivado('base_cenarios', montar_base_cenarios)
+    # Só as colunas projetadas são substituídas (cópia rasa: o restante do frame é compartilhado)
+    return aplicar_cenario(base, df, cenario or {})
 
 def calcular_saldos_conformidade(df):
     """
-    Calcula os saldos de conformidade para PROUNI e Filantropia
+    Calcula os saldos de conformidade para PROUNI e Filantropia. Sem as
+    colunas de saldo, eles são calculados pelas regras CEBAS a partir das
+    contagens de cada curso (já projetadas, se a simulação estiver ativa)
     """
     if df.empty:
         return pd.DataFrame()
     
-    # Simular colunas de saldo (adapte conforme sua estrutura real)
     df_saldos = df.copy()
     
-    # Se não existirem as colunas de saldo, criar simulação baseada nos dados existentes
-    if 'PROUNI_SOBRA_FALTA' not in df_saldos.columns:
-        if 'TOTAL_PROUNI' in df_saldos.columns:
-            # Simular saldos baseados nos totais (exemplo: meta vs realizado)
-            # Tratar valores NaN antes da conversão
-            valores_prouni = df_saldos['TOTAL_PROUNI'].fillna(0) * 0.1 - 50
-            df_saldos['PROUNI_SOBRA_FALTA'] = valores_prouni.round().astype(int)
-        else:
-            df_saldos['PROUNI_SOBRA_FALTA'] = 0
-    
-    if 'FILANTROPIA_SOBRA_FALTA' not in df_saldos.columns:
-        if 'TOTAL_INSTITUCIONAL' in df_saldos.columns:
-            # Simular saldos baseados nos totais
-            # Tratar valores NaN antes da conversão
-            valores_filantropia = df_saldos['TOTAL_INSTITUCIONAL'].fillna(0) * 0.05 - 30
-            df_saldos['FILANTROPIA_SOBRA_FALTA'] = valores_filantropia.round().astype(int)
-        else:
-            df_saldos['FILANTROPIA_SOBRA_FALTA'] = 0
+    # Exigência calculada de uma vez para todas as linhas (bolsistas/regras_cebas.py)
+    if 'PROUNI_SOBRA_FALTA' not in df_saldos.columns or 'FILANTROPIA_SOBRA_FALTA' not in df_saldos.columns:
+        saldos = calcular_saldos(df_saldos)
+        if 'PROUNI_SOBRA_FALTA' not in df_saldos.columns:
+            df_saldos['PROUNI_SOBRA_FALTA'] = saldos['FALTAM_SOBRAM_PROUNI']
+        if 'FILANTROPIA_SOBRA_FALTA' not in df_saldos.columns:
+            df_saldos['FILANTROPIA_SOBRA_FALTA'] = saldos['FALTAM_SOBRAM_FILANTROPIA']
     
     # Garantir que não há valores NaN nas colunas de saldo
     df_saldos['PROUNI_SOBRA_FALTA'] = df_saldos['PROUNI_SOBRA_FALTA'].fillna(0).astype(int)
@@ -172,22 +165,12 @@ def aplicar_estilo_tabela(df, colunas_saldo):
     """
     Aplica estilo colorido às colunas de saldo na tabela
     """
-    def colorir_saldo(val):
-        if pd.isna(val):
-            return ''
-        if val > 0:
-            return f'background-color: {VERDE_POSITIVO}; color: {BRANCO}; font-weight: bold;'
-        elif val < 0:
-            return f'background-color: {VERMELHO_ALERTA}; color: {BRANCO}; font-weight: bold;'
-        else:
-            return f'background-color: {AZUL_PRINCIPAL}; color: {BRANCO}; font-weight: bold;'
-    
-    styled_df = df.style
-    for coluna in colunas_saldo:
-        if coluna in df.columns:
-            styled_df = styled_df.applymap(colorir_saldo, subset=[coluna])
-    
-    return styled_df
+    cores_saldo = (
+        f'background-color: {VERDE_POSITIVO}; color: {BRANCO}; font-weight: bold;',
+        f'background-color: {VERMELHO_ALERTA}; color: {BRANCO}; font-weight: bold;',
+        f'background-color: {AZUL_PRINCIPAL}; color: {BRANCO}; font-weight: bold;'
+    )
+    return estilizar(df, saldos={coluna: cores_saldo for coluna in colunas_saldo})
 
 # ===== SIDEBAR COM LOGO E CONTROLES =====
 st.sidebar.markdown(f"""
@@ -215,7 +198,7 @@ st.sidebar.markdown(f"""
 """, unsafe_allow_html=True)
 
 # ===== CARREGAMENTO E FILTRAGEM DE DADOS =====
-df_original = carregar_dados()
+df_original, derivado = carregar_dados()
 
 if not df_original.empty:
     # Menu de Seleção de Filial
@@ -245,14 +228,23 @@ if not df_original.empty:
     # Checkbox de simulação
     simular_projecao = st.sidebar.checkbox(
         "🔮 Simular Projeção para o Próximo Semestre (com formandos)",
-        help="Considera 10% de formandos PROUNI e 15% de Filantropia"
+        help="Considera 10% de saída PROUNI e 15% de saída das bolsas assistenciais (filantropia)"
     )
     
+    cenario = {}
     if simular_projecao:
-        st.sidebar.info("📈 Projeção ativada: -10% PROUNI, -15% Filantropia")
+        saida_prouni = st.sidebar.slider("Saída PROUNI (%)", 0, 50, 10, help="Bolsistas PROUNI que deixam o programa")
+        saida_filantropia = st.sidebar.slider("Saída Filantropia (%)", 0, 50, 15,
+                                              help="Bolsistas assistenciais (100% e 50%) que deixam o programa")
+        cenario = {
+            'evasao_PROUNI': saida_prouni / 100,
+            'evasao_ASSISTENCIAL_100': saida_filantropia / 100,
+            'evasao_ASSISTENCIAL_50': saida_filantropia / 100,
+        }
+        st.sidebar.info(f"📈 Projeção ativada: -{saida_prouni}% PROUNI, -{saida_filantropia}% Filantropia")
     
     # Aplicar projeção se necessário
-    df_final = aplicar_projecao(df_filtrado, simular_projecao)
+    df_final = aplicar_projecao(df_filtrado, derivado, simular_projecao, cenario)
     
     # Calcular saldos de conformidade
     df_conformidade = calcular_saldos_conformidade(df_final)
@@ -4,6 +4,12 @@ import plotly.express as px
 import plotly.graph_objects as go
 from PIL import Image
 import os
+from bolsistas.acesso import carregar_bolsistas
+from bolsistas.cenarios import COLUNAS_PROGRAMAS, PROGRAMAS, montar_base_cenarios, projetar_cenario
+from bolsistas.classificacao import DEFICIT, SUPERAVIT, classificar_saldo
+from bolsistas.esquema import COLUNAS_DERIVADAS_FILIAL
+from bolsistas.estilos import estilizar
+from bolsistas.leitores import ler_planilha, localizar_planilha
 
 # ===== VARIÁVEIS DE CORES =====
 AZUL_PRINCIPAL = '#00205B'
@@ -13,6 +19,12 @@ AZUL_CLARO = '#E3F2FD'
 CINZA_CLARO = '#F5F5F5'
 LARANJA_DESTAQUE = '#FF9800'
 
+# ===== CENÁRIO DA SIMULAÇÃO DE PROJEÇÃO =====
+# Parâmetros de bolsistas/cenarios.py: crescimento de 10% (ingresso) em todos os programas
+CENARIO_PROJECAO = {f'ingresso_{programa}': 0.1 for programa in PROGRAMAS}
+COLUNAS_CONTAGENS = ['CODFILIAL', 'NOMECURSO', *COLUNAS_PROGRAMAS.values(),
+                     'FALTAM_SOBRAM_PROUNI', 'FALTAM_SOBRAM_FILANTROPIA']
+
 # ===== CONFIGURAÇÃO DA PÁGINA =====
 st.set_page_config(
     page_title="Dashboard de Conformidade e Alertas",
@@ -22,16 +34,22 @@ st.set_page_config(
 
 # ===== FUNÇÃO DE CARREGAMENTO DE DADOS =====
 @st.cache_data
+def carregar_exemplo(caminho):
+    """Lê a planilha de exemplo de conformidade"""
+    return ler_planilha(caminho)
+
 def load_data():
     """
-    Carrega e processa os dados de conformidade.
+    Carrega e processa os dados de conformidade. Os dados reais vêm da camada
+    compartilhada (bolsistas/acesso.py), sem cópia própria deste dashboard.
     """
     try:
-        # Tentar carregar o arquivo principal
+        # Tentar carregar o arquivo principal (Excel ou CSV exportado pelo ERP)
+        arquivo_bolsistas = localizar_planilha('dados_bolsistas')
         if os.path.exists('dados_conformidade_exemplo.xlsx'):
-            df = pd.read_excel('dados_conformidade_exemplo.xlsx')
-        elif os.path.exists('dados_bolsistas.xlsx'):
-            df = pd.read_excel('dados_bolsistas.xlsx')
+            df = carregar_exemplo('dados_conformidade_exemplo.xlsx')
+        elif os.path.exists(arquivo_bolsistas):
+            df = carregar_bolsistas(sem_subtotais=True).drop(columns=list(COLUNAS_DERIVADAS_FILIAL))
         else:
             # Criar dados de exemplo se não houver arquivo
             df = pd.DataFrame({
@@ -73,6 +91,27 @@ def load_data():
         # Retornar DataFrame vazio em caso de erro
         return pd.DataFrame(columns=['NOMECURSO', 'FILIAL', 'PROUNI_SOBRA_FALTA', 'FILANTROPIA_SOBRA_FALTA'])
 
+def projetar_saldos(df, cenario=CENARIO_PROJECAO):
+    """
+    Variação dos saldos PROUNI e filantropia de cada linha no cenário. Com as
+    contagens por curso do ERP, o cenário é avaliado pelo motor de
+    bolsistas/cenarios.py. Os dados de exemplo trazem só os saldos: como as
+    regras CEBAS são lineares nas contagens, um ingresso igual em todos os
+    programas os escala pela mesma fração.
+    """
+    if set(COLUNAS_CONTAGENS) <= set(df.columns):
+        base = montar_base_cenarios(df)
+        variacao = projetar_cenario(base, cenario)[['SALDO_PROUNI', 'SALDO_FILANTROPIA']] \
+            - projetar_cenario(base, {})[['SALDO_PROUNI', 'SALDO_FILANTROPIA']]
+        variacao = variacao.reindex(pd.MultiIndex.from_frame(df[['CODFILIAL', 'NOMECURSO']])).fillna(0)
+        return variacao['SALDO_PROUNI'].to_numpy(), variacao['SALDO_FILANTROPIA'].to_numpy()
+
+    crescimento = {cenario.get(f'ingresso_{programa}', 0) for programa in PROGRAMAS}
+    if len(crescimento) > 1 or set(cenario) - {f'ingresso_{programa}' for programa in PROGRAMAS}:
+        raise ValueError("Sem as contagens por curso, só um ingresso igual em todos os programas pode ser projetado")
+    fracao = crescimento.pop()
+    return df['PROUNI_SOBRA_FALTA'].to_numpy() * fracao, df['FILANTROPIA_SOBRA_FALTA'].to_numpy() * fracao
+
 # ===== CARREGAMENTO DOS DADOS =====
 df_original = load_data()
 
@@ -112,9 +151,10 @@ else:
 
 # Se simulação de projeção for marcada, calcular novas colunas
 if simulacao_projecao:
-    # Calcular projeções (exemplo: 10% de crescimento)
-    df_filtrado['PROUNI_PROJECAO'] = (df_filtrado['PROUNI_SOBRA_FALTA'] * 1.1).round().astype(int)
-    df_filtrado['FILANTROPIA_PROJECAO'] = (df_filtrado['FILANTROPIA_SOBRA_FALTA'] * 1.1).round().astype(int)
+    # Calcular projeções no cenário da simulação (CENARIO_PROJECAO)
+    variacao_prouni, variacao_filantropia = projetar_saldos(df_filtrado)
+    df_filtrado['PROUNI_PROJECAO'] = (df_filtrado['PROUNI_SOBRA_FALTA'] + variacao_prouni).round().astype(int)
+    df_filtrado['FILANTROPIA_PROJECAO'] = (df_filtrado['FILANTROPIA_SOBRA_FALTA'] + variacao_filantropia).round().astype(int)
     
     # Usar projeções para visualizações
     df_display = df_filtrado.copy()
@@ -175,9 +215,7 @@ if not df_display.empty:
         
         # Criar coluna Status para PROUNI
         df_prouni = df_display.copy()
-        df_prouni['Status'] = df_prouni['PROUNI_SOBRA_FALTA'].apply(
-            lambda x: 'Superávit' if x >= 0 else 'Déficit'
-        )
+        df_prouni['Status'] = classificar_saldo(df_prouni['PROUNI_SOBRA_FALTA'], SUPERAVIT, DEFICIT)
         
         # Criar gráfico de barras horizontal com color='Status'
         fig_prouni = px.bar(
@@ -211,9 +249,7 @@ if not df_display.empty:
         
         # Criar coluna Status para Filantropia
         df_filantropia = df_display.copy()
-        df_filantropia['Status'] = df_filantropia['FILANTROPIA_SOBRA_FALTA'].apply(
-            lambda x: 'Superávit' if x >= 0 else 'Déficit'
-        )
+        df_filantropia['Status'] = classificar_saldo(df_filantropia['FILANTROPIA_SOBRA_FALTA'], SUPERAVIT, DEFICIT)
         
         # Criar gráfico de barras horizontal com color='Status'
         fig_filantropia = px.bar(
@@ -246,18 +282,6 @@ if not df_display.empty:
     with tab2:
         st.subheader("📋 Tabela Detalhada de Conformidade")
         
-        # Função de estilo separada
-        def aplicar_estilo_background(val):
-            """
-            Retorna a cor de fundo baseada no valor da célula.
-            """
-            if pd.isna(val) or val == 0:
-                return ''
-            elif val < 0:
-                return f'background-color: {VERMELHO_ALERTA}'
-            else:
-                return f'background-color: {VERDE_SUCESSO}'
-        
         # Preparar dados para exibição
         colunas_exibicao = ['NOMECURSO', 'PROUNI_SOBRA_FALTA', 'FILANTROPIA_SOBRA_FALTA']
         if simulacao_projecao:
@@ -265,12 +289,6 @@ if not df_display.empty:
         
         df_tabela = df_display[colunas_exibicao].copy()
         
-        # Aplicar estilo usando applymap
-        df_styled = df_tabela.style.applymap(
-            aplicar_estilo_background,
-            subset=['PROUNI_SOBRA_FALTA', 'FILANTROPIA_SOBRA_FALTA']
-        )
-        
         # Formatação dos valores
         format_dict = {
             'PROUNI_SOBRA_FALTA': '{:+.0f}',
@@ -283,7 +301,13 @@ if not df_display.empty:
                 'FILANTROPIA_PROJECAO': '{:+.0f}'
             })
         
-        df_styled = df_styled.format(format_dict)
+        # Cor de fundo por saldo (verde positivo, vermelho negativo, sem cor no zero)
+        cores_saldo = (f'background-color: {VERDE_SUCESSO}', f'background-color: {VERMELHO_ALERTA}', '')
+        df_styled = estilizar(
+            df_tabela,
+            saldos={coluna: cores_saldo for coluna in ['PROUNI_SOBRA_FALTA', 'FILANTROPIA_SOBRA_FALTA']},
+            formatos=format_dict
+        )
         
         # Exibir tabela usando st.dataframe()
         st.dataframe(
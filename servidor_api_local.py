@@ -0,0 +1,387 @@
+"""
+Servidor local que faz o papel da API do ERP, para desenvolvimento e para
+verificar a economia das requisições condicionais e comprimidas.
+
+Serve os dados da planilha de bolsistas em JSON com ETag (SHA-256 da
+planilha) e Last-Modified, responde 304 Not Modified às requisições
+condicionais e comprime com gzip quando o cliente aceita. Também responde
+em NDJSON (Accept: application/x-ndjson) e em páginas (?tamanho=N, com
+cabeçalho Link rel="next"), os formatos da leitura em streaming, e por
+filial (?filial=4), como a API por filial do ERP. Com Accept:
+application/vnd.apache.arrow.stream, responde em Arrow IPC com as colunas já
+tipadas pelo esquema de bolsistas.
+
+Em /dados_bolsistas/alteracoes serve um feed de alterações para a
+sincronização incremental: {"dados": [...], "removidos": [...], "marca":
+<versão da planilha>}, com só as linhas alteradas ou novas e as chaves das
+excluídas desde a marca recebida em ?desde= (todas as linhas e "completo":
+true, sem marca ou com uma marca desconhecida), também por filial.
+
+    python servidor_api_local.py               # serve em http://127.0.0.1:8765/dados_bolsistas
+    python servidor_api_local.py --verificar   # bytes, streaming, filiais, Arrow e delta de bolsistas/api.py
+
+Para usar nos dashboards, configure em .streamlit/secrets.toml:
+[general] use_api = true e [api] url = "http://127.0.0.1:8765/dados_bolsistas".
+"""
+
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+import pyarrow as pa
+import requests
+
+from bolsistas.cache_disco import para_arrow
+from bolsistas.esquema import aplicar_esquema, normalizar_filial
+from bolsistas.leitores import localizar_planilha
+from bolsistas.snapshot import carregar_snapshot, versao_planilha
+
+PORTA_PADRAO = 8765
+CAMINHO_DADOS = '/dados_bolsistas'
+CAMINHO_ALTERACOES = '/dados_bolsistas/alteracoes'
+TIPO_ARROW = 'application/vnd.apache.arrow.stream'
+CHAVES_ALTERACOES = ('CODFILIAL', 'NOMECURSO')
+
+_trava_historico = threading.Lock()
+_historico = {}  # (filial, versão da planilha) -> linhas servidas nela, em JSON, por chave
+
+
+def serializar_arrow(df):
+    """Corpo Arrow IPC (stream) de 'df' com o esquema de bolsistas aplicado"""
+    tabela = para_arrow(aplicar_esquema(df))
+    destino = pa.BufferOutputStream()
+    with pa.ipc.new_stream(destino, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    return destino.getvalue().to_pybytes()
+
+
+def montar_resposta(caminho_planilha, formato='json', pagina=1, tamanho=None, filial=None):
+    """
+    Corpo, tipo de conteúdo, ETag, data de modificação e link da próxima
+    página (ou None) da versão atual da planilha no formato pedido.
+    Com 'filial', só as linhas dela (corpo None se a filial não existir).
+    """
+    df = carregar_snapshot(caminho_planilha)
+    if filial is not None:
+        df = df[(normalizar_filial(df['CODFILIAL'])[0] == filial).fillna(False).to_numpy(dtype=bool)]
+        if df.empty:
+            return None, None, None, None, None
+    proxima = None
+    if formato == 'arrow':
+        corpo, tipo = serializar_arrow(df), TIPO_ARROW
+    elif formato == 'ndjson':
+        corpo, tipo = df.to_json(orient='records', lines=True, force_ascii=False), 'application/x-ndjson'
+    else:
+        if tamanho:
+            inicio = (pagina - 1) * tamanho
+            if inicio + tamanho < len(df):
+                proxima = f'{CAMINHO_DADOS}?tamanho={tamanho}&pagina={pagina + 1}'
+                if filial is not None:
+                    proxima += f'&filial={filial}'
+            df = df.iloc[inicio:inicio + tamanho]
+        corpo, tipo = df.to_json(orient='records', force_ascii=False), 'application/json'
+    etag = f'"{versao_planilha(caminho_planilha)}-{formato}-{filial}"'
+    modificacao = int(os.path.getmtime(caminho_planilha))
+    if formato == 'arrow':
+        return corpo, tipo, etag, modificacao, proxima
+    return corpo.encode('utf-8'), f'{tipo}; charset=utf-8', etag, modificacao, proxima
+
+
+def montar_alteracoes(caminho_planilha, desde=None, filial=None):
+    """
+    Corpo do feed de alterações: as linhas da versão atual que não existiam,
+    iguais, na versão 'desde', as chaves (CODFILIAL, NOMECURSO) das linhas
+    que deixaram de existir e a marca da versão atual. Com uma marca
+    desconhecida, todas as linhas e "completo": true. Com 'filial', o feed
+    só daquela filial.
+    """
+    marca = versao_planilha(caminho_planilha)
+    df = carregar_snapshot(caminho_planilha)
+    if filial is not None:
+        df = df[(normalizar_filial(df['CODFILIAL'])[0] == filial).fillna(False).to_numpy(dtype=bool)]
+    registros = json.loads(df.to_json(orient='records'))
+    linhas = {
+        json.dumps([registro.get(chave) for chave in CHAVES_ALTERACOES]): json.dumps(registro, ensure_ascii=False)
+        for registro in registros
+    }
+    with _trava_historico:
+        anteriores = _historico.get((filial, desde))
+        _historico[(filial, marca)] = linhas
+    if anteriores is None:
+        dados, removidos = list(linhas.values()), []
+    else:
+        dados = [linha for chave, linha in linhas.items() if anteriores.get(chave) != linha]
+        removidos = [dict(zip(CHAVES_ALTERACOES, json.loads(chave))) for chave in anteriores if chave not in linhas]
+    corpo = ('{"dados": [' + ', '.join(dados) + '], "removidos": ' + json.dumps(removidos, ensure_ascii=False)
+             + ', "completo": ' + json.dumps(anteriores is None) + ', "marca": ' + json.dumps(marca) + '}')
+    return corpo.encode('utf-8')
+
+
+class ManipuladorApi(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # mantém a conexão aberta (keep-alive)
+
+    def do_GET(self):
+        endereco = urlsplit(self.path)
+        parametros = {chave: valores[0] for chave, valores in parse_qs(endereco.query).items()}
+        if endereco.path == CAMINHO_ALTERACOES:
+            filial = int(parametros['filial']) if 'filial' in parametros else None
+            corpo = montar_alteracoes(localizar_planilha('dados_bolsistas'), parametros.get('desde'), filial)
+            self._enviar(corpo, 'application/json; charset=utf-8')
+            return
+        if endereco.path != CAMINHO_DADOS:
+            self.send_error(404)
+            return
+
+        parametros = {chave: int(valor) for chave, valor in parametros.items()}
+        aceita = self.headers.get('Accept', '')
+        if TIPO_ARROW in aceita:
+            formato = 'arrow'
+        elif 'application/x-ndjson' in aceita:
+            formato = 'ndjson'
+        else:
+            formato = 'json'
+        corpo, tipo, etag, modificacao, proxima = montar_resposta(
+            localizar_planilha('dados_bolsistas'), formato, parametros.get('pagina', 1), parametros.get('tamanho'),
+            parametros.get('filial')
+        )
+        if corpo is None:
+            self.send_error(404)
+            return
+        ultima_modificacao = formatdate(modificacao, usegmt=True)
+
+        if self._nao_modificado(etag, modificacao):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', ultima_modificacao)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        cabecalhos = {'ETag': etag, 'Last-Modified': ultima_modificacao}
+        if proxima:
+            cabecalhos['Link'] = f'<{proxima}>; rel="next"'
+        self._enviar(corpo, tipo, cabecalhos)
+
+    def _enviar(self, corpo, tipo, cabecalhos=None):
+        self.send_response(200)
+        self.send_header('Content-Type', tipo)
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            corpo = gzip.compress(corpo)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _nao_modificado(self, etag, modificacao):
+        if 'If-None-Match' in self.headers:
+            return etag in [valor.strip() for valor in self.headers['If-None-Match'].split(',')]
+        if 'If-Modified-Since' in self.headers:
+            try:
+                return modificacao <= parsedate_to_datetime(self.headers['If-Modified-Since']).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def iniciar_servidor(porta=PORTA_PADRAO):
+    """Inicia o servidor numa thread e o retorna (porta 0 escolhe uma porta livre)"""
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), ManipuladorApi)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def verificar_economia():
+    """
+    Compara os bytes transferidos por uma requisição simples (sem compressão
+    nem validação) com os das requisições de bolsistas/api.py: a primeira
+    comprimida e a segunda condicional (304, que serve a tabela em cache).
+    """
+    from bolsistas import api
+
+    servidor = iniciar_servidor(0)
+    url = f'http://127.0.0.1:{servidor.server_address[1]}{CAMINHO_DADOS}'
+    try:
+        simples = len(requests.get(url, headers={'Accept-Encoding': 'identity'}, timeout=10).content)
+
+        inicial = api.metricas_api()
+        tabela = api.buscar_tabela_api(url)
+        primeira = api.metricas_api()
+        # idade_maxima=0: revalida na hora em vez de servir a tabela em cache
+        revalidada = api.buscar_tabela_api(url, idade_maxima=0)
+        segunda = api.metricas_api()
+    finally:
+        servidor.shutdown()
+
+    bytes_primeira = primeira['bytes_recebidos'] - inicial['bytes_recebidos']
+    bytes_segunda = segunda['bytes_recebidos'] - primeira['bytes_recebidos']
+    print(f"Registros recebidos: {len(tabela)}")
+    print(f"Requisição simples (sem gzip):     {simples:>8} bytes")
+    print(f"Primeira requisição (gzip):        {bytes_primeira:>8} bytes")
+    print(f"Revalidação (If-None-Match → 304): {bytes_segunda:>8} bytes")
+
+    ok = (segunda['nao_modificadas'] - primeira['nao_modificadas'] == 1 and revalidada is tabela
+          and bytes_primeira < simples and bytes_segunda == 0)
+    print("✅ Economia verificada" if ok else "❌ Economia não verificada")
+    return ok
+
+
+def verificar_streaming():
+    """
+    Confere que a leitura em lotes (NDJSON e páginas) de bolsistas/api.py
+    produz a mesma tabela tipada que a leitura do JSON inteiro.
+    """
+    from bolsistas import api
+
+    def converter(registros):
+        return aplicar_esquema(pd.DataFrame(registros))
+
+    servidor = iniciar_servidor(0)
+    url = f'http://127.0.0.1:{servidor.server_address[1]}{CAMINHO_DADOS}'
+    try:
+        completa = converter(requests.get(url, timeout=10).json())
+        por_ndjson = api.buscar_tabela_api(url, converter=converter, streaming=True)
+        por_paginas = api.buscar_tabela_api(f'{url}?tamanho=10', converter=converter, streaming=True)
+    finally:
+        servidor.shutdown()
+
+    ok = completa.equals(por_ndjson) and completa.equals(por_paginas)
+    print(f"Leitura em streaming (NDJSON e páginas de 10): {len(por_ndjson)} e {len(por_paginas)} registros")
+    print("✅ Streaming igual à leitura completa" if ok else "❌ Streaming diferente da leitura completa")
+    return ok
+
+
+def verificar_filiais():
+    """
+    Confere que a busca paralela por filial junta as filiais 4 e 7 na mesma
+    tabela tipada da leitura completa e que uma filial inexistente (99) só
+    é informada como falha, sem derrubar a carga.
+    """
+    from bolsistas import api
+
+    def converter(registros):
+        return aplicar_esquema(pd.DataFrame(registros))
+
+    servidor = iniciar_servidor(0)
+    url = f'http://127.0.0.1:{servidor.server_address[1]}{CAMINHO_DADOS}'
+    try:
+        completa = converter(requests.get(url, timeout=10).json())
+        por_filial, falhas = api.buscar_filiais_api(url + '?filial={filial}', [4, 7, 99], converter=converter)
+    finally:
+        servidor.shutdown()
+
+    ok = completa.equals(por_filial) and list(falhas) == [99]
+    print(f"Busca por filial: {len(por_filial)} registros, falhas: {falhas}")
+    print("✅ Filiais reunidas na tabela completa" if ok else "❌ Filiais diferentes da leitura completa")
+    return ok
+
+
+def verificar_colunar(repeticoes=2000):
+    """
+    Confere que a resposta Arrow negociada por bolsistas/api.py produz a
+    mesma tabela tipada que o JSON e compara o tempo de decodificação dos dois
+    formatos numa tabela ampliada ('repeticoes' cópias da planilha).
+    """
+    from bolsistas import api
+
+    def converter(dados):
+        return aplicar_esquema(pd.DataFrame(dados))
+
+    servidor = iniciar_servidor(0)
+    url = f'http://127.0.0.1:{servidor.server_address[1]}{CAMINHO_DADOS}'
+    try:
+        completa = converter(requests.get(url, timeout=10).json())
+        por_arrow = api.buscar_tabela_api(url, converter=converter, colunar=True)
+    finally:
+        servidor.shutdown()
+
+    ampliada = pd.concat([carregar_snapshot(localizar_planilha('dados_bolsistas'))] * repeticoes, ignore_index=True)
+    corpo_json = ampliada.to_json(orient='records', force_ascii=False).encode('utf-8')
+    corpo_arrow = serializar_arrow(ampliada)
+
+    inicio = time.perf_counter()
+    de_json = converter(json.loads(corpo_json))
+    tempo_json = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    de_arrow = converter(api.ler_arrow(corpo_arrow))
+    tempo_arrow = time.perf_counter() - inicio
+
+    ok = completa.equals(por_arrow) and de_json.equals(de_arrow) and tempo_arrow < tempo_json
+    print(f"Formato colunar ({len(ampliada)} registros): JSON {len(corpo_json)} bytes em {tempo_json:.3f}s, "
+          f"Arrow {len(corpo_arrow)} bytes em {tempo_arrow:.3f}s")
+    print("✅ Arrow igual ao JSON e mais rápido" if ok else "❌ Arrow diferente do JSON ou mais lento")
+    return ok
+
+
+def verificar_delta():
+    """
+    Numa cópia da planilha: sincroniza, altera um curso, exclui outro e
+    sincroniza de novo. Confere que a segunda sincronização só recebe a linha
+    alterada e a chave da excluída, que a tabela mesclada é igual a uma
+    leitura completa e que o cubo atualizado incrementalmente é igual ao
+    recalculado.
+    """
+    from openpyxl import load_workbook
+
+    from bolsistas import api
+    from bolsistas.cubo import atualizar_cubo, construir_cubo
+
+    def converter(registros):
+        return aplicar_esquema(pd.DataFrame(registros))
+
+    original = os.getcwd()
+    planilha = localizar_planilha('dados_bolsistas')
+    with tempfile.TemporaryDirectory() as pasta:
+        shutil.copy(planilha, os.path.join(pasta, os.path.basename(planilha)))
+        os.chdir(pasta)
+        servidor = iniciar_servidor(0)
+        endereco = f'http://127.0.0.1:{servidor.server_address[1]}'
+        url = endereco + CAMINHO_ALTERACOES
+        try:
+            api.buscar_tabela_api(url, converter=converter, delta=True)
+            api.obter_agregado_api(url, 'cubo', construir_cubo, atualizar_cubo)
+
+            livro = load_workbook(os.path.basename(planilha))
+            folha = livro.active
+            folha.cell(row=2, column=3).value = (folha.cell(row=2, column=3).value or 0) + 10
+            folha.delete_rows(3)
+            livro.save(os.path.basename(planilha))
+
+            antes = api.metricas_api()['bytes_recebidos']
+            sincronizada = api.buscar_tabela_api(url, converter=converter, ttl_suave=0, idade_maxima=0, delta=True)
+            bytes_delta = api.metricas_api()['bytes_recebidos'] - antes
+            cubo = api.obter_agregado_api(url, 'cubo', construir_cubo, atualizar_cubo)
+            completa = converter(requests.get(endereco + CAMINHO_DADOS, timeout=10).json())
+        finally:
+            servidor.shutdown()
+            os.chdir(original)
+
+    esperado = construir_cubo(completa)
+    ok = (completa.equals(sincronizada) and esperado['indicadores'].equals(cubo['indicadores'])
+          and esperado['celulas'].equals(cubo['celulas']))
+    print(f"Sincronização incremental: {bytes_delta} bytes para 1 linha alterada e 1 excluída")
+    print("✅ Delta igual à leitura completa" if ok else "❌ Delta diferente da leitura completa")
+    return ok
+
+
+if __name__ == "__main__":
+    if '--verificar' in sys.argv:
+        sys.exit(0 if verificar_economia() & verificar_streaming() & verificar_filiais() & verificar_colunar()
+                    & verificar_delta() else 1)
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', PORTA_PADRAO), ManipuladorApi)
+    print(f"API local em http://127.0.0.1:{PORTA_PADRAO}{CAMINHO_DADOS}")
+    servidor.serve_forever()
@@ -0,0 +1,12 @@
+"""Fixtures compartilhadas pelos testes"""
+
+import pytest
+
+from bolsistas import api
+
+
+@pytest.fixture
+def caches_api_vazios(monkeypatch):
+    """Tabelas e validadores de bolsistas/api.py vazios durante o teste, sem depender de URLs únicas"""
+    for nome in ('_tabelas', '_validadores', '_validadores_streaming', '_validadores_colunar'):
+        monkeypatch.setattr(api, nome, {})
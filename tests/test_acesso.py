@@ -0,0 +1,112 @@
+"""Camada de acesso: versão, dados e derivados de uma única leitura do buffer duplo"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from bolsistas import acesso, cache_disco, snapshot
+
+
+def _gravar_planilha(nome_base, prouni):
+    caminho = nome_base + '.csv'
+    pd.DataFrame({
+        'CODFILIAL': ['4', '4', '4 Total'],
+        'NOMECURSO': ['MEDICINA', 'DIREITO', None],
+        'TOTAL_PROUNI': [prouni, 5, prouni + 5],
+    }).to_csv(caminho, sep=';', index=False)
+    # Garante mtime diferente entre versões gravadas no mesmo segundo
+    instante = os.path.getmtime(caminho) + prouni
+    os.utime(caminho, (instante, instante))
+
+
+@pytest.fixture
+def nome_base(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # cache em disco relativo ao diretório de trabalho
+    nome = str(tmp_path / 'dados_bolsistas')
+    _gravar_planilha(nome, 10)
+    return nome
+
+
+def _total_prouni(df):
+    return int(df.loc[~df['LINHA_SUBTOTAL'], 'TOTAL_PROUNI'].sum())
+
+
+def _trocar_versao(nome_base, prouni):
+    _gravar_planilha(nome_base, prouni)
+    acesso.atualizar_dados(nome_base)
+    acesso._atualizacoes[nome_base].join()
+
+
+def test_carregar_conjunto_devolve_versao_dados_e_derivados(nome_base):
+    versao, df, derivado = acesso.carregar_conjunto(['CODFILIAL', 'TOTAL_PROUNI'], nome_base=nome_base)
+
+    assert versao == acesso.versao_atual(nome_base)
+    assert list(df.columns) == ['CODFILIAL', 'TOTAL_PROUNI', 'LINHA_SUBTOTAL', 'FILIAL_VALIDA']
+    assert derivado('total_prouni', _total_prouni) == 15
+
+
+def test_sem_subtotais(nome_base):
+    _, df, _ = acesso.carregar_conjunto(sem_subtotais=True, nome_base=nome_base)
+
+    assert not df['LINHA_SUBTOTAL'].any()
+    assert len(df) == 2
+
+
+def test_derivado_calculado_uma_vez_por_versao(nome_base):
+    chamadas = []
+
+    def construir(df):
+        chamadas.append(1)
+        return _total_prouni(df)
+
+    for _ in range(3):
+        _, _, derivado = acesso.carregar_conjunto(nome_base=nome_base)
+        assert derivado('contado', construir) == 15
+    assert len(chamadas) == 1
+
+
+def test_troca_de_versao_nao_mistura_dados_e_derivados(nome_base):
+    versao_antiga, df_antigo, derivado_antigo = acesso.carregar_conjunto(nome_base=nome_base)
+
+    _trocar_versao(nome_base, 20)
+    versao_nova, df_novo, derivado_novo = acesso.carregar_conjunto(nome_base=nome_base)
+
+    assert versao_nova != versao_antiga
+    assert acesso.versao_atual(nome_base) == versao_nova
+    # Quem leu antes da troca continua com dados e derivados da versão antiga
+    assert _total_prouni(df_antigo) == derivado_antigo('total_prouni', _total_prouni) == 15
+    assert _total_prouni(df_novo) == derivado_novo('total_prouni', _total_prouni) == 25
+
+
+def test_dados_em_disco_dependem_da_versao_da_conversao(nome_base, monkeypatch):
+    acesso.carregar_conjunto(nome_base=nome_base)
+    arquivos = cache_disco.estatisticas()['arquivos']
+
+    # Processo novo com outra conversão: não reaproveita as tabelas tipadas do disco
+    monkeypatch.setattr(acesso, 'VERSAO_CONVERSAO', 2)
+    del acesso._conjuntos[nome_base]
+    acesso.carregar_conjunto(nome_base=nome_base)
+
+    assert cache_disco.estatisticas()['arquivos'] == arquivos + 1
+
+
+def test_planilha_tocada_tem_o_hash_calculado_uma_vez(nome_base, monkeypatch):
+    versao = acesso.versao_atual(nome_base)
+    # Mesmo conteúdo com outra data: os metadados do snapshot deixam de bater
+    instante = os.path.getmtime(nome_base + '.csv') + 100
+    os.utime(nome_base + '.csv', (instante, instante))
+    calculos = []
+    calcular_sha256 = snapshot.calcular_sha256
+    monkeypatch.setattr(snapshot, 'calcular_sha256', lambda caminho: calculos.append(1) or calcular_sha256(caminho))
+
+    for _ in range(3):
+        assert acesso.carregar_conjunto(nome_base=nome_base)[0] == versao
+
+    assert len(calculos) == 1
+
+
+def test_planilha_ausente(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(FileNotFoundError):
+        acesso.carregar_conjunto(nome_base=str(tmp_path / 'inexistente'))
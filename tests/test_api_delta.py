@@ -0,0 +1,173 @@
+"""Sincronização por delta: upsert e exclusões por (CODFILIAL, NOMECURSO), marca d'água e agregados afetados"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+
+from bolsistas import api
+from bolsistas.cubo import MEDIDAS_CUBO, atualizar_cubo, construir_cubo
+from bolsistas.esquema import aplicar_esquema
+
+
+def _linha(filial, curso, prouni, pagantes):
+    linha = dict.fromkeys(MEDIDAS_CUBO, 0)
+    linha.update({
+        'CODFILIAL': filial, 'NOMECURSO': curso, 'TOTAL_PROUNI': prouni,
+        'TOTAL_MATRICULADOS': prouni + pagantes, 'FALTAM_SOBRAM_PROUNI': prouni - pagantes // 10,
+    })
+    return linha
+
+
+# Feed de alterações: a resposta de cada marca d'água recebida em ?desde=
+FEED = {
+    None: {'marca': 'm1', 'dados': [
+        _linha('4', 'MEDICINA', 20, 150), _linha('4', 'DIREITO', 10, 80), _linha('7', 'DIREITO', 8, 60),
+    ]},
+    'm1': {'marca': 'm2', 'dados': [_linha('4', 'DIREITO', 2, 80), _linha('7', 'MEDICINA', 5, 40)]},
+    'm2': {'marca': 'm3', 'dados': [], 'removidos': [{'CODFILIAL': '7', 'NOMECURSO': 'DIREITO'}]},
+    'm3': {'marca': 'm3', 'dados': []},
+}
+
+
+class _Feed(BaseHTTPRequestHandler):
+    def do_GET(self):
+        desde = parse_qs(urlparse(self.path).query).get(api.PARAMETRO_DELTA, [None])[0]
+        self.server.marcas_recebidas.append(desde)
+        corpo = json.dumps(self.server.feed[desde]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def feed(caches_api_vazios):
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), _Feed)
+    servidor.marcas_recebidas = []
+    servidor.feed = dict(FEED)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield servidor, f'http://127.0.0.1:{servidor.server_address[1]}/alteracoes'
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _converter(dados):
+    return aplicar_esquema(pd.DataFrame(dados))
+
+
+def _sincronizar(url):
+    return api.buscar_tabela_api(url, converter=_converter, idade_maxima=0, delta=True)
+
+
+def _chaves(tabela):
+    return list(zip(tabela['CODFILIAL'].astype(int), tabela['NOMECURSO'].astype(str)))
+
+
+def test_primeira_sincronizacao_traz_tudo_e_a_seguinte_so_o_delta(feed):
+    servidor, url = feed
+    tabela = _sincronizar(url)
+    assert api._tabelas[url]['marca'] == 'm1'
+
+    mesclada = _sincronizar(url)
+
+    assert servidor.marcas_recebidas == [None, 'm1']
+    assert api._tabelas[url]['marca'] == 'm2'
+    assert len(tabela) == 3
+    # DIREITO da filial 4 substituída na mesma posição; MEDICINA da filial 7 no final
+    assert _chaves(mesclada) == [(4, 'MEDICINA'), (4, 'DIREITO'), (7, 'DIREITO'), (7, 'MEDICINA')]
+    assert mesclada['TOTAL_PROUNI'].tolist() == [20, 2, 8, 5]
+    assert mesclada['CODFILIAL'].cat.categories.dtype == 'Int16'
+
+
+def test_linha_excluida_na_fonte_sai_da_tabela(feed):
+    _, url = feed
+    _sincronizar(url)
+    _sincronizar(url)
+    cubo = api.obter_agregado_api(url, 'cubo', construir_cubo, atualizar_cubo)
+
+    sincronizada = _sincronizar(url)
+
+    assert _chaves(sincronizada) == [(4, 'MEDICINA'), (4, 'DIREITO'), (7, 'MEDICINA')]
+    assert 'DIREITO' in sincronizada['NOMECURSO'].cat.categories  # ainda usada na filial 4
+    atualizado = api.obter_agregado_api(url, 'cubo', pytest.fail)
+    assert atualizado is not cubo
+    pd.testing.assert_frame_equal(atualizado['celulas'], construir_cubo(sincronizada)['celulas'])
+
+
+def test_resposta_completa_substitui_a_tabela(feed):
+    servidor, url = feed
+    servidor.feed['m1'] = {'marca': 'm9', 'completo': True, 'dados': [_linha('7', 'DIREITO', 1, 10)]}
+    _sincronizar(url)
+    api.obter_agregado_api(url, 'total', lambda t: t['TOTAL_PROUNI'].sum())
+
+    tabela = _sincronizar(url)
+
+    assert _chaves(tabela) == [(7, 'DIREITO')]
+    assert list(tabela['CODFILIAL'].cat.categories) == [7]
+    assert api.obter_agregado_api(url, 'total', lambda t: t['TOTAL_PROUNI'].sum()) == 1
+
+
+def test_delta_vazio_mantem_a_tabela_e_os_agregados(feed):
+    _, url = feed
+    for _ in range(3):
+        _sincronizar(url)
+    tabela = api.buscar_tabela_api(url)
+    total = api.obter_agregado_api(url, 'total', lambda t: t['TOTAL_PROUNI'].sum())
+
+    assert _sincronizar(url) is tabela
+    assert api.obter_agregado_api(url, 'total', pytest.fail) == total
+
+
+def test_so_os_agregados_afetados_sao_refeitos(feed):
+    _, url = feed
+    _sincronizar(url)
+    cubo = api.obter_agregado_api(url, 'cubo', construir_cubo, atualizar_cubo)
+    api.obter_agregado_api(url, 'total', lambda t: t['TOTAL_PROUNI'].sum())
+
+    mesclada = _sincronizar(url)
+
+    # O cubo foi atualizado na sincronização; o total, sem 'atualizar', é recalculado
+    atualizado = api.obter_agregado_api(url, 'cubo', pytest.fail)
+    assert atualizado is not cubo
+    pd.testing.assert_frame_equal(atualizado['indicadores'], construir_cubo(mesclada)['indicadores'], check_like=True)
+    assert api.obter_agregado_api(url, 'total', lambda t: t['TOTAL_PROUNI'].sum()) == 35
+
+
+def test_agregado_de_outra_versao_nao_e_guardado(feed):
+    _, url = feed
+    antiga = _sincronizar(url)
+    _sincronizar(url)
+
+    assert api.obter_agregado_api(url, 'linhas', len, tabela=antiga) == 3
+    assert api.obter_agregado_api(url, 'linhas', len) == 4
+
+
+def test_mesclar_delta_fica_com_a_ultima_linha_repetida():
+    tabela = _converter([_linha('4', 'MEDICINA', 20, 150)])
+    delta = _converter([_linha('4', 'MEDICINA', 1, 150), _linha('4', 'MEDICINA', 3, 150)])
+
+    mesclada, alteradas = api.mesclar_delta(tabela, delta)
+
+    assert mesclada['TOTAL_PROUNI'].tolist() == [3]
+    assert len(alteradas) == 1
+
+
+def test_mesclar_delta_so_com_exclusoes():
+    tabela = _converter([_linha('4', 'MEDICINA', 20, 150), _linha('7', 'DIREITO', 8, 60)])
+
+    mesclada, alteradas = api.mesclar_delta(tabela, _converter([]), removidos=_converter([
+        {'CODFILIAL': '7', 'NOMECURSO': 'DIREITO'}, {'CODFILIAL': '9', 'NOMECURSO': 'DIREITO'},
+    ]))
+
+    assert _chaves(mesclada) == [(4, 'MEDICINA')]
+    assert list(mesclada['NOMECURSO'].cat.categories) == ['MEDICINA']
+    assert _chaves(alteradas) == [(7, 'DIREITO')]
+    assert _chaves(tabela) == [(4, 'MEDICINA'), (7, 'DIREITO')]  # original intacta
@@ -0,0 +1,102 @@
+"""bolsistas/api.py contra o servidor local: compressão, 304 e tabela em cache"""
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+import requests
+
+from bolsistas import api
+from bolsistas.esquema import aplicar_esquema
+from servidor_api_local import CAMINHO_ALTERACOES, CAMINHO_DADOS, iniciar_servidor
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture
+def url(monkeypatch, caches_api_vazios):
+    monkeypatch.chdir(RAIZ)  # o servidor lê a planilha do diretório de trabalho
+    servidor = iniciar_servidor(0)
+    yield f'http://127.0.0.1:{servidor.server_address[1]}{CAMINHO_DADOS}'
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _diferenca(antes, depois):
+    return {chave: depois[chave] - antes[chave] for chave in antes}
+
+
+def test_resposta_comprimida_menor_que_a_original(url):
+    simples = len(requests.get(url, headers={'Accept-Encoding': 'identity'}, timeout=10).content)
+
+    antes = api.metricas_api()
+    tabela = api.buscar_tabela_api(url)
+    recebidos = _diferenca(antes, api.metricas_api())['bytes_recebidos']
+
+    assert len(tabela) > 0
+    assert 0 < recebidos < simples
+
+
+def test_304_serve_a_tabela_em_cache_sem_corpo(url):
+    tabela = api.buscar_tabela_api(url, converter=lambda dados: aplicar_esquema(pd.DataFrame(dados)))
+
+    antes = api.metricas_api()
+    revalidada = api.buscar_tabela_api(url, idade_maxima=0)
+    diferenca = _diferenca(antes, api.metricas_api())
+
+    assert revalidada is tabela
+    assert diferenca == {'requisicoes': 1, 'nao_modificadas': 1, 'bytes_recebidos': 0}
+
+
+def test_validadores_nao_guardam_o_corpo(url):
+    api.buscar_tabela_api(url)
+
+    assert set(api._validadores[url]) == {'etag', 'ultima_modificacao'}
+    assert api._validadores[url]['etag']
+
+
+def test_if_modified_since(url):
+    tabela = api.buscar_tabela_api(url)
+    # Sem ETag, a revalidação só leva o Last-Modified
+    api._validadores[url]['etag'] = None
+
+    antes = api.metricas_api()
+    revalidada = api.buscar_tabela_api(url, idade_maxima=0)
+
+    assert revalidada is tabela
+    assert _diferenca(antes, api.metricas_api())['nao_modificadas'] == 1
+
+
+def test_304_na_leitura_colunar(url):
+    tabela = api.buscar_tabela_api(url, converter=aplicar_esquema, colunar=True)
+
+    antes = api.metricas_api()
+    revalidada = api.buscar_tabela_api(url, converter=aplicar_esquema, idade_maxima=0, colunar=True)
+
+    assert revalidada is tabela
+    assert _diferenca(antes, api.metricas_api())['bytes_recebidos'] == 0
+
+
+def test_buscar_json_sempre_baixa(url):
+    primeiro = api.buscar_json(url)
+
+    antes = api.metricas_api()
+    segundo = api.buscar_json(url)
+
+    assert segundo == primeiro
+    assert _diferenca(antes, api.metricas_api())['nao_modificadas'] == 0
+
+
+def test_filiais_por_delta(url):
+    feed = url.replace(CAMINHO_DADOS, CAMINHO_ALTERACOES) + '?filial={filial}'
+    def converter(dados):
+        return aplicar_esquema(pd.DataFrame(dados))
+
+    completa = converter(requests.get(url, timeout=10).json())
+
+    por_filial, falhas = api.buscar_filiais_api(feed, [4, 7], converter=converter, delta=True)
+    sincronizada, _ = api.buscar_filiais_api(feed, [4, 7], converter=converter, idade_maxima=0, delta=True)
+
+    assert not falhas
+    assert completa.equals(por_filial) and completa.equals(sincronizada)
+    assert api._tabelas[feed.format(filial=4)]['marca'] is not None
@@ -0,0 +1,99 @@
+"""Cache em disco: chave por dados e código, tipos preservados e limite de tamanho"""
+
+import glob
+import os
+
+import pandas as pd
+import pytest
+
+from bolsistas import cache_disco
+from bolsistas.esquema import aplicar_esquema
+
+
+@pytest.fixture
+def tabela():
+    return aplicar_esquema(pd.DataFrame({
+        'CODFILIAL': ['4', '7', '4 Total'],
+        'NOMECURSO': ['MEDICINA', 'DIREITO', None],
+        'TOTAL_PROUNI': [10, None, 10],
+    }))
+
+
+def _construtor(tabela, chamadas):
+    def construir():
+        chamadas.append(1)
+        return (tabela,)
+    return construir
+
+
+def test_ida_e_volta_preserva_os_tipos(tabela, tmp_path):
+    assert cache_disco.gravar_tabelas('dados', 'v1', (tabela,), str(tmp_path))
+
+    lida, = cache_disco.ler_tabelas('dados', 'v1', str(tmp_path))
+
+    pd.testing.assert_frame_equal(lida, tabela)
+    assert lida['CODFILIAL'].cat.categories.dtype == 'Int16'
+
+
+def test_memoizar_constroi_uma_vez(tabela, tmp_path):
+    chamadas = []
+    for _ in range(3):
+        resultado, = cache_disco.memoizar_tabelas('dados', 'v1', _construtor(tabela, chamadas), str(tmp_path))
+        pd.testing.assert_frame_equal(resultado, tabela)
+
+    assert len(chamadas) == 1
+
+
+def test_nova_versao_dos_dados_ou_do_artefato_nao_reaproveita(tabela, tmp_path):
+    chamadas = []
+    construir = _construtor(tabela, chamadas)
+    cache_disco.memoizar_tabelas('dados', 'v1', construir, str(tmp_path))
+    cache_disco.memoizar_tabelas('dados', 'v2', construir, str(tmp_path))
+    cache_disco.memoizar_tabelas('dados', 'v2', construir, str(tmp_path), versao_artefato=2)
+    cache_disco.memoizar_tabelas('dados', 'v2', construir, str(tmp_path), versao_artefato=2)
+
+    assert len(chamadas) == 3
+
+
+def test_chave_depende_do_esquema(monkeypatch):
+    antes = cache_disco.chave_cache('dados', 'v1')
+    monkeypatch.setattr(cache_disco, 'IMPRESSAO_ESQUEMA', 'outro esquema')
+
+    assert cache_disco.chave_cache('dados', 'v1') != antes
+
+
+def test_resultado_que_nao_e_tupla_de_tabelas_nao_e_gravado(tmp_path):
+    assert cache_disco.memoizar_tabelas('nada', 'v1', lambda: None, str(tmp_path)) is None
+    assert not glob.glob(str(tmp_path / '*'))
+
+
+def test_arquivo_corrompido_vira_falta(tabela, tmp_path):
+    cache_disco.gravar_tabelas('dados', 'v1', (tabela,), str(tmp_path))
+    caminho, = glob.glob(str(tmp_path / f'*{cache_disco.EXTENSAO}'))
+    with open(caminho, 'wb') as arquivo:
+        arquivo.write(b'corrompido')
+
+    assert cache_disco.ler_tabelas('dados', 'v1', str(tmp_path)) is None
+
+
+def test_limite_remove_os_menos_usados(tabela, tmp_path):
+    diretorio = str(tmp_path)
+    cache_disco.gravar_tabelas('antigo', 'v1', (tabela,), diretorio)
+    antigo, = glob.glob(os.path.join(diretorio, f'*{cache_disco.EXTENSAO}'))
+    os.utime(antigo, (0, 0))
+    tamanho = os.path.getsize(antigo)
+
+    cache_disco.gravar_tabelas('novo', 'v1', (tabela,), diretorio, limite_bytes=tamanho + tamanho // 2)
+
+    assert not os.path.exists(antigo)
+    assert cache_disco.ler_tabelas('novo', 'v1', diretorio) is not None
+
+
+def test_gravacao_que_falha_nao_deixa_temporarios(tabela, tmp_path, monkeypatch):
+    def falhar(*args, **kwargs):
+        raise OSError('disco cheio')
+
+    monkeypatch.setattr(cache_disco.pa.ipc, 'new_file', falhar)
+
+    assert not cache_disco.gravar_tabelas('dados', 'v1', (tabela,), str(tmp_path))
+    assert not os.listdir(tmp_path)
@@ -0,0 +1,100 @@
+"""Motor de cenários: projeção vetorizada, cache por cenário e aplicação às linhas"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bolsistas.cenarios import (
+    aplicar_cenario, avaliar_cenarios, grade_cenarios, montar_base_cenarios, projetar_cenario,
+    resumir_cenarios, vetor_cenario,
+)
+from bolsistas.esquema import aplicar_esquema
+
+
+@pytest.fixture
+def df():
+    return aplicar_esquema(pd.DataFrame({
+        'CODFILIAL': ['4', '4', '7', '4 Total'],
+        'NOMECURSO': ['MEDICINA', 'DIREITO', 'DIREITO', None],
+        'TOTAL_PROUNI': [20, 10, 8, 30],
+        'TOTAL_INSTITUCIONAL': [2, 1, 0, 3],
+        'TOTAL_ASSISTENCIAL_100': [6, 4, 2, 10],
+        'TOTAL_ASSISTENCIAL_50': [2, 0, 2, 2],
+        'ALUNOS_PAGANTES': [150, 80, 60, 230],
+        'FORMANDOS_PROUNI': [4, 2, 1, 6],
+        'FORMANDOS_ASSISTENCIAL': [2, 1, 1, 3],
+        'FORMANDOS_NAO_CEBAS': [30, 10, 5, 40],
+        'FALTAM_SOBRAM_PROUNI': [5, 2, 2, 7],
+        'FALTAM_SOBRAM_FILANTROPIA': [3, 1, -1, 4],
+    }))
+
+
+@pytest.fixture
+def base(df):
+    return montar_base_cenarios(df)
+
+
+def test_base_sem_subtotais(base):
+    assert len(base['celulas']) == 3
+    assert base['totais'][:, 0].sum() == 38
+
+
+def test_cenario_vazio_mantem_totais_e_saldos_do_erp(base):
+    projecao = projetar_cenario(base, {})
+
+    assert projecao.loc[(4, 'MEDICINA'), 'TOTAL_PROUNI'] == 20
+    assert projecao.loc[(7, 'DIREITO'), 'TOTAL_PROUNI'] == 8
+    assert projecao.loc[(4, 'MEDICINA'), 'SALDO_PROUNI'] == 5
+    assert projecao.loc[(7, 'DIREITO'), 'SALDO_FILANTROPIA'] == -1
+
+
+def test_formatura_segue_as_regras_cebas(base):
+    projecao = projetar_cenario(base, {'formatura_PROUNI': 1})
+    medicina = projecao.loc[(4, 'MEDICINA')]
+
+    assert medicina['TOTAL_PROUNI'] == 16
+    # Sem os 4 formandos PROUNI: -4 no saldo PROUNI e -4 na filantropia
+    assert medicina['SALDO_PROUNI'] == pytest.approx(1)
+    assert medicina['SALDO_FILANTROPIA'] == pytest.approx(-1)
+
+
+def test_parametro_desconhecido(base):
+    with pytest.raises(ValueError):
+        vetor_cenario({'evasao_MEDICINA': 0.1})
+
+
+def test_grade_avaliada_de_uma_vez_igual_aos_cenarios_isolados(base):
+    grade = grade_cenarios(evasao_PAGANTES=[0, 0.1], ingresso_PROUNI=[0, 0.2])
+    resultado = avaliar_cenarios(base, grade)
+
+    assert resultado['totais'].shape == (4, 3, 5)
+    for i, linha in enumerate(grade.to_dict('records')):
+        isolado = projetar_cenario(base, linha)
+        np.testing.assert_allclose(resultado['saldo_prouni'][i], isolado['SALDO_PROUNI'])
+    assert len(base['cache']) == 4
+
+
+def test_resumo_por_filial(base):
+    resumo = resumir_cenarios(base, [{}], filial=7)
+
+    assert resumo.loc[0, 'TOTAL_PROUNI'] == 8
+    assert resumo.loc[0, 'CURSOS_DEFICIT'] == 1
+
+
+def test_aplicar_cenario_substitui_os_totais_projetados(df, base):
+    linhas = df[~df['LINHA_SUBTOTAL']]
+    projetado = aplicar_cenario(base, linhas, {'formatura_PROUNI': 1})
+
+    assert projetado['TOTAL_PROUNI'].tolist() == [16, 8, 7]
+    assert projetado['ALUNOS_PAGANTES'].tolist() == [150, 80, 60]
+    assert linhas['TOTAL_PROUNI'].tolist() == [20, 10, 8]  # original intacto
+
+
+def test_aplicar_cenario_mantem_linhas_fora_da_base(df, base):
+    novo = aplicar_esquema(pd.DataFrame({'CODFILIAL': ['7'], 'NOMECURSO': ['MEDICINA'], 'TOTAL_PROUNI': [3]}))
+    linhas = pd.concat([df[~df['LINHA_SUBTOTAL']], novo], ignore_index=True)
+
+    projetado = aplicar_cenario(base, linhas, {'formatura_PROUNI': 1})
+
+    # Sem célula na base, a linha não recebe a projeção de outra célula
+    assert projetado['TOTAL_PROUNI'].tolist() == [16, 8, 7, 3]
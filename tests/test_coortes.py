@@ -0,0 +1,97 @@
+"""Coortes: distribuição inicial por semestre, projeção semestre a semestre e durações"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bolsistas.cenarios import PROGRAMAS, montar_base_cenarios, projetar_cenario
+from bolsistas.coortes import DURACOES_CURSOS, coortes_iniciais, projetar_coortes, trajetoria_saldos
+from bolsistas.esquema import aplicar_esquema
+
+PROUNI = PROGRAMAS.index('PROUNI')
+
+
+def _celula(base, filial, curso):
+    return base['celulas'].get_loc((filial, curso))
+
+
+@pytest.fixture
+def base():
+    return montar_base_cenarios(aplicar_esquema(pd.DataFrame({
+        'CODFILIAL': ['4', '4', '7'],
+        'NOMECURSO': ['MEDICINA', 'DIREITO', 'DIREITO'],
+        'TOTAL_PROUNI': [20, 10, 8],
+        'TOTAL_INSTITUCIONAL': [2, 1, 0],
+        'TOTAL_ASSISTENCIAL_100': [6, 4, 2],
+        'TOTAL_ASSISTENCIAL_50': [2, 0, 2],
+        'ALUNOS_PAGANTES': [150, 80, 60],
+        'FORMANDOS_PROUNI': [4, 2, 1],
+        'FORMANDOS_ASSISTENCIAL': [2, 1, 1],
+        'FORMANDOS_NAO_CEBAS': [30, 10, 5],
+        'FALTAM_SOBRAM_PROUNI': [5, 2, 2],
+        'FALTAM_SOBRAM_FILANTROPIA': [3, 1, -1],
+    })))
+
+
+def test_formandos_no_ultimo_semestre_e_demais_divididos(base):
+    coortes = coortes_iniciais(base)
+
+    medicina = coortes[_celula(base, 4, 'MEDICINA'), PROUNI]
+    assert DURACOES_CURSOS['MEDICINA'] == 12
+    assert medicina[11] == 4
+    np.testing.assert_allclose(medicina[:11], 16 / 11)
+    # DIREITO dura 10 semestres: nada além do décimo
+    assert (coortes[_celula(base, 4, 'DIREITO'), :, 10:] == 0).all()
+    np.testing.assert_allclose(coortes.sum(axis=-1), base['totais'])
+
+
+def test_cenario_vazio_mantem_os_totais_e_os_saldos_do_erp(base):
+    projecao = projetar_coortes(base, {}, horizonte=6)
+
+    np.testing.assert_allclose(projecao['totais'], np.broadcast_to(base['totais'], projecao['totais'].shape))
+    medicina = _celula(base, 4, 'MEDICINA')
+    assert projecao['saldo_prouni'][0, medicina] == pytest.approx(5)
+    assert projecao['saldo_filantropia'][-1, medicina] == pytest.approx(3)
+
+
+def test_trajetoria_por_filial(base):
+    trajetoria = trajetoria_saldos(base, {}, horizonte=4)
+    filial_7 = trajetoria_saldos(base, {}, horizonte=4, filial=7)
+
+    assert trajetoria['SEMESTRE'].tolist() == [0, 1, 2, 3, 4]
+    assert trajetoria.loc[0, ['SALDO_PROUNI', 'SALDO_FILANTROPIA', 'CURSOS_DEFICIT']].tolist() == [9, 3, 1]
+    assert filial_7.loc[0, ['SALDO_PROUNI', 'SALDO_FILANTROPIA', 'CURSOS_DEFICIT']].tolist() == [2, -1, 1]
+
+
+def test_formatura_acompanha_a_duracao_do_curso(base):
+    cenario = {'formatura_PROUNI': 1}
+    medicina = _celula(base, 4, 'MEDICINA')
+
+    padrao = projetar_coortes(base, cenario, horizonte=2)['totais'][:, medicina, PROUNI]
+    curta = projetar_coortes(base, cenario, horizonte=2, duracoes={'MEDICINA': 3})['totais'][:, medicina, PROUNI]
+
+    # 1º semestre: saem os 4 formandos; 2º: sai a turma seguinte (16 / (duração - 1))
+    np.testing.assert_allclose(padrao, [20, 16, 16 - 16 / 11])
+    np.testing.assert_allclose(curta, [20, 16, 8])
+
+
+def test_curso_de_um_semestre(base):
+    coortes = coortes_iniciais(base, duracoes={'MEDICINA': 1})
+
+    assert coortes[_celula(base, 4, 'MEDICINA'), PROUNI, 0] == 20
+    np.testing.assert_allclose(coortes.sum(axis=-1), base['totais'])
+
+
+def test_primeiro_semestre_igual_a_projecao_de_um_periodo(base):
+    cenario = {
+        'formatura_PROUNI': 1, 'evasao_PROUNI': 0.1, 'formatura_PAGANTES': 0.5,
+        'evasao_PAGANTES': 0.2, 'ingresso_PAGANTES': 0.05, 'formatura_ASSISTENCIAL_100': 0.8,
+    }
+
+    projecao = projetar_coortes(base, cenario, horizonte=1)
+    periodo = projetar_cenario(base, cenario)
+
+    # MEDICINA: os 4 formandos PROUNI saem antes da evasão de 10% dos 16 restantes
+    assert projecao['totais'][1, _celula(base, 4, 'MEDICINA'), PROUNI] == pytest.approx(14.4)
+    np.testing.assert_allclose(projecao['saldo_prouni'][1], periodo['SALDO_PROUNI'])
+    np.testing.assert_allclose(projecao['saldo_filantropia'][1], periodo['SALDO_FILANTROPIA'])
@@ -0,0 +1,78 @@
+"""Leitores de planilha: escolha do leitor e registro do benchmark"""
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from bolsistas import leitores
+
+
+@pytest.fixture
+def planilha_csv(tmp_path):
+    caminho = tmp_path / 'dados_bolsistas.csv'
+    pd.DataFrame({'CODFILIAL': [4, 7], 'NOMECURSO': ['MEDICINA', 'DIREITO'], 'TOTAL_PROUNI': [10, 5]}).to_csv(
+        caminho, sep=';', index=False
+    )
+    return str(caminho)
+
+
+def test_primeira_leitura_registra_o_leitor_com_as_versoes(planilha_csv):
+    df = leitores.ler_planilha(planilha_csv)
+
+    assert list(df['NOMECURSO']) == ['MEDICINA', 'DIREITO']
+    registro = leitores.ler_registro(planilha_csv)
+    assert registro['.csv']['versoes'] == leitores.versoes_leitores('.csv')
+    assert leitores.leitor_escolhido(planilha_csv) == registro['.csv']['leitor']
+
+
+def test_registro_gravado_sem_temporarios(planilha_csv):
+    leitores.benchmark_leitores(planilha_csv)
+
+    diretorio = os.path.dirname(planilha_csv)
+    assert not [nome for nome in os.listdir(diretorio) if nome.startswith('.tmp_leitor_')]
+    with open(os.path.join(diretorio, leitores.ARQUIVO_REGISTRO), encoding='utf-8') as arquivo:
+        assert '.csv' in json.load(arquivo)
+
+
+def test_registro_invalido_quando_as_versoes_mudam(planilha_csv, monkeypatch):
+    leitores.benchmark_leitores(planilha_csv)
+    versoes = dict(leitores.versoes_leitores('.csv'), pandas='0.0.0')
+    monkeypatch.setattr(leitores, 'versoes_leitores', lambda extensao: versoes)
+
+    assert leitores.leitor_escolhido(planilha_csv) is None
+
+
+def test_projecao_de_colunas(planilha_csv):
+    df = leitores.ler_planilha(planilha_csv, colunas=['NOMECURSO'], leitor='pandas')
+
+    assert list(df.columns) == ['NOMECURSO']
+
+
+def test_formato_nao_suportado(tmp_path):
+    with pytest.raises(ValueError):
+        leitores.ler_planilha(str(tmp_path / 'dados.ods'))
+
+
+def test_pyarrow_ignora_colunas_ausentes_como_o_pandas(planilha_csv):
+    colunas = ['TOTAL_PROUNI', 'NOMECURSO', 'COLUNA_AUSENTE']
+
+    por_pyarrow = leitores.ler_planilha(planilha_csv, colunas=colunas, leitor='pyarrow_csv')
+    por_pandas = leitores.ler_planilha(planilha_csv, colunas=colunas, leitor='pandas')
+
+    assert list(por_pyarrow.columns) == list(por_pandas.columns) == ['NOMECURSO', 'TOTAL_PROUNI']
+    pd.testing.assert_frame_equal(por_pyarrow, por_pandas, check_dtype=False)
+
+
+def test_benchmark_cronometra_a_leitura_completa(planilha_csv, monkeypatch):
+    pedidas = []
+    funcao, disponivel = leitores.LEITORES['.csv']['pandas']
+    monkeypatch.setitem(leitores.LEITORES['.csv'], 'pandas', (
+        lambda caminho, colunas=None: pedidas.append(colunas) or funcao(caminho, colunas), disponivel
+    ))
+
+    _, df = leitores.benchmark_leitores(planilha_csv, colunas=['NOMECURSO'])
+
+    assert set(pedidas) == {None}
+    assert list(df.columns) == ['NOMECURSO']
@@ -0,0 +1,77 @@
+"""Monte Carlo: reprodutibilidade, pool de processos reaproveitado e limite para paralelizar"""
+
+import pandas as pd
+import pytest
+
+from bolsistas import monte_carlo
+from bolsistas.cenarios import montar_base_cenarios
+from bolsistas.esquema import aplicar_esquema
+
+
+@pytest.fixture
+def base():
+    return montar_base_cenarios(aplicar_esquema(pd.DataFrame({
+        'CODFILIAL': ['4', '4', '7'],
+        'NOMECURSO': ['MEDICINA', 'DIREITO', 'DIREITO'],
+        'TOTAL_PROUNI': [20, 10, 8],
+        'TOTAL_INSTITUCIONAL': [2, 1, 0],
+        'TOTAL_ASSISTENCIAL_100': [6, 4, 2],
+        'TOTAL_ASSISTENCIAL_50': [2, 0, 2],
+        'ALUNOS_PAGANTES': [150, 80, 60],
+        'FORMANDOS_PROUNI': [4, 2, 1],
+        'FORMANDOS_ASSISTENCIAL': [2, 1, 1],
+        'FORMANDOS_NAO_CEBAS': [30, 10, 5],
+        'FALTAM_SOBRAM_PROUNI': [30, 2, -20],
+        'FALTAM_SOBRAM_FILANTROPIA': [30, 1, -20],
+    })))
+
+
+CENARIO = {'formatura_PROUNI': 0.9, 'evasao_PAGANTES': 0.05, 'ingresso_PAGANTES': 0.1}
+
+
+def test_saldos_muito_longe_do_zero_tem_probabilidade_certa(base):
+    por_curso, por_filial = monte_carlo.simular_conformidade(base, CENARIO, tentativas=500, processos=1)
+
+    probabilidades = por_curso.set_index(['CODFILIAL', 'NOMECURSO'])['PROB_NAO_ATENDE']
+    assert probabilidades[(4, 'MEDICINA')] == 0
+    assert probabilidades[(7, 'DIREITO')] == 1
+    assert por_filial['CODFILIAL'].tolist() == [4, 7]
+    assert por_curso[list(monte_carlo.COLUNAS_PROBABILIDADE)].stack().between(0, 1).all()
+
+
+def test_mesma_semente_mesmo_resultado(base):
+    primeiro, _ = monte_carlo.simular_conformidade(base, CENARIO, tentativas=2_000, semente=7, processos=1)
+    segundo, _ = monte_carlo.simular_conformidade(base, CENARIO, tentativas=2_000, semente=7, processos=1)
+
+    pd.testing.assert_frame_equal(primeiro, segundo)
+
+
+def test_abaixo_do_limite_nao_usa_processos(base, monkeypatch):
+    monkeypatch.setattr(monte_carlo.os, 'cpu_count', lambda: 8)
+    monkeypatch.setattr(monte_carlo, '_pool_processos', pytest.fail)
+
+    monte_carlo.simular_conformidade(base, CENARIO, tentativas=1_000)
+
+
+def test_um_nucleo_nao_usa_processos(base, monkeypatch):
+    monkeypatch.setattr(monte_carlo.os, 'cpu_count', lambda: 1)
+    monkeypatch.setattr(monte_carlo, 'LIMITE_SORTEIOS_PARALELO', 0)
+    monkeypatch.setattr(monte_carlo, '_pool_processos', pytest.fail)
+
+    monte_carlo.simular_conformidade(base, CENARIO, tentativas=1_000)
+
+
+def test_pool_reaproveitado_e_resultado_igual_ao_sequencial(base, monkeypatch):
+    # Blocos pequenos para a simulação ter mais de uma tarefa
+    monkeypatch.setattr(monte_carlo, 'TAMANHO_BLOCO', 250)
+    sequencial, _ = monte_carlo.simular_conformidade(base, CENARIO, tentativas=1_000, semente=3, processos=1)
+
+    paralelo, _ = monte_carlo.simular_conformidade(base, CENARIO, tentativas=1_000, semente=3, processos=2)
+    pool = monte_carlo._pool
+    de_novo, _ = monte_carlo.simular_conformidade(base, CENARIO, tentativas=1_000, semente=3, processos=2)
+
+    assert pool is not None and monte_carlo._pool is pool
+    pd.testing.assert_frame_equal(paralelo, sequencial)
+    pd.testing.assert_frame_equal(de_novo, sequencial)
+    monte_carlo._encerrar_pool()
+    assert monte_carlo._pool is None
@@ -0,0 +1,70 @@
+"""Plano de redistribuição: bolsas novas, remanejamentos e cursos inviáveis"""
+
+import numpy as np
+import pandas as pd
+
+from bolsistas.otimizacao import _simplex, otimizar_redistribuicao
+
+
+def _situacao(linhas):
+    """linhas: (filial, curso, saldo PROUNI, saldo filantropia, PROUNI, assistencial 100%, pagantes)"""
+    df = pd.DataFrame(linhas, columns=[
+        'CODFILIAL', 'NOMECURSO', 'SALDO_PROUNI', 'SALDO_FILANTROPIA',
+        'TOTAL_PROUNI', 'TOTAL_ASSISTENCIAL_100', 'ALUNOS_PAGANTES',
+    ])
+    return df.set_index(['CODFILIAL', 'NOMECURSO'])
+
+
+def test_simplex_encontra_o_otimo():
+    # max x + y com x + 2y <= 4 e 3x + y <= 6: ótimo em (1.6, 1.2)
+    solucao = _simplex(np.array([1.0, 1.0]), np.array([[1.0, 2.0], [3.0, 1.0]]), np.array([4.0, 6.0]))
+
+    np.testing.assert_allclose(solucao, [1.6, 1.2])
+
+
+def test_bolsas_novas_zeram_os_deficits():
+    plano, remanejamentos = otimizar_redistribuicao(
+        _situacao([(4, 'DIREITO', -2.2, -3.0, 5, 5, 100)]), remanejar=False
+    )
+
+    linha = plano.iloc[0]
+    assert linha['NOVAS_PROUNI'] == 2  # cada bolsa PROUNI melhora o saldo PROUNI em 1,1
+    assert linha['SALDO_PROUNI_FINAL'] >= 0 and linha['SALDO_FILANTROPIA_FINAL'] >= 0
+    assert not linha['INVIAVEL'] and linha['BOLSAS_FALTANTES'] == 0
+    assert remanejamentos.empty
+
+
+def test_remanejamento_mantem_o_doador_em_atende():
+    plano, remanejamentos = otimizar_redistribuicao(_situacao([
+        (4, 'MEDICINA', 10.0, 10.0, 40, 40, 200),
+        (4, 'DIREITO', -2.2, -1.0, 5, 5, 100),
+    ]))
+
+    assert (plano[['SALDO_PROUNI_FINAL', 'SALDO_FILANTROPIA_FINAL']] >= 0).all().all()
+    assert remanejamentos['QUANTIDADE'].sum() > 0
+    assert set(remanejamentos['ORIGEM']) == {'MEDICINA'}
+    # Sem bolsas novas: o doador cobre toda a demanda
+    assert plano['NOVAS_PROUNI'].sum() + plano['NOVAS_ASSISTENCIAIS'].sum() == 0
+
+
+def test_sem_remanejamento_entre_filiais_por_padrao():
+    situacao = _situacao([
+        (4, 'MEDICINA', 10.0, 10.0, 40, 40, 200),
+        (7, 'DIREITO', -2.2, -1.0, 5, 5, 100),
+    ])
+
+    _, remanejamentos = otimizar_redistribuicao(situacao)
+    assert remanejamentos.empty
+
+    _, remanejamentos = otimizar_redistribuicao(situacao, entre_filiais=True)
+    assert list(remanejamentos[['FILIAL_ORIGEM', 'FILIAL_DESTINO']].drop_duplicates().itertuples(index=False, name=None)) == [(4, 7)]
+
+
+def test_curso_sem_pagantes_suficientes_e_inviavel():
+    plano, _ = otimizar_redistribuicao(_situacao([(4, 'HISTÓRIA', -11.0, -12.0, 0, 0, 3)]), remanejar=False)
+
+    linha = plano.iloc[0]
+    assert linha['INVIAVEL']
+    assert linha['NOVAS_PROUNI'] + linha['NOVAS_ASSISTENCIAIS'] == 3  # uma bolsa por pagante
+    assert linha['BOLSAS_FALTANTES'] == 8  # 11 bolsas integrais para a filantropia (12 / (1 + 1/6))
+    assert linha['SALDO_PROUNI_FINAL'] < 0
@@ -0,0 +1,54 @@
+"""Regras CEBAS: saldos do ERP, arredondamento e linearidade"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bolsistas.esquema import aplicar_esquema
+from bolsistas.regras_cebas import COLUNAS_SALDOS, arredondar_saldo, calcular_saldos, saldos_cebas
+
+PLANILHA = Path(__file__).resolve().parents[1] / 'dados_bolsistas.xlsx'
+
+
+def test_reproduz_os_saldos_exportados_pelo_erp():
+    df = aplicar_esquema(pd.read_excel(PLANILHA))
+    df = df[~df['LINHA_SUBTOTAL']]  # subtotais vêm sem contagens nem saldos
+
+    saldos = calcular_saldos(df)
+
+    pd.testing.assert_frame_equal(saldos, df[list(COLUNAS_SALDOS)], check_dtype=False)
+    assert (saldos.dtypes == 'Int32').all()
+
+
+def test_metades_para_longe_do_zero():
+    np.testing.assert_array_equal(arredondar_saldo(np.array([2.5, -2.5, 0.5, -0.5, 1.4, -1.6])),
+                                  [3, -3, 1, -1, 1, -2])
+
+
+def test_contagens_ausentes_valem_zero():
+    df = pd.DataFrame({'TOTAL_PROUNI': [3, None], 'ALUNOS_PAGANTES': [25, 12]})
+
+    saldos = calcular_saldos(df)
+
+    # 3 - 2,5 = 0,5 -> 1; filantropia: 3 - 25/6 = -1,17 -> -1; sem PROUNI: -1,2 e -2
+    assert saldos['FALTAM_SOBRAM_PROUNI'].tolist() == [1, -1]
+    assert saldos['FALTAM_SOBRAM_FILANTROPIA'].tolist() == [-1, -2]
+
+
+def test_regras_lineares_nas_contagens():
+    atual = np.array(saldos_cebas(10, 4, 2, 80, 1))
+    variacao = np.array(saldos_cebas(1, 0, 0, 6, 0))
+
+    np.testing.assert_allclose(np.array(saldos_cebas(11, 4, 2, 86, 1)), atual + variacao)
+    # Nova bolsa PROUNI: +1 e +1 no saldo, -0,1 e -1/6 pelo pagante que deixa de existir
+    np.testing.assert_allclose(
+        np.subtract(saldos_cebas(11, 4, 2, 79), saldos_cebas(10, 4, 2, 80)), [1.1, 7 / 6]
+    )
+
+
+def test_regras_substituem_as_proporcoes():
+    df = pd.DataFrame({'TOTAL_PROUNI': [10], 'ALUNOS_PAGANTES': [50]})
+
+    assert calcular_saldos(df, proporcao_prouni=1 / 5).loc[0, 'FALTAM_SOBRAM_PROUNI'] == 0
+    assert calcular_saldos(df, proporcao_filantropia=0).loc[0, 'FALTAM_SOBRAM_FILANTROPIA'] == 10
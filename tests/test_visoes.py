@@ -0,0 +1,46 @@
+"""Colunas declaradas por visão: cobrem tudo o que cada visão exibe"""
+
+from pathlib import Path
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from bolsistas.visoes import COLUNAS_DASHBOARD_PRINCIPAL, COLUNAS_PLANILHA, COLUNAS_POR_VISAO
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+
+def _colunas_exibidas(app, visao):
+    """Colunas da planilha presentes nas tabelas exibidas pela visão"""
+    at = AppTest.from_file(str(RAIZ / app), default_timeout=120)
+    at.secrets['general'] = {'use_api': False}
+    at.run()
+    at.sidebar.selectbox[0].set_value(visao)
+    at.run()
+    assert not at.exception, [e.message for e in at.exception]
+    tabelas = []
+    for elemento in at.dataframe:
+        tabela = elemento.value
+        tabela = getattr(tabela, 'data', tabela)  # Styler
+        tabelas.append([coluna for coluna in tabela.columns if coluna in COLUNAS_PLANILHA])
+    return tabelas
+
+
+@pytest.fixture
+def na_raiz(monkeypatch):
+    monkeypatch.chdir(RAIZ)
+
+
+@pytest.mark.parametrize('app', ['app.py', 'streamlit_app.py'])
+@pytest.mark.parametrize('visao', list(COLUNAS_POR_VISAO))
+def test_colunas_exibidas_contidas_nas_declaradas(na_raiz, app, visao):
+    for colunas in _colunas_exibidas(app, visao):
+        assert set(colunas) <= set(COLUNAS_POR_VISAO[visao])
+
+
+@pytest.mark.parametrize('app', ['app.py', 'streamlit_app.py'])
+def test_dados_completos_exibe_todas_as_colunas_da_planilha(na_raiz, app):
+    tabelas = _colunas_exibidas(app, "Dashboard Principal")
+
+    assert tuple(COLUNAS_PLANILHA) in [tuple(colunas) for colunas in tabelas]
+    assert set(COLUNAS_DASHBOARD_PRINCIPAL) == set(COLUNAS_PLANILHA)